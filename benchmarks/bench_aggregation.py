@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+from contextlib import redirect_stdout
+import argparse
+import tempfile
+import logging
+import json
+import io
+import numpy as np
+from common import setup_experiment_path, measure, make_client_proxy, SyntheticClient
+
+setup_experiment_path()
+
+import flwr as fl
+from bases.checkpoints import CheckpointWriter
+from bases.streaming_server import StreamingServer
+from experiment.strategy import Strategy
+
+MODES = ("fedavg", "collect", "streaming")
+
+
+def make_strategy(mode, n_clients, initial_weights):
+    """
+    Function to create the strategy of a mode: flwr's FedAvg, or the project's Strategy, which the streaming mode folds results into
+    """
+
+    kwargs = {
+        "min_available_clients": n_clients,
+        "min_fit_clients": n_clients,
+        "fraction_fit": 1.0,
+        "fraction_eval": 0.0,
+        "initial_parameters": fl.common.weights_to_parameters(initial_weights),
+    }
+    if mode == "fedavg":
+        return fl.server.strategy.FedAvg(**kwargs)
+
+    return Strategy(checkpoints=CheckpointWriter(tempfile.mkdtemp(), interval=2, report=lambda message: None), codec="none", **kwargs)
+
+
+def run(mode, n_clients, n_features, spread):
+    """
+    Function to run one round between n_clients in-process clients of a model with n_features features and 4 classes.
+    Returns the wall-clock seconds and the peak bytes the round allocated.
+    """
+
+    initial_weights = [np.zeros((4, n_features)), np.zeros(4)]
+    payload = fl.common.weights_to_parameters([np.random.RandomState(0).standard_normal(w.shape) for w in initial_weights])
+    client_manager = fl.server.SimpleClientManager()
+    for i in range(n_clients):
+        client = SyntheticClient(payload, latency=np.random.RandomState(i).uniform(0, spread))
+        client_manager.register(make_client_proxy(str(i), client))
+
+    strategy = make_strategy(mode, n_clients, initial_weights)
+    if mode == "streaming":
+        server = StreamingServer(client_manager, strategy, report=lambda message: None)
+    else:
+        # Every client trains at once, as the StreamingServer lets them
+        server = fl.server.Server(client_manager, strategy)
+        server.set_max_workers(n_clients)
+
+    with redirect_stdout(io.StringIO()):
+        _, elapsed, peak = measure(lambda: server.fit(1, None))
+    if hasattr(strategy, "checkpoints"):
+        strategy.checkpoints.close()
+
+    return elapsed, peak
+
+
+def main() -> None:
+    """
+    Function to compare the peak server memory of one round of aggregation, as the number of clients grows, between flwr's FedAvg,
+    the project's Strategy run by flwr's Server, which collects every result before aggregating, and the StreamingServer
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the server memory used to aggregate one round, by number of clients.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 100, 250, 500], help="Numbers of clients. Defaults to 50 100 250 500.")
+    parser.add_argument("--features", type=int, default=20000, help="Model features, with 4 classes. Defaults to 20000 (640 KB of weights).")
+    parser.add_argument("--spread", type=float, default=2.0, help="Client latencies are drawn uniformly from 0 to this many seconds. Defaults to 2.")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES, help="Aggregation modes to compare.")
+    parser.add_argument("--output", help="Optional path of a JSON file to write the results to.")
+    args = parser.parse_args()
+    logging.getLogger("flower").setLevel(logging.ERROR)
+
+    model_bytes = (4 * args.features + 4) * 8
+    results = []
+    print(f"model: {model_bytes / 1024 ** 2:.2f} MiB")
+    print(f"{'mode':>10} {'clients':>8} {'seconds':>8} {'peak MiB':>9} {'peak / model':>13}")
+    for mode in args.modes:
+        for n_clients in args.clients:
+            elapsed, peak = run(mode, n_clients, args.features, args.spread)
+            results.append({"mode": mode, "clients": n_clients, "seconds": elapsed, "peak_bytes": peak})
+
+            print(f"{mode:>10} {n_clients:>8} {elapsed:>8.2f} {peak / 1024 ** 2:>9.1f} {peak / model_bytes:>13.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"features": args.features, "model_bytes": model_bytes, "spread": args.spread, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
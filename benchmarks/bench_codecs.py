@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+from contextlib import redirect_stdout
+import argparse
+import tempfile
+import copy
+import json
+import logging
+import io
+import os
+import warnings
+from common import setup_experiment_path, make_client_proxy, SyntheticTransport
+from synthetic import make_packets
+
+setup_experiment_path()
+
+import flwr as fl
+from bases.checkpoints import CheckpointWriter
+from experiment.experiment import FederatedLogReg
+from experiment.flower_client import FlowerClient
+from experiment.get_eval_fn import eval_fn
+from experiment.strategy import Strategy
+from experiment.model import model
+import experiment.settings
+
+
+def make_experiment(packets):
+    """
+    Function to create a Synthea experiment that reads the given packets instead of querying the GraphQL-interface
+    """
+
+    return FederatedLogReg(
+        resource_url="http://synthetic",
+        filename=os.environ["FL_TABLE_FILE"],
+        client_number="1",
+        n_classes=experiment.settings.FL_N_CLASSES,
+        n_features=experiment.settings.FL_N_FEATURES,
+        random_state=experiment.settings.FL_RANDOM_STATE,
+        transport=SyntheticTransport(packets),
+    )
+
+
+def parse_codec(spec):
+    """
+    Function to turn a codec spec, eg. 'int8', 'int8-nodelta' or 'topk:0.05', into Strategy keyword arguments
+    """
+
+    codec, _, ratio = spec.partition(":")
+    delta = not codec.endswith("-nodelta")
+    codec = codec[:-len("-nodelta")] if not delta else codec
+    return {"codec": codec, "delta": delta, "topk_ratio": float(ratio) if ratio else 0.1}
+
+
+def run(site_packets, holdout, rounds, codec_kwargs):
+    """
+    Function to run rounds of federated learning between one in-process client per site, with the server evaluating every round
+    on the holdout. Returns the balanced accuracy after each round and the bytes the clients sent per round.
+    """
+
+    proxies = []
+    for i, packets in enumerate(site_packets):
+        site = make_experiment(packets)
+        fl_model = site.set_initial_params(copy.deepcopy(model))
+        proxies.append(make_client_proxy(str(i), FlowerClient(site, fl_model, site.load_data())))
+
+    evaluation = make_experiment([])
+    eval_model = evaluation.set_initial_params(copy.deepcopy(model))
+    evaluate = eval_fn(evaluation, eval_model, *holdout)
+    accuracies = []
+
+    def track(weights):
+        loss, metrics = evaluate(weights)
+        accuracies.append(metrics["balanced_accuracy"])
+        return loss, metrics
+
+    strategy = Strategy(
+        min_available_clients=len(proxies),
+        min_fit_clients=len(proxies),
+        eval_fn=track,
+        on_fit_config_fn=lambda rnd: {"rnd": rnd},
+        initial_parameters=fl.common.weights_to_parameters(list(evaluation.get_model_parameters(eval_model))),
+        checkpoints=CheckpointWriter(tempfile.mkdtemp(), interval=rounds + 1),
+        **codec_kwargs,
+    )
+
+    client_manager = fl.server.SimpleClientManager()
+    for proxy in proxies:
+        client_manager.register(proxy)
+
+    with redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        fl.server.Server(client_manager, strategy).fit(rounds, None)
+    strategy.checkpoints.close()
+
+    # The first evaluation is of the initial parameters
+    return accuracies[1:], sum(proxy.fit_bytes for proxy in proxies) / rounds
+
+
+def main() -> None:
+    """
+    Function to compare the bytes sent per round and the rounds needed to reach a target balanced accuracy for each parameter codec
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark the parameter codecs on the Synthea experiment with synthetic sites.")
+    parser.add_argument("--sites", type=int, default=3, help="Number of client sites. Defaults to 3.")
+    parser.add_argument("--patients", type=int, default=2000, help="Synthetic patients per site. Defaults to 2000.")
+    parser.add_argument("--rounds", type=int, default=20, help="Rounds of federated learning per codec. Defaults to 20.")
+    parser.add_argument("--target", type=float, default=0.85, help="Target balanced accuracy. Defaults to 0.85.")
+    parser.add_argument("--stage-signal", type=float, default=0.8, help="How strongly staging categories follow the stage. Defaults to 0.8.")
+    parser.add_argument("--codecs", nargs="+", default=["none", "float16", "int8", "int8-nodelta", "topk:0.3", "topk:0.1"],
+        help="Codecs to compare, as codec[-nodelta][:topk ratio].")
+    parser.add_argument("--output", help="Optional path of a JSON file to write the results to.")
+    args = parser.parse_args()
+    logging.getLogger("flower").setLevel(logging.ERROR)
+
+    site_packets = [make_packets(args.patients, seed=site, stage_signal=args.stage_signal) for site in range(args.sites)]
+    _, holdout = make_experiment(make_packets(args.patients, seed=args.sites, stage_signal=args.stage_signal)).load_data()
+
+    results = []
+    print(f"{'codec':>14} {'bytes/round':>12} {'rounds to target':>17} {'final bal. acc':>15}")
+    for spec in args.codecs:
+        accuracies, bytes_per_round = run(site_packets, holdout, args.rounds, parse_codec(spec))
+        reached = next((rnd for rnd, accuracy in enumerate(accuracies, start=1) if accuracy >= args.target), None)
+        results.append({"codec": spec, "bytes_per_round": bytes_per_round, "rounds_to_target": reached, "balanced_accuracy": accuracies})
+
+        print(f"{spec:>14} {bytes_per_round:>12.0f} {str(reached or '-'):>17} {accuracies[-1]:>15.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"target": args.target, "rounds": args.rounds, "sites": args.sites, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
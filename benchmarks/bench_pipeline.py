@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+from contextlib import redirect_stdout
+import subprocess
+import platform
+import argparse
+import logging
+import warnings
+import copy
+import json
+import gc
+import io
+import os
+import numpy as np
+from common import setup_experiment_path, profile, make_client_proxy, SyntheticClient
+from synthetic import make_packets
+
+setup_experiment_path()
+
+import flwr as fl
+from requests.models import Response
+from bases.checkpoints import CheckpointWriter
+from experiment.experiment import FederatedLogReg
+from experiment.flower_client import FlowerClient
+from experiment.helpers import encoders, parsers
+from experiment.strategy import Strategy
+from experiment.model import model
+import experiment.settings
+
+
+class EncodedTransport:
+    """
+    Stand-in for bases.transport.HTTPTransport that answers every request with the same JSON body, encoded once beforehand,
+    so that a request only costs building the response and decoding it, as for a response read off the wire
+    """
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+
+    def post(self, url, json_body):
+        response = Response()
+        response.status_code = 200
+        response._content = self.body
+        return response
+
+
+def make_experiment(body=b"{}"):
+    """
+    Function to create a Synthea experiment whose GraphQL requests are answered with body
+    """
+
+    return FederatedLogReg(
+        resource_url="http://synthetic",
+        filename=os.environ["FL_TABLE_FILE"],
+        client_number="1",
+        n_classes=experiment.settings.FL_N_CLASSES,
+        n_features=experiment.settings.FL_N_FEATURES,
+        random_state=experiment.settings.FL_RANDOM_STATE,
+        transport=EncodedTransport(body),
+    )
+
+
+def private(obj, name):
+    """
+    Function to get the name-mangled private method name of a FederatedLogReg, eg. '__create_dataframe'
+    """
+
+    return getattr(obj, f"_FederatedLogReg{name}")
+
+
+def parse_legacy(packets):
+    """
+    Function to parse packets with UniqueInfoParser and a PatientInfoParser per patient, as the experiment used to
+    """
+
+    uniq_finder = parsers.UniqueInfoParser(packets)
+    uniq_meds, uniq_procedures = uniq_finder.get_uniq_meds(), uniq_finder.get_uniq_procedures()
+    return [parsers.PatientInfoParser(uniq_meds, uniq_procedures, patient).get_patient_data() for patient in packets]
+
+
+def parse_columns(packets):
+    """
+    Function to parse packets into the columns __create_dataframe takes, as __preprocess_mcode_req does
+    """
+
+    counts = parsers.CountMatrixParser()
+    columns = encoders.ColumnEncoder()
+    counts.update(packets)
+    columns.update(packets)
+
+    patient_columns = columns.get_columns()
+    procedure_counts = counts.get_procedure_counts()
+    for procedure in procedure_counts.vocabulary:
+        patient_columns[procedure] = procedure_counts.column(procedure)
+    patient_columns["numberOfMeds"] = counts.get_med_counts().row_sums()
+    return patient_columns
+
+
+def run_data_stages(n_patients, args, record):
+    """
+    Function to time and measure each stage of loading a dataset of n_patients synthetic patients, from the GraphQL response
+    to the client's fit and evaluate, passing each stage's result on to the next
+    """
+
+    packets = make_packets(n_patients, seed=0, stage_signal=0.8)
+    body = json.dumps({"data": {"katsuDataModels": {"mcodeDataModels": {"mcodePackets": packets}}}}).encode()
+    del packets
+    gc.collect()
+
+    site = make_experiment(body)
+    query = site.create_query()
+    response_json, seconds, peak = profile(lambda: site.send_graphql_request(query).json(), repeat=args.repeat)
+    record("graphql_request", n_patients, seconds, peak, response_bytes=len(body))
+    del body
+    packets = response_json["data"]["katsuDataModels"]["mcodeDataModels"]["mcodePackets"]
+
+    if n_patients <= args.legacy_max_patients:
+        _, seconds, peak = profile(lambda: parse_legacy(packets), repeat=args.repeat)
+        record("parse_legacy", n_patients, seconds, peak)
+
+    columns, seconds, peak = profile(lambda: parse_columns(packets), repeat=args.repeat)
+    record("parse", n_patients, seconds, peak)
+    del response_json, packets
+    gc.collect()
+
+    df, seconds, peak = profile(private(site, "__create_dataframe"), lambda: (dict(columns),), repeat=args.repeat)
+    record("create_dataframe", n_patients, seconds, peak, rows=len(df))
+
+    sample_df, seconds, peak = profile(lambda: private(site, "__undersample_majority_class")(df), repeat=args.repeat)
+    record("undersample", n_patients, seconds, peak, rows=len(sample_df))
+
+    dataset, seconds, peak = profile(lambda: private(site, "__create_dataset_splits")(sample_df), repeat=args.repeat)
+    record("dataset_splits", n_patients, seconds, peak, rows=len(sample_df))
+
+    (X_train, y_train), (X_test, y_test) = dataset
+    mean, scale = private(site, "__fit_scaler")(X_train)
+    _, seconds, peak = profile(private(site, "__scale_data"), lambda: (X_train.copy(), mean, scale), repeat=args.repeat)
+    record("scale_data", n_patients, seconds, peak, rows=len(X_train))
+
+    client = FlowerClient(site, site.set_initial_params(copy.deepcopy(model)), dataset)
+    weights = [np.zeros_like(w) for w in site.get_model_parameters(client.fl_model)]
+    config = {"rnd": 1}
+    if args.local_epochs:
+        config.update({"local_epochs": args.local_epochs, "batch_size": args.batch_size})
+
+    # The client reports each round it trains on stdout
+    with redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        (fitted, _, _), fit_seconds, fit_peak = profile(lambda: client.fit(weights, config), repeat=args.repeat)
+        _, evaluate_seconds, evaluate_peak = profile(lambda: client.evaluate(fitted, {"rnd": 1}), repeat=args.repeat)
+
+    record("client_fit", n_patients, fit_seconds, fit_peak, rows=len(X_train), config=config)
+    record("client_evaluate", n_patients, evaluate_seconds, evaluate_peak, rows=len(X_test))
+
+
+def run_aggregation(n_clients, args, record):
+    """
+    Function to time and measure Strategy.aggregate_fit over the fit results of n_clients clients of the Synthea model
+    """
+
+    n_classes, n_features = experiment.settings.FL_N_CLASSES, experiment.settings.FL_N_FEATURES
+    initial = fl.common.weights_to_parameters([np.zeros((n_classes, n_features)), np.zeros(n_classes)])
+    client_manager = fl.server.SimpleClientManager()
+    proxies = [make_client_proxy(str(i), SyntheticClient(initial)) for i in range(n_clients)]
+    for proxy in proxies:
+        client_manager.register(proxy)
+
+    rng = np.random.RandomState(0)
+    results = [
+        (proxy, fl.common.FitRes(
+            parameters=fl.common.weights_to_parameters([rng.standard_normal((n_classes, n_features)), rng.standard_normal(n_classes)]),
+            num_examples=int(rng.randint(100, 1000)),
+            metrics={"codec": "none", "delta": False}))
+        for proxy in proxies
+    ]
+    strategy = Strategy(
+        min_available_clients=n_clients,
+        min_fit_clients=n_clients,
+        fraction_fit=1.0,
+        checkpoints=CheckpointWriter("", interval=0, report=lambda message: None),
+        codec="none",
+    )
+
+    def setup():
+        strategy.configure_fit(1, initial, client_manager)
+        return 1, results, []
+
+    _, seconds, peak = profile(strategy.aggregate_fit, setup, repeat=args.repeat)
+    record("aggregate_fit", None, seconds, peak, clients=n_clients)
+
+
+def get_commit():
+    """
+    Function to return the commit of the working tree the benchmarks ran on, or None outside of a git repository
+    """
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """
+    Function to print how the seconds and peak memory of each stage changed from the results in a previous JSON output
+    """
+
+    with open(baseline_path) as f:
+        baseline = {(r["stage"], r["patients"], r["clients"]): r for r in json.load(f)["results"]}
+
+    print(f"\ncompared to {baseline_path}:")
+    print(f"{'stage':>18} {'size':>9} {'seconds':>9} {'peak':>9}")
+    for r in results:
+        old = baseline.get((r["stage"], r["patients"], r["clients"]))
+        if old is not None:
+            size = r["patients"] if r["patients"] is not None else r["clients"]
+            print(f"{r['stage']:>18} {size:>9} {r['seconds'] / max(old['seconds'], 1e-9):>8.2f}x "
+                  f"{r['peak_bytes'] / max(old['peak_bytes'], 1):>8.2f}x")
+
+
+def main() -> None:
+    """
+    Function to time and measure the peak memory of every stage of the data, training and aggregation paths, for a range of
+    dataset sizes and numbers of clients, and to write the results to a JSON file that can be compared between commits
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the data, training and aggregation paths.")
+    parser.add_argument("--patients", type=int, nargs="+", default=[1000, 10000, 100000],
+        help="Numbers of synthetic patients. Defaults to 1000 10000 100000, 1000000 needs about 10 GB of memory.")
+    parser.add_argument("--clients", type=int, nargs="+", default=[2, 10, 50, 100, 500], help="Numbers of clients to aggregate. Defaults to 2 10 50 100 500.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs of each stage, the fastest of which is kept. Defaults to 3.")
+    parser.add_argument("--legacy-max-patients", type=int, default=100000,
+        help="Largest dataset the UniqueInfoParser/PatientInfoParser path is run on, as it is slow. Defaults to 100000.")
+    parser.add_argument("--local-epochs", type=float, default=0, help="Local epochs of a mini-batch client fit. Defaults to 0, a full fit.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch size of a mini-batch client fit. Defaults to 32.")
+    parser.add_argument("--output", help="Optional path of a JSON file to write the results to.")
+    parser.add_argument("--compare", help="Optional path of the JSON output of an earlier run to compare the results with.")
+    args = parser.parse_args()
+    logging.getLogger("flower").setLevel(logging.ERROR)
+
+    results = []
+
+    def record(stage, patients, seconds, peak, clients=None, **extra):
+        results.append({"stage": stage, "patients": patients, "clients": clients, "seconds": seconds, "peak_bytes": peak, **extra})
+        size = f"{patients} patients" if patients is not None else f"{clients} clients"
+        print(f"{stage:>18} {size:>16} {seconds:>10.4f} s {peak / 2 ** 20:>10.1f} MiB")
+
+    for n_patients in args.patients:
+        run_data_stages(n_patients, args, record)
+    for n_clients in args.clients:
+        run_aggregation(n_clients, args, record)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": get_commit(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "repeat": args.repeat,
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
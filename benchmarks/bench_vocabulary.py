@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import argparse
+from common import setup_experiment_path, measure
+from synthetic import make_packets
+
+setup_experiment_path()
+
+from experiment.helpers import parsers
+
+
+def parse_per_patient_dicts(packets):
+    """
+    Function to parse packets the original way: one pass per vocabulary, then a full vocabulary-sized dictionary per patient
+    """
+
+    uniq_finder = parsers.UniqueInfoParser(packets)
+    uniq_meds = uniq_finder.get_uniq_meds()
+    uniq_procedures = uniq_finder.get_uniq_procedures()
+    return [parsers.PatientInfoParser(uniq_meds, uniq_procedures, patient).get_patient_data() for patient in packets]
+
+
+def parse_single_pass(packets):
+    """
+    Function to parse packets with the single-pass CSR count encoder
+    """
+
+    counts = parsers.CountMatrixParser()
+    counts.update(packets)
+    patients = [parsers.PatientInfoParser(None, None, patient).get_patient_data() for patient in packets]
+    return patients, counts.get_med_counts(), counts.get_procedure_counts()
+
+
+def main() -> None:
+    """
+    Function to time and measure the peak memory of both parsing strategies over a range of medication vocabulary sizes
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmark medication/procedure count parsing against vocabulary size.")
+    parser.add_argument("--patients", type=int, default=5000, help="Number of synthetic patients. Defaults to 5000.")
+    parser.add_argument("--vocab-sizes", type=int, nargs="+", default=[10, 100, 1000, 5000], help="Medication vocabulary sizes to test.")
+    parser.add_argument("--meds-per-patient", type=int, default=4, help="Average medication statements per patient. Defaults to 4.")
+    args = parser.parse_args()
+
+    print(f"{'vocab':>8} {'dicts s':>10} {'dicts MiB':>10} {'csr s':>10} {'csr MiB':>10} {'speedup':>8}")
+    for vocab_size in args.vocab_sizes:
+        packets = make_packets(args.patients, n_meds=vocab_size, meds_per_patient=args.meds_per_patient)
+
+        _, dict_seconds, dict_peak = measure(lambda: parse_per_patient_dicts(packets))
+        _, csr_seconds, csr_peak = measure(lambda: parse_single_pass(packets))
+
+        print(f"{vocab_size:>8} {dict_seconds:>10.3f} {dict_peak / 2 ** 20:>10.1f} "
+              f"{csr_seconds:>10.3f} {csr_peak / 2 ** 20:>10.1f} {dict_seconds / csr_seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
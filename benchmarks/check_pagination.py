@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+Check that paged GraphQL requests load the same dataset as single requests, against the local GraphQL stand-in server
+"""
+
+import argparse
+import tempfile
+import logging
+import time
+import os
+import numpy as np
+from common import setup_experiment_path
+from graphql_server import SyntheticGraphQLServer, SyntheticTables, make_tables, write_table_file
+
+setup_experiment_path()
+
+from experiment.experiment import FederatedLogReg
+import experiment.settings
+
+
+def load(server, table_file, tables, page_size=None, page_concurrency=4, table_concurrency=1):
+    """
+    Function to load the dataset of the tables, numbered from 1 in table_file, served by server,
+    with single requests when page_size is None, otherwise page by page
+    """
+
+    site = FederatedLogReg(
+        resource_url=server.url,
+        filename=table_file,
+        client_number=",".join(map(str, tables)),
+        n_classes=experiment.settings.FL_N_CLASSES,
+        n_features=experiment.settings.FL_N_FEATURES,
+        random_state=experiment.settings.FL_RANDOM_STATE,
+        page_size=page_size,
+        page_concurrency=page_concurrency,
+        table_concurrency=table_concurrency,
+    )
+    return site.load_data()
+
+
+def assert_same(dataset, reference, case):
+    """
+    Function to assert that two datasets hold the same arrays, in the same dtypes
+    """
+
+    for (X, y), (X_ref, y_ref) in zip(dataset, reference):
+        assert X.dtype == X_ref.dtype and y.dtype == y_ref.dtype, f"{case}: dtypes differ"
+        assert np.array_equal(X, X_ref) and np.array_equal(y, y_ref), f"{case}: datasets differ"
+
+
+def check(server, table_file, tables, args) -> None:
+    """
+    Function to check that paged loads of the tables, whose last page is short, empty, or is fetched with more requests
+    in flight than there are pages, give the same dataset as loading each table with a single request
+    """
+
+    # Tables are loaded one at a time, as a single request holds its whole decoded table in memory
+    start = time.perf_counter()
+    reference = load(server, table_file, tables)
+    print(f"tables {tables[0]}-{tables[-1]}, {'single request':>34}: {len(reference[0][1]) + len(reference[1][1])} rows in {time.perf_counter() - start:.1f} seconds")
+
+    cases = [
+        (f"pages of {args.page_size}, short last page", args.page_size, 4),
+        (f"pages of {args.patients // 4}, empty last page", args.patients // 4, 2),
+        (f"pages of {args.patients // 2 + 1}, 8 in flight", args.patients // 2 + 1, 8),
+    ]
+    for case, page_size, page_concurrency in cases:
+        start = time.perf_counter()
+        assert_same(load(server, table_file, tables, page_size, page_concurrency, args.table_concurrency), reference, case)
+        print(f"tables {tables[0]}-{tables[-1]}, {case:>34}: same dataset in {time.perf_counter() - start:.1f} seconds")
+
+
+def main() -> None:
+    """
+    Function to serve synthetic tables and check that loading them page by page gives the same dataset as single requests
+    """
+
+    parser = argparse.ArgumentParser(description="Check that paged GraphQL requests load the same dataset as single requests.")
+    parser.add_argument("--tables", type=int, default=1, help="Number of tables. Defaults to 1.")
+    parser.add_argument("--patients", type=int, default=100000,
+        help="Patients per table. Defaults to 100000. --tables 10 --patients 100000 checks 1000000 packets.")
+    parser.add_argument("--page-size", type=int, default=7919, help="Page size of the paged loads with a short last page. Defaults to 7919.")
+    parser.add_argument("--table-concurrency", type=int, default=4,
+        help="Tables loaded at once by the paged loads. Defaults to 4. The pages of the tables fetched ahead are held until they are read.")
+    parser.add_argument("--per-table", action="store_true",
+        help="Check each table on its own, so that memory is bounded by a single table rather than by the whole dataset, eg. for 1000000 packets.")
+    args = parser.parse_args()
+    logging.getLogger("urllib3").setLevel(logging.ERROR)
+
+    if args.patients % 4:
+        parser.error("--patients must be a multiple of 4, for the pages that divide it exactly")
+    if args.patients % args.page_size == 0:
+        parser.error("--page-size must not divide --patients, so that the last page is short")
+
+    start = time.perf_counter()
+    tables = SyntheticTables(make_tables(args.tables, args.patients, stage_signal=0.8))
+    server = SyntheticGraphQLServer(("127.0.0.1", 0), tables)
+    server.start()
+    table_file = os.path.join(tempfile.mkdtemp(), "tables.txt")
+    write_table_file(table_file, tables.table_ids)
+    print(f"serving {args.tables} tables of {args.patients} packets on {server.url}, generated in {time.perf_counter() - start:.1f} seconds")
+
+    groups = [[i + 1] for i in range(args.tables)] if args.per_table else [list(range(1, args.tables + 1))]
+    try:
+        for group in groups:
+            check(server, table_file, group, args)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Shared setup for the benchmark scripts: makes the bases and the Synthea winter2022 experiment importable without Katsu or
+the GraphQL-interface running, and provides timing and memory measurement helpers.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import tempfile
+import tracemalloc
+import json
+import time
+import sys
+import os
+import re
+import flwr as fl
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASES_ROOT = os.path.join(REPO_ROOT, "experiments", "mock-experiment")
+EXPERIMENT_ROOT = os.path.join(REPO_ROOT, "experiments", "synthea-breast-cancer", "winter2022", "Federated")
+FAKE_TABLE_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def setup_experiment_path() -> None:
+    """
+    Function to put the bases and the experiment package on sys.path, pointing the experiment at a placeholder tables file
+    and disabling its dataset cache so that every run measures the full pipeline
+    """
+
+    if "FL_TABLE_FILE" not in os.environ:
+        table_file = os.path.join(tempfile.mkdtemp(), "tables.txt")
+        with open(table_file, "w") as f:
+            f.write(f"TABLE_UUID: {FAKE_TABLE_ID}\n")
+        os.environ["FL_TABLE_FILE"] = table_file
+
+    os.environ.setdefault("FL_CACHE_PATH", "")
+
+    for path in (BASES_ROOT, EXPERIMENT_ROOT):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+
+
+def measure(fn: Callable[[], Any]) -> Tuple[Any, float, int]:
+    """
+    Function to call fn once and return its result, the wall-clock seconds it took and the peak bytes it allocated
+    """
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def profile(fn: Callable[..., Any], setup: Optional[Callable[[], Tuple]] = None, repeat: int = 1) -> Tuple[Any, float, int]:
+    """
+    Function to call fn(*setup()) repeat times without tracing allocations, then once more under tracemalloc.
+    Returns the result of the last call, the fastest wall-clock seconds and the peak bytes allocated by the traced call.
+    setup runs before each call and is neither timed nor traced, eg. to copy arrays that fn modifies in place.
+    """
+
+    setup = setup or tuple
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        args = setup()
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+
+    args = setup()
+    result, _, peak = measure(lambda: fn(*args))
+    return result, best, peak
+
+
+class SyntheticTransport:
+    """
+    Stand-in for bases.transport.HTTPTransport that answers every GraphQL query from a list of mcodePackets held in memory,
+    honouring the offset and limit of paged queries. Responses are real JSON-encoded requests.Response objects.
+    """
+
+    def __init__(self, packets: List[Dict[str, Any]]) -> None:
+        self.packets = packets
+
+    def post(self, url: str, json_body: Dict[str, Any]):
+        from requests.models import Response
+
+        page = re.search(r"offset: (\d+), limit: (\d+)", json_body["query"])
+        packets = self.packets
+        if page is not None:
+            offset, limit = int(page.group(1)), int(page.group(2))
+            packets = packets[offset:offset + limit]
+
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps({"data": {"katsuDataModels": {"mcodeDataModels": {"mcodePackets": packets}}}}).encode()
+        return response
+
+
+class SyntheticClient(fl.client.Client):
+    """
+    flwr Client answering fit, after latency seconds, with a copy of a serialized payload, and evaluate with a loss of 0.
+    It is a Client rather than a NumPyClient, so that the only memory a fit allocates in the server's process is the copy
+    of the payload, as it would be for a message received from a remote client.
+    """
+
+    def __init__(self, payload: fl.common.Parameters, latency: float = 0.0, num_examples: int = 100) -> None:
+        self.payload = payload
+        self.latency = latency
+        self.num_examples = num_examples
+
+    def get_parameters(self) -> fl.common.ParametersRes:
+        return fl.common.ParametersRes(parameters=self.payload)
+
+    def fit(self, ins: fl.common.FitIns) -> fl.common.FitRes:
+        time.sleep(self.latency)
+        parameters = fl.common.Parameters(tensors=[bytes(bytearray(tensor)) for tensor in self.payload.tensors], tensor_type=self.payload.tensor_type)
+        return fl.common.FitRes(parameters=parameters, num_examples=self.num_examples, metrics={})
+
+    def evaluate(self, ins: fl.common.EvaluateIns) -> fl.common.EvaluateRes:
+        return fl.common.EvaluateRes(loss=0.0, num_examples=self.num_examples, metrics={})
+
+
+def make_client_proxy(cid: str, client: Any):
+    """
+    Function to wrap a flwr Client or NumPyClient in an in-process ClientProxy, so that a flwr Server can drive it without gRPC.
+    The proxy counts the bytes of the serialized parameters the client sends back from fit in its fit_bytes attribute.
+    """
+
+    from bases.simulation import InProcessClientProxy
+
+    return InProcessClientProxy(cid, client)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+"""
+Local stand-in for Katsu and the GraphQL-interface, answering the Synthea experiment's mcodePackets queries with synthetic packets
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import threading
+import argparse
+import random
+import json
+import gzip
+import time
+import uuid
+import re
+from synthetic import iter_packets, parse_rates, MISSING_FIELDS
+
+RESPONSE_PREFIX = b'{"data": {"katsuDataModels": {"mcodeDataModels": {"mcodePackets": ['
+RESPONSE_SUFFIX = b']}}}}'
+CHUNK_BYTES = 64 * 1024
+
+
+class SyntheticTables:
+    """
+    Katsu tables of synthetic mcodePackets, by table_id. Each packet is JSON-encoded once, so that answering a query only joins
+    the encoded packets of the requested page.
+    """
+
+    def __init__(self, tables: Dict[str, Iterable[dict]]) -> None:
+        self.table_ids = list(tables)
+        self.encoded = {table_id: [json.dumps(packet).encode() for packet in packets] for table_id, packets in tables.items()}
+
+    def page(self, table_id: Optional[str], offset: int = 0, limit: Optional[int] = None) -> bytes:
+        """
+        Return the JSON response holding the packets of table_id, or of every table if table_id is None, from offset to offset + limit.
+        Raises a KeyError for an unknown table_id.
+        """
+
+        if table_id is None:
+            packets = [packet for table_id in self.table_ids for packet in self.encoded[table_id]]
+        else:
+            packets = self.encoded[table_id]
+
+        end = None if limit is None else offset + limit
+        return RESPONSE_PREFIX + b", ".join(packets[offset:end]) + RESPONSE_SUFFIX
+
+
+def make_tables(n_tables: int, n_patients: int, seed: int = 1729, **kwargs) -> Dict[str, Iterator[dict]]:
+    """
+    Function to generate n_tables tables of n_patients synthetic packets each, with seeded table_ids. The packets of each table
+    are generated as they are iterated over, so that SyntheticTables only ever holds them encoded.
+    Keyword arguments are passed on to synthetic.iter_packets.
+    """
+
+    return {
+        str(uuid.UUID(int=random.Random(seed + i).getrandbits(128), version=4)): iter_packets(n_patients, seed=seed + i, **kwargs)
+        for i in range(n_tables)
+    }
+
+
+def parse_query(query: str) -> Tuple[Optional[str], int, Optional[int]]:
+    """
+    Function to return the table_id, offset and limit of an mcodePackets query, as built by the experiment's create_query and create_page_query
+    """
+
+    table = re.search(r'table:\s*"([^"]*)"', query)
+    offset = re.search(r"offset:\s*(\d+)", query)
+    limit = re.search(r"limit:\s*(\d+)", query)
+    return (
+        table.group(1) if table else None,
+        int(offset.group(1)) if offset else 0,
+        int(limit.group(1)) if limit else None,
+    )
+
+
+class GraphQLHandler(BaseHTTPRequestHandler):
+    """
+    Answers POSTed mcodePackets queries from the server's SyntheticTables, after the server's latency and at most at its bandwidth.
+    Every field of the packets is returned, whatever fields the query selects.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        try:
+            table_id, offset, limit = parse_query(json.loads(body)["query"])
+            response = self.server.tables.page(table_id, offset, limit)
+        except (ValueError, KeyError) as e:
+            response = json.dumps({"data": None, "errors": [{"message": f"bad query: {e!r}"}]}).encode()
+
+        if self.server.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            response = gzip.compress(response, compresslevel=1)
+            encoding = "gzip"
+        else:
+            encoding = None
+
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        self.send_body(response)
+
+    def send_body(self, response: bytes) -> None:
+        """
+        Write the response in chunks, pausing after each one so that it is sent at no more than the server's bandwidth
+        """
+
+        for start in range(0, len(response), CHUNK_BYTES):
+            chunk = response[start:start + CHUNK_BYTES]
+            self.wfile.write(chunk)
+            if self.server.bandwidth:
+                time.sleep(len(chunk) / self.server.bandwidth)
+
+    def log_message(self, format, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class SyntheticGraphQLServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering the experiment's GraphQL queries from SyntheticTables, with a fixed latency in seconds
+    before each response and a bandwidth in bytes per second, where 0 is unlimited
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        tables: SyntheticTables,
+        latency: float = 0.0,
+        bandwidth: float = 0.0,
+        compress: bool = False,
+        verbose: bool = False) -> None:
+
+        super().__init__(address, GraphQLHandler)
+        self.tables = tables
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.compress = compress
+        self.verbose = verbose
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> threading.Thread:
+        """
+        Serve on a background daemon thread, eg. from a benchmark, until shutdown is called
+        """
+
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def write_table_file(path: str, table_ids: List[str]) -> None:
+    """
+    Function to write table_ids to a tables.txt file, in the format the experiment reads
+    """
+
+    with open(path, "w") as f:
+        f.writelines(f"TABLE_UUID: {table_id}\n" for table_id in table_ids)
+
+
+def main() -> None:
+    """
+    Function to generate synthetic tables and serve them until interrupted
+    """
+
+    parser = argparse.ArgumentParser(description="Serve synthetic mcodePackets to the experiment's GraphQL queries, in place of Katsu and the GraphQL-interface.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on. Defaults to 127.0.0.1.")
+    parser.add_argument("--port", type=int, default=7500, help="Port to listen on. Defaults to 7500.")
+    parser.add_argument("--tables", type=int, default=1, help="Number of tables, one per client. Defaults to 1.")
+    parser.add_argument("--patients", type=int, default=1000, help="Patients per table. Defaults to 1000.")
+    parser.add_argument("--seed", type=int, default=1729, help="Seed of the first table, each next table uses the next seed. Defaults to 1729.")
+    parser.add_argument("--meds", type=int, default=50, help="Size of the medication vocabulary. Defaults to 50.")
+    parser.add_argument("--stage-signal", type=float, default=0.8, help="Probability that the tumour and nodes categories follow the stage. Defaults to 0.8.")
+    parser.add_argument("--stage-weights", type=float, nargs=4, help="Relative weights of stages 1 to 4. Defaults to equal weights.")
+    parser.add_argument("--missing", nargs="+", default=[], metavar="FIELD=RATE",
+        help=f"Rates at which fields are left out, eg. sex=0.05. Fields: {', '.join(MISSING_FIELDS)}.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response. Defaults to 0.")
+    parser.add_argument("--bandwidth", type=float, default=0.0, help="Bytes per second each response is sent at. Defaults to 0, unlimited.")
+    parser.add_argument("--gzip", action="store_true", help="Gzip responses to clients that accept it.")
+    parser.add_argument("--table-file", help="Optional path of a tables.txt file to write the table_ids to, for the experiment to read.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tables = SyntheticTables(make_tables(
+        args.tables, args.patients, args.seed,
+        n_meds=args.meds,
+        stage_signal=args.stage_signal,
+        stage_weights=args.stage_weights,
+        missing_rates=parse_rates(args.missing),
+    ))
+    print(f"generated {args.tables} tables of {args.patients} patients in {time.perf_counter() - start:.1f} seconds")
+
+    if args.table_file:
+        write_table_file(args.table_file, tables.table_ids)
+    for table_id in tables.table_ids:
+        print(f"TABLE_UUID: {table_id}")
+
+    server = SyntheticGraphQLServer((args.host, args.port), tables, args.latency, args.bandwidth, args.gzip, args.verbose)
+    print(f"serving on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
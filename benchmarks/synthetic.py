@@ -0,0 +1,149 @@
+"""
+Seeded generator of synthetic mcodePackets, shaped like the responses to the Synthea experiment's DEFAULT_QUERY
+"""
+
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+import random
+
+PROCEDURE_TYPES = ["surgical", "radiation"]
+STATUS_LABELS = ["Patient's condition improved", "Patient's condition worsened"]
+BREAST_CANCER = "Malignant neoplasm of breast (disorder)"
+STAGES = [1, 2, 3, 4]
+
+# Fields that can be left out of a packet, and what a GraphQL response holds in their place
+MISSING_FIELDS = (
+    "dateOfBirth",
+    "sex",
+    "dateOfDiagnosis",
+    "stageGroup",
+    "primaryTumorCategory",
+    "regionalNodesCategory",
+    "cancerDiseaseStatus",
+    "cancerRelatedProcedures",
+    "medicationStatement",
+)
+
+
+def make_packet(
+    rng: random.Random,
+    n_meds: int,
+    n_procedures: int,
+    meds_per_patient: int,
+    stage_signal: float = 0.0,
+    stage_weights: Optional[Sequence[float]] = None) -> Dict[str, Any]:
+    """
+    Function to generate a single mcodePacket with random staging, dates, procedures and medications.
+    With probability stage_signal, the tumour and nodes categories follow the stage, giving a model something to learn.
+    stage_weights are the relative weights of stages 1 to 4, which are equally likely without them.
+    """
+
+    stage = rng.choices(STAGES, stage_weights)[0] if stage_weights else rng.randint(1, 4)
+    date_of_birth = f"{rng.randint(1930, 1980)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    sex = "FEMALE" if rng.random() < 0.9 else "MALE"
+    date_of_diagnosis = f"{rng.randint(2000, 2020)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00Z"
+    if stage_signal > 0 and rng.random() < stage_signal:
+        primary, nodes = min(stage, 4), min(stage - 1, 3)
+    else:
+        primary, nodes = rng.randint(0, 4), rng.randint(0, 3)
+    procedure_types = PROCEDURE_TYPES + [f"procedure-{i}" for i in range(max(0, n_procedures - len(PROCEDURE_TYPES)))]
+
+    return {
+        "subject": {
+            "dateOfBirth": date_of_birth,
+            "sex": sex,
+        },
+        "cancerCondition": [{
+            "dateOfDiagnosis": date_of_diagnosis,
+            "tnmStaging": [{
+                "stageGroup": {"dataValue": {"label": f"Stage {stage} (qualifier value)"}},
+                "primaryTumorCategory": {"dataValue": {"label": f"T{primary} category (finding)"}},
+                "regionalNodesCategory": {"dataValue": {"label": f"N{nodes} category (finding)"}},
+            }],
+            "code": {"label": BREAST_CANCER},
+        }],
+        "cancerRelatedProcedures": [
+            {"procedureType": rng.choice(procedure_types)} for _ in range(rng.randint(0, 4))
+        ],
+        "cancerDiseaseStatus": {"label": rng.choice(STATUS_LABELS)},
+        "medicationStatement": [
+            {"medicationCode": {"label": f"medication-{rng.randrange(n_meds)}"}} for _ in range(rng.randint(0, 2 * meds_per_patient))
+        ],
+    }
+
+
+def drop_fields(packet: Dict[str, Any], rng: random.Random, missing_rates: Mapping[str, float]) -> Dict[str, Any]:
+    """
+    Function to leave fields of a packet out, each with its rate in missing_rates, keyed by the names in MISSING_FIELDS.
+    Missing scalars and labels become null, as in a GraphQL response, while missing lists become empty.
+    """
+
+    staging = packet["cancerCondition"][0]["tnmStaging"][0]
+    for field in MISSING_FIELDS:
+        if rng.random() >= missing_rates.get(field, 0.0):
+            continue
+        if field in ("dateOfBirth", "sex"):
+            packet["subject"][field] = None
+        elif field == "dateOfDiagnosis":
+            packet["cancerCondition"][0][field] = None
+        elif field in staging:
+            staging[field]["dataValue"]["label"] = None
+        elif field == "cancerDiseaseStatus":
+            packet[field] = None
+        else:
+            packet[field] = []
+
+    return packet
+
+
+def iter_packets(
+    n_patients: int,
+    n_meds: int = 50,
+    n_procedures: int = 2,
+    meds_per_patient: int = 4,
+    seed: int = 1729,
+    stage_signal: float = 0.0,
+    stage_weights: Optional[Sequence[float]] = None,
+    missing_rates: Optional[Mapping[str, float]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Function to yield the packets of make_packets one at a time, eg. to encode a large table without holding every packet
+    """
+
+    unknown = set(missing_rates or ()) - set(MISSING_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields {', '.join(sorted(unknown))}, expected some of {', '.join(MISSING_FIELDS)}")
+
+    rng = random.Random(seed)
+    missing_rng = random.Random(f"{seed}-missing")
+    for _ in range(n_patients):
+        packet = make_packet(rng, n_meds, n_procedures, meds_per_patient, stage_signal, stage_weights)
+        yield drop_fields(packet, missing_rng, missing_rates) if missing_rates else packet
+
+
+def make_packets(
+    n_patients: int,
+    n_meds: int = 50,
+    n_procedures: int = 2,
+    meds_per_patient: int = 4,
+    seed: int = 1729,
+    stage_signal: float = 0.0,
+    stage_weights: Optional[Sequence[float]] = None,
+    missing_rates: Optional[Mapping[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    Function to generate n_patients mcodePackets, drawing medications from a vocabulary of n_meds labels.
+    Fields are left out at the rates in missing_rates, drawn from a separate random stream so that the rest of each packet
+    is the same for a given seed whatever the rates.
+    """
+
+    return list(iter_packets(n_patients, n_meds, n_procedures, meds_per_patient, seed, stage_signal, stage_weights, missing_rates))
+
+
+def parse_rates(pairs: Sequence[str]) -> Dict[str, float]:
+    """
+    Function to parse command-line pairs like 'sex=0.1' into a dict of missing-field rates
+    """
+
+    rates = {}
+    for pair in pairs:
+        field, _, rate = pair.partition("=")
+        rates[field] = float(rate)
+    return rates
@@ -0,0 +1,55 @@
+from typing import Any, Dict, List, Optional, Sequence
+from bases.codecs import accumulate_values, negotiate
+import numpy as np
+
+
+class StreamingAggregator:
+    """
+    Server side weighted average of the parameters the clients send back from fit, folded in one client at a time as they arrive.
+    Each client's arrays are decoded straight into running weighted sums allocated once per round, so the memory used is that of
+    one model, however many clients take part, and a client's payload can be released as soon as it has been added.
+    """
+
+    def __init__(self, received: Sequence[np.ndarray]) -> None:
+        """
+        received are the global weights sent with the fit instructions, which deltas are taken from
+        """
+
+        self.received = received
+        self.count = 0
+        self.total_weight = 0.0
+        self._sums: Optional[List[np.ndarray]] = None
+        self._delta_weight = 0.0
+
+    def add(self, arrays: Sequence[np.ndarray], metrics: Dict[str, Any], weight: float) -> None:
+        """
+        Fold in one client's arrays, encoded as described by the codec settings in its fit metrics, with the given weight
+        """
+
+        if self._sums is None:
+            self._sums = [np.zeros(np.shape(w), dtype=np.float64) for w in self.received]
+
+        settings = negotiate(metrics)
+        # Deltas are all taken from the same weights, which are added in once, times their total weight, by result
+        if settings["delta"]:
+            self._delta_weight += weight
+        accumulate_values(self._sums, arrays, settings, weight)
+
+        self.total_weight += weight
+        self.count += 1
+
+    def result(self) -> Optional[List[np.ndarray]]:
+        """
+        Return the weighted average of the parameters added, or None if none were. The running sums are turned into the average
+        in place, so the aggregator can not be added to afterwards.
+        """
+
+        if self._sums is None or self.total_weight <= 0:
+            return None
+
+        for total, reference in zip(self._sums, self.received):
+            if self._delta_weight:
+                total += self._delta_weight * reference
+            total /= self.total_weight
+
+        return self._sums
@@ -0,0 +1,167 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from bases.codecs import accumulate_update
+import numpy as np
+import flwr as fl
+import timeit
+import time
+
+DEFAULT_CONCURRENCY = 256
+# How long the dispatch loop waits for a fit to finish before looking for newly connected clients
+POLL_INTERVAL = 1.0
+
+
+def staleness_weight(staleness: int, exponent: float) -> float:
+    """
+    Return the factor an update is down-weighted by when its base model is staleness versions older than the global model,
+    the polynomial (1 + staleness) ** -exponent of FedAsync and FedBuff
+    """
+
+    return (1.0 + staleness) ** -exponent
+
+
+class AsyncServer(fl.server.Server):
+    """
+    Buffered asynchronous federated learning, after FedBuff (Nguyen et al., 2022). There is no round barrier: every client trains
+    on the newest global model as soon as it is idle, and the server aggregates as soon as buffer_size updates have arrived,
+    whichever clients they came from. Each update is the change a client made to the model version it was sent, and is weighted
+    by the examples it trained on, down-weighted by staleness_weight for every version the global model has moved on since.
+    A round, as counted by num_rounds, evaluations and checkpoints, is one aggregation, ie. one new version of the global model.
+
+    The strategy is used for its initial parameters, server-side evaluation and, when it defines them, fit_config(rnd), which returns
+    the config sent with every fit, and save_checkpoint(rnd, weights, metrics). Clients are not asked to evaluate, since they are
+    always busy fitting.
+    """
+
+    def __init__(
+        self,
+        client_manager: fl.server.client_manager.ClientManager,
+        strategy: fl.server.strategy.Strategy,
+        buffer_size: int = 2,
+        staleness_exponent: float = 0.5,
+        max_staleness: Optional[int] = None,
+        server_learning_rate: float = 1.0,
+        concurrency: Optional[int] = None,
+        report: Callable[[str], None] = print) -> None:
+        """
+        Updates more than max_staleness versions old are dropped, and none are when it is None or 0. The aggregated change is scaled
+        by server_learning_rate before it is applied to the global model. concurrency bounds the number of clients training at once.
+        """
+
+        super().__init__(client_manager, strategy)
+        self.buffer_size = max(1, buffer_size)
+        self.staleness_exponent = staleness_exponent
+        self.max_staleness = max_staleness or None
+        self.server_learning_rate = server_learning_rate
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY
+        self.report = report
+
+        self.version = 0
+        self.weights: List[np.ndarray] = []
+        self._buffer: List[np.ndarray] = []
+        self._buffer_weight = 0.0
+        self._buffered: List[Tuple[int, Dict[str, Any]]] = []
+
+    def fit(self, num_rounds: int, timeout: Optional[float]) -> fl.server.history.History:
+        history = fl.server.history.History()
+        self.parameters = self._get_initial_parameters(timeout=timeout)
+        self.weights = fl.common.parameters_to_weights(self.parameters)
+        self.__evaluate(history, 0)
+        self.__reset_buffer()
+
+        self._client_manager.wait_for(getattr(self.strategy, "min_available_clients", 1))
+        start_time = timeit.default_timer()
+
+        # Every fit in flight is mapped to its client and to the version and weights it was sent
+        running: Dict[Future, Tuple[fl.server.client_proxy.ClientProxy, int, List[np.ndarray]]] = {}
+        failed: Set[str] = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="async-fit") as executor:
+            while self.version < num_rounds:
+                busy = {client.cid for client, _, _ in running.values()}
+                for cid, client in self._client_manager.all().items():
+                    if len(running) >= self.concurrency:
+                        break
+                    if cid not in busy and cid not in failed:
+                        fit_ins = fl.common.FitIns(self.parameters, self.__fit_config(self.version + 1))
+                        running[executor.submit(client.fit, fit_ins, timeout)] = (client, self.version, self.weights)
+
+                if not running:
+                    # Every client has failed or disconnected since the last aggregation, so they are all given another try
+                    failed.clear()
+                    time.sleep(POLL_INTERVAL)
+                    continue
+
+                done, _ = wait(list(running), timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    client, base_version, base_weights = running.pop(future)
+                    if future.exception() is not None:
+                        # Left out until the next aggregation, rather than retried straight away
+                        failed.add(client.cid)
+                        self.report(f"[async] client {client.cid} failed to fit. Error: {future.exception()}")
+                    elif self.__add_update(future.result(), base_version, base_weights) and self.version < num_rounds:
+                        self.__aggregate()
+                        self.__evaluate(history, self.version, start_time)
+                        failed.clear()
+
+            # The updates still in flight can no longer be used, but the clients are left to finish before they are disconnected
+            self.report(f"[async] {self.version} versions aggregated, waiting for {len(running)} clients to finish their fit")
+
+        self.report(f"[async] finished in {timeit.default_timer() - start_time:.1f}s")
+        return history
+
+    def __fit_config(self, rnd: int) -> Dict[str, Any]:
+        if hasattr(self.strategy, "fit_config"):
+            return self.strategy.fit_config(rnd)
+
+        on_fit_config_fn = getattr(self.strategy, "on_fit_config_fn", None)
+        return on_fit_config_fn(rnd) if on_fit_config_fn is not None else {}
+
+    def __reset_buffer(self) -> None:
+        self._buffer = [np.zeros(np.shape(w), dtype=np.float64) for w in self.weights]
+        self._buffer_weight = 0.0
+        self._buffered = []
+
+    def __add_update(self, fit_res: fl.common.FitRes, base_version: int, base_weights: List[np.ndarray]) -> bool:
+        """
+        Fold the change a client made to base_weights into the buffer, weighted by its examples and staleness,
+        and return whether the buffer is full
+        """
+
+        staleness = self.version - base_version
+        if self.max_staleness is not None and staleness > self.max_staleness:
+            self.report(f"[async] dropped an update {staleness} versions old")
+            return False
+
+        weight = fit_res.metrics.get("num_examples_seen", fit_res.num_examples) * staleness_weight(staleness, self.staleness_exponent)
+        accumulate_update(self._buffer, fl.common.parameters_to_weights(fit_res.parameters), fit_res.metrics, base_weights, weight)
+        for total, base in zip(self._buffer, base_weights):
+            total -= weight * base
+
+        self._buffer_weight += weight
+        self._buffered.append((staleness, fit_res.metrics))
+        return len(self._buffered) >= self.buffer_size
+
+    def __aggregate(self) -> None:
+        scale = self.server_learning_rate / self._buffer_weight if self._buffer_weight > 0 else 0.0
+        self.weights = [w + scale * change for w, change in zip(self.weights, self._buffer)]
+        self.parameters = fl.common.weights_to_parameters(self.weights)
+        self.version += 1
+
+        staleness = [s for s, _ in self._buffered]
+        metrics = {"updates": len(staleness), "mean_staleness": float(np.mean(staleness)), "max_staleness": max(staleness)}
+        self.report(f"[async] version {self.version}: aggregated {metrics['updates']} updates, mean staleness {metrics['mean_staleness']:.2f}")
+        if hasattr(self.strategy, "save_checkpoint"):
+            self.strategy.save_checkpoint(self.version, self.weights, metrics)
+
+        self.__reset_buffer()
+
+    def __evaluate(self, history: fl.server.history.History, rnd: int, start_time: Optional[float] = None) -> None:
+        result = self.strategy.evaluate(parameters=self.parameters)
+        if result is None:
+            return
+
+        loss, metrics = result
+        history.add_loss_centralized(rnd=rnd, loss=loss)
+        history.add_metrics_centralized(rnd=rnd, metrics=metrics)
+        if start_time is not None:
+            self.report(f"[async] version {rnd}: loss {loss}, metrics {metrics}, {timeit.default_timer() - start_time:.1f}s")
@@ -1,6 +1,10 @@
+from bases.transport import HTTPTransport
+from bases.tracing import Tracer
 from requests.models import Response
 from abc import ABC, abstractmethod
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional
 import requests
 
 class DataFetchError(Exception):
@@ -18,9 +22,16 @@ class Experiment(ABC):
     Abstract Base Class used for creating federated-learning experiments
     """
     
-    def __init__(self, resource_url: Optional[str] = None, random_state: Optional[int] = 1) -> None:
+    def __init__(
+        self,
+        resource_url: Optional[str] = None,
+        random_state: Optional[int] = 1,
+        transport: Optional[HTTPTransport] = None,
+        tracer: Optional[Tracer] = None) -> None:
         self.resource_url = resource_url
         self.RANDOM_STATE = random_state
+        self.transport = transport if transport is not None else HTTPTransport()
+        self.tracer = tracer if tracer is not None else Tracer()
         super().__init__()
     
     @abstractmethod
@@ -37,6 +48,13 @@ class Experiment(ABC):
         """
         pass
 
+    def load_holdout(self):
+        """
+        Return a Tuple containing only the X and y testing data, in the same form as the second sub-tuple returned by load_data.
+        Used by the fl-server, which never trains. Override it when the testing data can be loaded without building the training data, the default simply discards the training split.
+        """
+        return self.load_data()[1]
+
     @abstractmethod
     def get_model_parameters(self, model):
         """
@@ -61,13 +79,55 @@ class Experiment(ABC):
     def send_graphql_request(self, query: str) -> Response:
         """
         Send a GraphQL query with a properly formatted GraphQL query string and return a Response object containing the collected response.
+        The request goes through the experiment's transport, which pools connections, compresses payloads and retries transient failures.
         """
         
         if self.resource_url is None:
             raise DataFetchError(f"No URL specified")
 
-        request = requests.post(self.resource_url, json={"query": query})
+        try:
+            request = self.transport.post(self.resource_url, {"query": query})
+        except requests.exceptions.RequestException as e:
+            raise DataFetchError(f"Could not query GraphQL. Error: {e}")
+
         if request.status_code != 200:
             raise DataFetchError(f"Could not query GraphQL. Error code: {request.status_code}")
         
-        return request
\ No newline at end of file
+        return request
+
+    def send_paginated_graphql_request(
+        self,
+        page_query: Callable[[int, int], str],
+        extract_page: Callable[[Dict[str, Any]], List[Any]],
+        page_size: int,
+        max_concurrency: Optional[int] = 4) -> Iterator[List[Any]]:
+        """
+        Send a series of bounded GraphQL page queries, with at most max_concurrency of them in flight at once, and yield the records of each page in order.
+        page_query builds the query string for an (offset, limit) pair and extract_page pulls the list of records out of a decoded page response.
+        Pages are requested until one comes back with fewer than page_size records.
+        """
+
+        if page_size < 1:
+            raise ValueError(f"page_size must be a positive integer, got {page_size}")
+
+        max_concurrency = max(1, max_concurrency or 1)
+
+        def fetch_page(page: int) -> List[Any]:
+            return extract_page(self.send_graphql_request(page_query(page * page_size, page_size)).json())
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            pending = deque(executor.submit(fetch_page, page) for page in range(max_concurrency))
+            next_page = max_concurrency
+
+            while pending:
+                records = pending.popleft().result()
+                if records:
+                    yield records
+
+                if len(records) < page_size:
+                    for future in pending:
+                        future.cancel()
+                    break
+
+                pending.append(executor.submit(fetch_page, next_page))
+                next_page += 1
@@ -1,4 +1,8 @@
 from abc import ABC, abstractmethod
+from bases.codecs import ErrorFeedbackEncoder, negotiate
+from bases.tracing import Tracer
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
 import flwr as fl
 
 class BaseFlowerClient(fl.client.NumPyClient, ABC):
@@ -6,6 +10,8 @@ class BaseFlowerClient(fl.client.NumPyClient, ABC):
         self.experiment = experiment
         self.fl_model = fl_model
         self.dataset = dataset
+        self.encoder = ErrorFeedbackEncoder()
+        self.tracer = getattr(experiment, "tracer", None) or Tracer()
         super().__init__()
 
     @abstractmethod
@@ -27,4 +33,13 @@ class BaseFlowerClient(fl.client.NumPyClient, ABC):
         """
         Evaluate the model based on several criteria like loss. Return a tuple containing the loss, length of the test dataset and any extra evaluation metrics, stored in a dictionary
         """
-        pass
\ No newline at end of file
+        pass
+
+    def encode_parameters(self, parameters: Sequence[np.ndarray], received: Sequence[np.ndarray], config: Dict[str, Any]) -> Tuple[List[np.ndarray], Dict[str, Any]]:
+        """
+        Encode the parameters fit returns with the codec the server asked for in config, given the parameters received at the start of the round.
+        Returns the encoded arrays and the extra properties telling the server how to decode them. Children call this at the end of fit.
+        """
+
+        codec = negotiate(config)
+        return self.encoder.encode(parameters, received, codec), codec
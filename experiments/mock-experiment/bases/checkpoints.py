@@ -0,0 +1,296 @@
+from typing import Any, Callable, Dict, List, Optional
+from queue import Queue
+import numpy as np
+import threading
+import json
+import time
+import os
+import re
+
+INDEX_FILE = "index.json"
+CHECKPOINT_PATTERN = re.compile(r"round-(\d+)-weights\.npz")
+FORMATS = ("npz", "compressed", "delta")
+
+
+def _to_json(value: Any) -> Any:
+    # Metrics computed with numpy (eg. np.int64) are not serializable by json as they are
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def checkpoint_filename(rnd: int) -> str:
+    """
+    Return the file name of the checkpoint of round rnd
+    """
+
+    return f"round-{rnd}-weights.npz"
+
+
+def read_index(path: str) -> Dict[str, Any]:
+    """
+    Return the checkpoint index stored in the directory path, or an empty index if there is none
+    """
+
+    try:
+        with open(os.path.join(path, INDEX_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"checkpoints": []}
+
+
+def latest_round(path: str) -> Optional[int]:
+    """
+    Return the latest round checkpointed in the directory path, or None if there is none.
+    The index is used when present, otherwise the round-N-weights.npz file names are parsed, eg. for checkpoints saved before the index existed.
+    """
+
+    rounds = [entry["round"] for entry in read_index(path)["checkpoints"]]
+    if not rounds and os.path.isdir(path):
+        rounds = [int(match.group(1)) for match in map(CHECKPOINT_PATTERN.fullmatch, os.listdir(path)) if match]
+
+    return max(rounds) if rounds else None
+
+
+def load_checkpoint(path: str, rnd: Optional[int] = None) -> Optional[List[np.ndarray]]:
+    """
+    Return the weights saved for round rnd in the directory path, or those of the latest round if rnd is None.
+    Delta checkpoints are added back onto the full checkpoint they were taken against. Returns None if there is no such checkpoint.
+    """
+
+    if rnd is None:
+        rnd = latest_round(path)
+
+    entries = {entry["round"]: entry for entry in read_index(path)["checkpoints"]}
+    entry = entries.get(rnd, {"round": rnd, "file": checkpoint_filename(rnd)}) if rnd is not None else None
+    if entry is None or not os.path.isfile(os.path.join(path, entry["file"])):
+        return None
+
+    with np.load(os.path.join(path, entry["file"])) as arrays:
+        weights = [arrays[f"arr_{i}"] for i in range(len(arrays.files))]
+
+    if entry.get("base") is not None:
+        base = load_checkpoint(path, entry["base"])
+        weights = [b + d for b, d in zip(base, weights)]
+
+    return weights
+
+
+class CheckpointWriter:
+    """
+    Saves model weights every interval rounds on a background thread, so that aggregation never waits on the disk.
+    Each checkpoint is written to a temporary file and renamed into place, and is listed, with its round and metrics,
+    in an index.json file kept next to it, from which the latest or best checkpoint can be found without listing the directory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        interval: int = 10,
+        keep_last: Optional[int] = None,
+        keep_best: Optional[int] = None,
+        best_metric: str = "loss",
+        best_mode: str = "min",
+        format: str = "npz",
+        full_every: int = 10,
+        resume: bool = False,
+        report: Callable[[str], None] = print) -> None:
+        """
+        An interval of 0 disables checkpointing, eg. for the regional aggregators of a hierarchical topology.
+        keep_last and keep_best bound the number of checkpoints retained, by round and by best_metric (lower is better when best_mode is 'min').
+        Either being None or 0 disables retention by that criterion, and with both disabled every checkpoint is kept.
+        With keep_best, up to keep_best checkpoints newer than the latest one with a best_metric are kept until update_metrics ranks them.
+        format is one of 'npz', 'compressed' (savez_compressed) or 'delta', which stores the compressed difference from the last full checkpoint,
+        writing a full checkpoint every full_every checkpoints.
+        With resume, the index and checkpoints already in path are continued, eg. when the fl-server resumes from them. Otherwise they are
+        moved to a previous-<time> subdirectory, so that neither the retention nor a later resume mixes them up with the checkpoints of this run.
+        """
+
+        if format not in FORMATS:
+            raise ValueError(f"Unknown checkpoint format {format}, expected one of {', '.join(FORMATS)}")
+        if best_mode not in ("min", "max"):
+            raise ValueError(f"best_mode must be 'min' or 'max', got {best_mode}")
+
+        self.path = path
+        self.interval = max(0, interval)
+        self.keep_last = keep_last or None
+        self.keep_best = keep_best or None
+        self.best_metric = best_metric
+        self.best_mode = best_mode
+        self.format = format
+        self.full_every = max(1, full_every)
+        self.report = report
+
+        self._index = read_index(path) if resume else {"checkpoints": []}
+        if not resume and self.interval > 0:
+            self._archive_previous_run()
+        self._base: Optional[List[np.ndarray]] = None
+        self._base_round: Optional[int] = None
+        self._since_full = 0
+
+        self._queue: Queue = Queue()
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def is_due(self, rnd: int) -> bool:
+        """
+        Return whether a checkpoint should be saved for round rnd
+        """
+
+        return self.interval > 0 and rnd % self.interval == 0
+
+    def submit(self, rnd: int, weights: List[np.ndarray], metrics: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Queue the weights of round rnd to be saved, if a checkpoint is due for that round, and return whether they were queued.
+        The arrays must not be modified afterwards, since they are written out later.
+        """
+
+        if not self.is_due(rnd):
+            return False
+
+        self._queue.put((self._write, (rnd, weights, dict(metrics or {}))))
+        return True
+
+    def update_metrics(self, rnd: int, metrics: Dict[str, Any]) -> None:
+        """
+        Attach metrics that became known after the checkpoint of round rnd was submitted, such as its evaluation loss.
+        Ignored when no checkpoint is saved for that round.
+        """
+
+        self._queue.put((self._update_metrics, (rnd, dict(metrics))))
+
+    def flush(self) -> None:
+        """
+        Block until every queued checkpoint has been written
+        """
+
+        self._queue.join()
+
+    def close(self) -> None:
+        """
+        Write the queued checkpoints and stop the background thread
+        """
+
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                fn, args = task
+                fn(*args)
+            except Exception as e:
+                self.report(f"[checkpoint] could not save checkpoint. Error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, rnd: int, weights: List[np.ndarray], metrics: Dict[str, Any]) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+        base_round = None
+        arrays = weights
+        if self.format == "delta" and self._base is not None and self._since_full < self.full_every \
+                and self._base_round in self._rounds():
+            base_round = self._base_round
+            arrays = [w - b for w, b in zip(weights, self._base)]
+            self._since_full += 1
+        elif self.format == "delta":
+            self._base = [np.array(w, copy=True) for w in weights]
+            self._base_round = rnd
+            self._since_full = 1
+
+        filename = checkpoint_filename(rnd)
+        tmp_file = os.path.join(self.path, f".tmp-{filename}")
+        with open(tmp_file, "wb") as f:
+            if self.format == "npz":
+                np.savez(f, *arrays)
+            else:
+                np.savez_compressed(f, *arrays)
+        os.replace(tmp_file, os.path.join(self.path, filename))
+
+        self._index["checkpoints"] = [entry for entry in self._index["checkpoints"] if entry["round"] != rnd]
+        self._index["checkpoints"].append({
+            "round": rnd,
+            "file": filename,
+            "format": self.format,
+            "base": base_round,
+            "metrics": metrics,
+            "time": time.time(),
+        })
+        self._apply_retention()
+        self.report(f"[checkpoint] saved round {rnd} to {filename}")
+
+    def _update_metrics(self, rnd: int, metrics: Dict[str, Any]) -> None:
+        for entry in self._index["checkpoints"]:
+            if entry["round"] == rnd:
+                entry["metrics"].update(metrics)
+                self._apply_retention()
+                return
+
+    def _archive_previous_run(self) -> None:
+        if not os.path.isdir(self.path):
+            return
+
+        stale = [name for name in os.listdir(self.path) if name == INDEX_FILE or CHECKPOINT_PATTERN.fullmatch(name)]
+        if not stale:
+            return
+
+        archive = os.path.join(self.path, f"previous-{time.strftime('%Y%m%d-%H%M%S')}")
+        os.makedirs(archive, exist_ok=True)
+        for name in stale:
+            os.replace(os.path.join(self.path, name), os.path.join(archive, name))
+        self.report(f"[checkpoint] moved the checkpoints of a previous run to {archive}")
+
+    def _rounds(self) -> List[int]:
+        return [entry["round"] for entry in self._index["checkpoints"]]
+
+    def _apply_retention(self) -> None:
+        entries = sorted(self._index["checkpoints"], key=lambda entry: entry["round"])
+
+        if self.keep_last is None and self.keep_best is None:
+            keep = {entry["round"] for entry in entries}
+        else:
+            keep = set()
+            if self.keep_last is not None:
+                keep.update(entry["round"] for entry in entries[-self.keep_last:])
+            if self.keep_best is not None:
+                ranked = [entry for entry in entries if isinstance(entry["metrics"].get(self.best_metric), (int, float))]
+                ranked.sort(key=lambda entry: entry["metrics"][self.best_metric], reverse=self.best_mode == "max")
+                keep.update(entry["round"] for entry in ranked[:self.keep_best])
+
+                # Checkpoints newer than the latest ranked one may still get their metric from update_metrics, so the most recent
+                # of them are kept. Older unranked checkpoints never got one, eg. rounds evaluated before the holdout was ready.
+                latest_ranked = max((entry["round"] for entry in ranked), default=None)
+                pending = [entry for entry in entries if entry not in ranked and (latest_ranked is None or entry["round"] > latest_ranked)]
+                keep.update(entry["round"] for entry in pending[-self.keep_best:])
+
+        # A retained delta checkpoint needs the full checkpoint it was taken against
+        keep.update(entry["base"] for entry in entries if entry["round"] in keep and entry.get("base") is not None)
+
+        for entry in entries:
+            if entry["round"] not in keep:
+                try:
+                    os.remove(os.path.join(self.path, entry["file"]))
+                except FileNotFoundError:
+                    pass
+
+        self._index["checkpoints"] = [entry for entry in entries if entry["round"] in keep]
+        self._write_index()
+
+    def _write_index(self) -> None:
+        retained = self._index["checkpoints"]
+        ranked = [entry for entry in retained if isinstance(entry["metrics"].get(self.best_metric), (int, float))]
+        best = None
+        if ranked:
+            pick = min if self.best_mode == "min" else max
+            best = pick(ranked, key=lambda entry: entry["metrics"][self.best_metric])["round"]
+
+        self._index["latest"] = max(self._rounds()) if retained else None
+        self._index["best"] = best
+        self._index["best_metric"] = self.best_metric
+
+        tmp_file = os.path.join(self.path, f".tmp-{INDEX_FILE}")
+        with open(tmp_file, "w") as f:
+            json.dump(self._index, f, indent=2, default=_to_json)
+        os.replace(tmp_file, os.path.join(self.path, INDEX_FILE))
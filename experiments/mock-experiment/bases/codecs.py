@@ -0,0 +1,156 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+CODECS = ("none", "float16", "int8", "topk")
+INT8_LEVELS = 127
+DEFAULT_TOPK_RATIO = 0.1
+
+
+def quantize(weights: Sequence[np.ndarray], codec: str, topk_ratio: float = DEFAULT_TOPK_RATIO) -> List[np.ndarray]:
+    """
+    Encode a list of tensors with codec. float16 stores each tensor in 2 bytes per value, while int8 stores each tensor as int8 codes
+    and appends one float32 array holding the scale of every tensor, so the encoded list is one array longer.
+    topk keeps only the topk_ratio largest-magnitude values across all tensors, as two arrays: their int32 indices into the tensors
+    flattened and laid end to end, and their float32 values.
+    """
+
+    if codec == "none":
+        return list(weights)
+    if codec == "float16":
+        return [np.asarray(w, dtype=np.float16) for w in weights]
+    if codec == "int8":
+        encoded, scales = [], []
+        for w in weights:
+            w = np.asarray(w, dtype=np.float64)
+            max_abs = float(np.max(np.abs(w))) if w.size else 0.0
+            scales.append(max_abs / INT8_LEVELS if max_abs > 0 else 1.0)
+            encoded.append(np.clip(np.rint(w / scales[-1]), -INT8_LEVELS, INT8_LEVELS).astype(np.int8))
+        return encoded + [np.array(scales, dtype=np.float32)]
+    if codec == "topk":
+        flat = np.concatenate([np.ravel(w) for w in weights]) if len(weights) else np.empty(0)
+        k = min(flat.size, max(1, int(np.ceil(topk_ratio * flat.size))))
+        indices = np.sort(np.argpartition(np.abs(flat), flat.size - k)[flat.size - k:]) if k else np.empty(0, dtype=np.int64)
+        return [indices.astype(np.int32), flat[indices].astype(np.float32)]
+
+    raise ValueError(f"Unknown parameter codec {codec}, expected one of {', '.join(CODECS)}")
+
+
+def dequantize(arrays: Sequence[np.ndarray], codec: str, shapes: Optional[Sequence[Tuple[int, ...]]] = None) -> List[np.ndarray]:
+    """
+    Decode a list of tensors encoded by quantize with codec, back to float64. topk needs the shapes of the encoded tensors,
+    and decodes to dense tensors that are zero wherever no value was sent.
+    """
+
+    if codec == "none":
+        return list(arrays)
+    if codec == "float16":
+        return [np.asarray(a, dtype=np.float64) for a in arrays]
+    if codec == "int8":
+        return [codes.astype(np.float64) * np.float64(scale) for codes, scale in zip(arrays[:-1], arrays[-1])]
+    if codec == "topk":
+        decoded = [np.zeros(shape, dtype=np.float64) for shape in shapes]
+        scatter_add(decoded, arrays[0], arrays[1], 1.0)
+        return decoded
+
+    raise ValueError(f"Unknown parameter codec {codec}, expected one of {', '.join(CODECS)}")
+
+
+def scatter_add(tensors: List[np.ndarray], indices: np.ndarray, values: np.ndarray, weight: float) -> None:
+    """
+    Add weight times values, in place, at indices into the C-contiguous tensors flattened and laid end to end
+    """
+
+    offset = 0
+    for tensor in tensors:
+        start, end = np.searchsorted(indices, [offset, offset + tensor.size])
+        np.add.at(tensor.reshape(-1), indices[start:end] - offset, weight * values[start:end])
+        offset += tensor.size
+
+
+def negotiate(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the codec settings a client uses to answer a fit config, falling back to plain weights when the requested codec is unknown.
+    Plain weights are never sent as deltas, since that would not make them any smaller, while sparse topk updates are always deltas.
+    The same dictionary is returned to the server in the fit metrics, so that it knows how to decode each client's parameters.
+    """
+
+    codec = config.get("codec", "none")
+    if codec not in CODECS:
+        codec = "none"
+
+    settings = {"codec": codec, "delta": codec == "topk" or (codec != "none" and bool(config.get("delta", False)))}
+    if codec == "topk":
+        settings["topk_ratio"] = float(config.get("topk_ratio", DEFAULT_TOPK_RATIO))
+
+    return settings
+
+
+class ErrorFeedbackEncoder:
+    """
+    Client side of the parameter codec. Encodes the weights returned by fit, or their change from the received global weights
+    when delta is set, and keeps the quantization error of each round to add back into the next one, so that rounding errors
+    do not accumulate in the global model.
+    """
+
+    def __init__(self) -> None:
+        self.residuals: Optional[List[np.ndarray]] = None
+
+    def encode(self, weights: Sequence[np.ndarray], received: Sequence[np.ndarray], settings: Dict[str, Any]) -> List[np.ndarray]:
+        """
+        Return the encoded arrays for weights, given the global weights received at the start of the round
+        and the codec settings returned by negotiate
+        """
+
+        codec = settings["codec"]
+        target = [np.asarray(w, dtype=np.float64) - r if settings["delta"] else np.asarray(w, dtype=np.float64) for w, r in zip(weights, received)]
+        if codec == "none":
+            self.residuals = None
+            return target
+
+        if self.residuals is not None and [r.shape for r in self.residuals] == [t.shape for t in target]:
+            target = [t + r for t, r in zip(target, self.residuals)]
+
+        encoded = quantize(target, codec, settings.get("topk_ratio", DEFAULT_TOPK_RATIO))
+        self.residuals = [t - d for t, d in zip(target, dequantize(encoded, codec, [t.shape for t in target]))]
+        return encoded
+
+    def reset(self) -> None:
+        """
+        Drop the accumulated quantization error
+        """
+
+        self.residuals = None
+
+
+def accumulate_update(
+    buffer: List[np.ndarray],
+    arrays: Sequence[np.ndarray],
+    metrics: Dict[str, Any],
+    received: Sequence[np.ndarray],
+    weight: float) -> None:
+    """
+    Server side of the parameter codec. Decode one client's arrays, as described by the codec settings in its fit metrics,
+    and add its weights, times weight, into the dense float64 buffer. Deltas are added onto received, the global weights of the round,
+    and sparse topk updates are scattered straight into the buffer without being made dense.
+    """
+
+    settings = negotiate(metrics)
+    if settings["delta"]:
+        for total, reference in zip(buffer, received):
+            total += weight * reference
+
+    accumulate_values(buffer, arrays, settings, weight)
+
+
+def accumulate_values(buffer: List[np.ndarray], arrays: Sequence[np.ndarray], settings: Dict[str, Any], weight: float) -> None:
+    """
+    Decode arrays as described by the codec settings returned by negotiate, and add them, times weight, into the dense float64 buffer,
+    as they are: deltas are not added onto the weights they were taken from
+    """
+
+    if settings["codec"] == "topk":
+        scatter_add(buffer, arrays[0], arrays[1], weight)
+        return
+
+    for total, values in zip(buffer, dequantize(arrays, settings["codec"])):
+        total += weight * values
@@ -0,0 +1,115 @@
+from typing import Any, List, Optional, Tuple
+import numpy as np
+import hashlib
+import shutil
+import uuid
+import os
+
+SPLIT_NAMES = ("X_train", "y_train", "X_test", "y_test")
+
+
+class DatasetCache:
+    """
+    On-disk, size-bounded cache of preprocessed datasets.
+    Each entry is a directory of .npy files, one per split, so that warm starts can memory-map the arrays instead of rebuilding them.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: Optional[int] = None) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        Return a stable hex digest identifying a dataset built from the given parts, eg. the table id, query hash, parser version and random state.
+        """
+
+        return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+    def get(self, key: str, splits: Optional[Tuple[str, ...]] = None) -> Optional[Tuple[np.ndarray, ...]]:
+        """
+        Return the memory-mapped arrays cached under key, as ((X_train, y_train), (X_test, y_test)), or None on a cache miss.
+        If splits is given, return only those arrays, in the order given.
+        """
+
+        entry = self.__entry_path(key)
+        if not os.path.isdir(entry):
+            return None
+
+        try:
+            arrays = [np.load(os.path.join(entry, f"{name}.npy"), mmap_mode='r') for name in (splits or SPLIT_NAMES)]
+        except (OSError, ValueError):
+            # A partial or corrupt entry is treated as a miss and rebuilt
+            self.invalidate(key)
+            return None
+
+        # Directory mtime doubles as the last-used time for LRU eviction
+        os.utime(entry)
+
+        if splits is not None:
+            return tuple(arrays)
+
+        return (arrays[0], arrays[1]), (arrays[2], arrays[3])
+
+    def put(self, key: str, dataset) -> None:
+        """
+        Store a ((X_train, y_train), (X_test, y_test)) dataset under key, then evict least recently used entries until the cache fits in max_bytes.
+        The entry is written to a temporary directory and renamed into place, so concurrent readers never see a partial entry.
+        """
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        (X_train, y_train), (X_test, y_test) = dataset
+
+        tmp_entry = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_entry)
+        for name, array in zip(SPLIT_NAMES, (X_train, y_train, X_test, y_test)):
+            np.save(os.path.join(tmp_entry, f"{name}.npy"), np.asarray(array))
+
+        try:
+            os.rename(tmp_entry, self.__entry_path(key))
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        self.evict()
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Remove the entry stored under key, or every entry in the cache if no key is given.
+        """
+
+        if key is not None:
+            shutil.rmtree(self.__entry_path(key), ignore_errors=True)
+        elif os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def evict(self) -> List[str]:
+        """
+        Remove least recently used entries until the total cache size is at most max_bytes, and return the evicted keys.
+        """
+
+        if self.max_bytes is None or not os.path.isdir(self.cache_dir):
+            return []
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, name)
+            if name.startswith(".tmp-") or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, file)) for file in os.listdir(entry))
+            entries.append((os.path.getmtime(entry), size, name))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            total -= size
+            evicted.append(name)
+
+        return evicted
+
+    def __entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
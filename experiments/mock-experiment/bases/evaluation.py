@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+
+EvalResult = Optional[Tuple[float, Dict[str, Any]]]
+EvalFn = Callable[[List[Any]], EvalResult]
+
+
+class BackgroundEvaluator:
+    """
+    Server-side evaluation function whose holdout set is loaded on a background thread, so that the fl-server can accept clients and
+    run rounds while the holdout is still being downloaded and preprocessed. Rounds that finish before the holdout is ready are not evaluated.
+    Pass an instance as the eval_fn of a flower strategy. The flower server calls it once for the initial parameters and then once
+    after every round, which is how each call is matched to its round.
+    """
+
+    def __init__(
+        self,
+        load_holdout: Callable[[], Tuple[Any, Any]],
+        make_eval_fn: Callable[[Any, Any], EvalFn],
+        run_async: bool = False,
+        on_result: Optional[Callable[[int, float, Dict[str, Any]], None]] = None,
+        first_round: int = 0,
+        report: Callable[[str], None] = print) -> None:
+        """
+        load_holdout returns the (X_test, y_test) holdout and make_eval_fn turns it into an evaluation function taking the model weights.
+        With run_async, each evaluation runs on a single worker thread instead of the server's round loop, so a round never waits for it.
+        Its metrics are then recorded in history, against the round they belong to, when the evaluation finishes.
+        on_result, if given, is called with the round, loss and metrics of every evaluation, eg. to attach them to that round's checkpoint.
+        first_round is the round of the initial parameters, which is not 0 when training resumes from a checkpoint.
+        """
+
+        self.load_holdout = load_holdout
+        self.make_eval_fn = make_eval_fn
+        self.on_result = on_result
+        self.report = report
+        self.history: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self.error: Optional[BaseException] = None
+
+        self._eval_fn: Optional[EvalFn] = None
+        self._ready = threading.Event()
+        self._round = first_round
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="evaluator") if run_async else None
+
+    def start(self) -> "BackgroundEvaluator":
+        """
+        Start loading the holdout on a daemon thread and return the evaluator
+        """
+
+        threading.Thread(target=self._load, name="holdout-loader", daemon=True).start()
+        return self
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the holdout has been loaded, or failed to load, and return whether server-side evaluation is available
+        """
+
+        self._ready.wait(timeout)
+        return self._eval_fn is not None
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the evaluation worker, waiting for the evaluations still running so that their metrics are recorded
+        """
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def __call__(self, weights: List[Any]) -> EvalResult:
+        rnd = self._round
+        self._round += 1
+
+        if self._eval_fn is None:
+            if not self._ready.is_set():
+                self.report(f"[eval] round {rnd}: holdout not loaded yet, skipping server-side evaluation")
+            return None
+
+        if self._executor is None:
+            return self._record(rnd, self._eval_fn(weights))
+
+        # The server decodes a fresh list of arrays for every call, so the worker may keep the weights as they are
+        self._executor.submit(self._evaluate, rnd, weights)
+        return None
+
+    def _load(self) -> None:
+        try:
+            X_test, y_test = self.load_holdout()
+            self._eval_fn = self.make_eval_fn(X_test, y_test)
+            self.report(f"[eval] holdout loaded: {len(y_test)} rows, server-side evaluation enabled")
+        except Exception as e:
+            self.error = e
+            self.report(f"[eval] could not load the holdout, server-side evaluation disabled. Error: {e}")
+        finally:
+            self._ready.set()
+
+    def _evaluate(self, rnd: int, weights: List[Any]) -> EvalResult:
+        try:
+            return self._record(rnd, self._eval_fn(weights))
+        except Exception as e:
+            self.report(f"[eval] round {rnd}: evaluation failed. Error: {e}")
+            return None
+
+    def _record(self, rnd: int, result: EvalResult) -> EvalResult:
+        if result is not None:
+            loss, metrics = result
+            self.history[rnd] = (loss, metrics)
+            self.report(f"[eval] round {rnd}: loss {loss}, metrics {metrics}")
+            if self.on_result is not None:
+                self.on_result(rnd, loss, metrics)
+
+        return result
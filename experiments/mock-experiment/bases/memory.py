@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List
+import tracemalloc
+
+# The peak of each enclosing track_allocations scope, as it stood when an inner scope reset the traced peak
+_enclosing_peaks: List[int] = []
+
+
+def format_bytes(n_bytes: float) -> str:
+    """
+    Return a human readable string for a number of bytes
+    """
+
+    for unit in ("B", "KiB", "MiB"):
+        if abs(n_bytes) < 1024:
+            return f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1024
+
+    return f"{n_bytes:.1f} GiB"
+
+
+@contextmanager
+def track_allocations(stage: str, enabled: bool = True, report: Callable[[str], None] = print) -> Iterator[None]:
+    """
+    Report the memory allocated by the body of the with-statement and the peak reached while it ran, using tracemalloc.
+    Does nothing unless enabled, since tracing allocations slows the traced code down considerably.
+    Scopes may be nested: the peak an inner scope resets is carried over to the scopes enclosing it.
+    """
+
+    if not enabled:
+        yield
+        return
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, "reset_peak"):
+        _, peak = tracemalloc.get_traced_memory()
+        _enclosing_peaks[:] = [max(enclosing, peak) for enclosing in _enclosing_peaks]
+        tracemalloc.reset_peak()
+
+    before, _ = tracemalloc.get_traced_memory()
+    _enclosing_peaks.append(before)
+    try:
+        yield
+    finally:
+        after, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, _enclosing_peaks.pop())
+        if started:
+            tracemalloc.stop()
+
+        report(f"[memory] {stage}: retained {format_bytes(after - before)}, peak {format_bytes(peak - before)} above start")
+
+
+def report_columns(stage: str, df: Any, enabled: bool = True, report: Callable[[str], None] = print) -> None:
+    """
+    Report the rows of a DataFrame, the bytes it holds per row and the bytes and dtype of each of its columns,
+    from which the memory a larger dataset would need can be estimated. Does nothing unless enabled.
+    """
+
+    if not enabled:
+        return
+
+    usage = df.memory_usage(index=False, deep=True)
+    total = int(usage.sum())
+    columns = ", ".join(f"{column} ({df[column].dtype}) {format_bytes(n_bytes)}" for column, n_bytes in usage.items())
+    report(f"[memory] {stage}: {len(df)} rows, {format_bytes(total)}, {total / max(len(df), 1):.1f} B per row. {columns}")
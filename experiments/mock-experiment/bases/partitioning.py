@@ -0,0 +1,137 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import inspect
+
+XY = Tuple[Any, np.ndarray]
+
+
+def take(X: Any, indices: Sequence[int]) -> Any:
+    """
+    Return the rows of X at indices, whether X is an array, a sparse matrix or a DataFrame
+    """
+
+    return X.iloc[indices] if hasattr(X, "iloc") else X[indices]
+
+
+def shuffle(X: Any, y: np.ndarray, random_state: Optional[int] = None) -> XY:
+    """
+    Shuffle X and y. Adapted from the fall2021 utils.shuffle, with the random state as an argument.
+    """
+
+    rng = np.random.default_rng(random_state)
+    indices = rng.permutation(len(y))
+    return take(X, indices), np.asarray(y)[indices]
+
+
+def partition(X: Any, y: np.ndarray, num_partitions: int) -> List[XY]:
+    """
+    Split X and y into num_partitions contiguous partitions of nearly equal size, as the fall2021 utils.partition
+    """
+
+    return split_at(X, y, np.array_split(np.arange(len(y)), num_partitions))
+
+
+def split_at(X: Any, y: np.ndarray, partitions: Sequence[Sequence[int]]) -> List[XY]:
+    """
+    Return the rows of X and y at each list of indices of partitions
+    """
+
+    y = np.asarray(y)
+    return [(take(X, np.asarray(indices, dtype=int)), y[np.asarray(indices, dtype=int)]) for indices in partitions]
+
+
+def iid_partition(X: Any, y: np.ndarray, num_partitions: int, random_state: Optional[int] = None) -> List[XY]:
+    """
+    Shuffle X and y, then split them into num_partitions partitions of nearly equal size with nearly the same label distribution
+    """
+
+    return partition(*shuffle(X, y, random_state), num_partitions)
+
+
+def dirichlet_partition(
+    X: Any,
+    y: np.ndarray,
+    num_partitions: int,
+    alpha: float = 0.5,
+    min_size: int = 1,
+    min_per_label: int = 0,
+    random_state: Optional[int] = None,
+    max_attempts: int = 100) -> List[XY]:
+    """
+    Split X and y into num_partitions partitions with skewed label distributions: the examples of each label are shared between
+    the partitions in proportions drawn from a symmetric Dirichlet distribution of concentration alpha. Small values of alpha give
+    each partition only a few of the labels, while large values approach an iid split.
+    Proportions are drawn again until every partition has at least min_size examples.
+    min_per_label examples of every label are set aside for each partition before the rest are shared, eg. so that every client
+    sees every class, which a warm-started LogisticRegression needs to fit.
+    """
+
+    if alpha <= 0:
+        raise ValueError(f"alpha must be positive, got {alpha}")
+    if num_partitions * min_size > len(y):
+        raise ValueError(f"{len(y)} examples can not fill {num_partitions} partitions of at least {min_size}")
+
+    rng = np.random.default_rng(random_state)
+    y = np.asarray(y)
+    labels, counts = np.unique(y, return_counts=True)
+    if min_per_label > 0 and counts.min() < num_partitions * min_per_label:
+        raise ValueError(f"label {labels[counts.argmin()]} has {counts.min()} examples, "
+            f"too few to give {num_partitions} partitions {min_per_label} of each label")
+
+    for _ in range(max_attempts):
+        partitions: List[List[int]] = [[] for _ in range(num_partitions)]
+        for label in labels:
+            indices = rng.permutation(np.flatnonzero(y == label))
+            reserved, indices = indices[:num_partitions * min_per_label], indices[num_partitions * min_per_label:]
+            for part, chunk in zip(partitions, np.split(reserved, num_partitions)):
+                part.extend(chunk.tolist())
+
+            proportions = rng.dirichlet(np.full(num_partitions, alpha))
+            bounds = (np.cumsum(proportions)[:-1] * len(indices)).astype(int)
+            for part, chunk in zip(partitions, np.split(indices, bounds)):
+                part.extend(chunk.tolist())
+
+        if min(len(part) for part in partitions) >= min_size:
+            return split_at(X, y, [rng.permutation(part) for part in partitions])
+
+    raise ValueError(f"could not give every partition {min_size} examples in {max_attempts} draws, try a larger alpha")
+
+
+def size_skewed_partition(X: Any, y: np.ndarray, num_partitions: int, skew: float = 1.0, random_state: Optional[int] = None) -> List[XY]:
+    """
+    Shuffle X and y, then split them into num_partitions partitions whose sizes follow a power law: the k-th largest partition
+    is proportional to k ** -skew. A skew of 0 gives partitions of equal size. Every partition has at least one example.
+    """
+
+    if num_partitions > len(y):
+        raise ValueError(f"{len(y)} examples can not fill {num_partitions} partitions")
+
+    rng = np.random.default_rng(random_state)
+    indices = rng.permutation(len(y))
+    weights = np.arange(1, num_partitions + 1, dtype=float) ** -skew
+    sizes = 1 + np.floor(weights / weights.sum() * (len(y) - num_partitions)).astype(int)
+    sizes[0] += len(y) - sizes.sum()
+
+    # The partitions are handed out in a random order, so that the largest is not always the first client's
+    bounds = np.cumsum(sizes[rng.permutation(num_partitions)])[:-1]
+    return split_at(X, y, np.split(indices, bounds))
+
+
+PARTITIONERS: Dict[str, Callable[..., List[XY]]] = {
+    "iid": iid_partition,
+    "dirichlet": dirichlet_partition,
+    "skewed": size_skewed_partition,
+}
+
+
+def partition_dataset(X: Any, y: np.ndarray, num_partitions: int, method: str = "iid", **kwargs) -> List[XY]:
+    """
+    Split X and y into num_partitions partitions with one of the PARTITIONERS, passing it the keyword arguments it accepts
+    """
+
+    if method not in PARTITIONERS:
+        raise ValueError(f"method must be one of {', '.join(PARTITIONERS)}, got {method}")
+
+    partitioner = PARTITIONERS[method]
+    accepted = inspect.signature(partitioner).parameters
+    return partitioner(X, y, num_partitions, **{key: value for key, value in kwargs.items() if key in accepted})
@@ -0,0 +1,81 @@
+from typing import Any, Dict, List, Optional, Tuple
+from bases.codecs import ErrorFeedbackEncoder, negotiate
+import numpy as np
+import flwr as fl
+
+
+class RegionalAggregator(fl.client.NumPyClient):
+    """
+    Middle tier of a hierarchical topology: a flower client of the root server that is itself a flower server to the clients of its region.
+    Every fit the root asks for runs one round of federated learning in the region, starting from the root's weights, and the region's
+    aggregate is sent back up as a single update, weighted by the examples of the whole region. Evaluations are forwarded the same way.
+    The root therefore holds one connection and receives one update per region, however many sites the region has.
+    """
+
+    def __init__(self, server: fl.server.Server, timeout: Optional[float] = None) -> None:
+        """
+        server drives the clients of the region. Its strategy must use aggregate_fit_metrics as its fit_metrics_aggregation_fn,
+        which is how the aggregator learns the number of examples the region trained on.
+        """
+
+        self.server = server
+        self.timeout = timeout
+        self.encoder = ErrorFeedbackEncoder()
+        super().__init__()
+
+    @staticmethod
+    def aggregate_fit_metrics(fit_metrics: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Sum the examples of the region's clients, and the examples they actually went through when training on a local budget
+        """
+
+        return {
+            "num_examples": sum(num_examples for num_examples, _ in fit_metrics),
+            "num_examples_seen": sum(metrics.get("num_examples_seen", num_examples) for num_examples, metrics in fit_metrics),
+            "clients": len(fit_metrics),
+        }
+
+    def get_parameters(self) -> List[np.ndarray]:
+        if not self.server.parameters.tensors:
+            self.server.parameters = self.server._get_initial_parameters(timeout=self.timeout)
+        return fl.common.parameters_to_weights(self.server.parameters)
+
+    def fit(self, parameters: List[np.ndarray], config: Dict[str, Any]) -> Tuple[List[np.ndarray], int, Dict[str, Any]]:
+        self.server.parameters = fl.common.weights_to_parameters(parameters)
+
+        # The root's config, eg. its round number and local training budget, is passed down to the region's clients,
+        # while the region's strategy sets the codec its own clients use
+        self.server.strategy.on_fit_config_fn = lambda rnd: dict(config)
+        result = self.server.fit_round(rnd=int(config.get("rnd", 0)), timeout=self.timeout)
+
+        weights, num_examples, metrics = parameters, 0, {}
+        if result is not None and result[0] is not None:
+            aggregated_parameters, region_metrics, _ = result
+            weights = fl.common.parameters_to_weights(aggregated_parameters)
+            num_examples = region_metrics.get("num_examples", 0)
+            metrics = {"num_examples_seen": region_metrics.get("num_examples_seen", num_examples), "clients": region_metrics.get("clients", 0)}
+            self.server.parameters = aggregated_parameters
+        else:
+            # Weighted by 0 examples, an unchanged model leaves the root's average as it is
+            print(f"[aggregator] round {config.get('rnd')}: no client of the region returned an update")
+
+        codec = negotiate(config)
+        return self.encoder.encode(weights, parameters, codec), num_examples, {**metrics, **codec}
+
+    def evaluate(self, parameters: List[np.ndarray], config: Dict[str, Any]) -> Tuple[float, int, Dict[str, Any]]:
+        self.server.parameters = fl.common.weights_to_parameters(parameters)
+        result = self.server.evaluate_round(rnd=int(config.get("rnd", 0)), timeout=self.timeout)
+        if result is None or result[0] is None:
+            return 0.0, 0, {}
+
+        loss, _, (results, _) = result
+        num_examples = sum(evaluate_res.num_examples for _, evaluate_res in results)
+
+        # The region's metrics are averaged over its clients, weighted by their test examples, as the root will average the regions
+        metrics = {}
+        for key in set().union(*(evaluate_res.metrics for _, evaluate_res in results)):
+            values = [(evaluate_res.num_examples, evaluate_res.metrics[key]) for _, evaluate_res in results if key in evaluate_res.metrics]
+            if all(isinstance(value, (int, float)) for _, value in values):
+                metrics[key] = sum(n * value for n, value in values) / max(sum(n for n, _ in values), 1)
+
+        return float(loss), num_examples, metrics
@@ -0,0 +1,102 @@
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import threading
+
+
+class ClientScheduler:
+    """
+    Keeps a history of the fit latency and data size of every client, and uses it to pick the clients of each round
+    and the deadline their results must arrive by. Clients are sampled in proportion to their data size, down-weighted when
+    they are expected to miss the longest deadline, and clients still finishing the fit of an earlier round are never picked.
+    Clients without a history are always tried first, so that newly connected sites are measured.
+    Thread-safe, since late fits are recorded from the threads that ran them.
+    """
+
+    def __init__(
+        self,
+        deadline: float,
+        min_deadline: float = 1.0,
+        quantile: float = 0.9,
+        slack: float = 1.5,
+        smoothing: float = 0.3,
+        random_state: Optional[int] = None) -> None:
+        """
+        deadline is the longest a round waits, and the deadline of rounds with a client that has not been timed yet.
+        Other rounds wait slack times the quantile of the expected latencies of their clients, bounded below by min_deadline.
+        Expected latencies are exponential moving averages of the measured ones, where smoothing is the weight of the newest.
+        """
+
+        self.deadline = deadline
+        self.min_deadline = min(min_deadline, deadline)
+        self.quantile = quantile
+        self.slack = slack
+        self.smoothing = smoothing
+        self.history: Dict[str, Dict[str, Any]] = {}
+
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._rng = np.random.RandomState(random_state)
+
+    def is_busy(self, cid: str) -> bool:
+        """
+        Return whether the client is still running a fit it was sent
+        """
+
+        with self._lock:
+            return cid in self._busy
+
+    def select(self, clients: Dict[str, Any], num_clients: int) -> List[Any]:
+        """
+        Pick up to num_clients of the idle clients, a mapping of client ids to client proxies, and mark them as busy
+        """
+
+        with self._lock:
+            idle = [cid for cid in clients if cid not in self._busy]
+            untimed = [cid for cid in idle if cid not in self.history]
+            timed = [cid for cid in idle if cid in self.history]
+
+            selected = untimed[:num_clients]
+            n_timed = min(num_clients - len(selected), len(timed))
+            if n_timed > 0:
+                weights = np.array([self.__utility(cid) for cid in timed])
+                p = weights / weights.sum() if weights.sum() > 0 else None
+                selected += [timed[i] for i in self._rng.choice(len(timed), n_timed, replace=False, p=p)]
+
+            self._busy.update(selected)
+            return [clients[cid] for cid in selected]
+
+    def round_deadline(self, cids: Sequence[str]) -> float:
+        """
+        Return the deadline, in seconds, of a round run by the clients cids
+        """
+
+        with self._lock:
+            if not cids or any(cid not in self.history for cid in cids):
+                return self.deadline
+
+            expected = np.quantile([self.history[cid]["latency"] for cid in cids], self.quantile)
+            return float(min(self.deadline, max(self.min_deadline, self.slack * expected)))
+
+    def record(self, cid: str, latency: float, num_examples: Optional[int] = None, late: bool = False) -> None:
+        """
+        Record the end of a fit of the client, which took latency seconds. num_examples is None when the fit failed,
+        in which case the latency still counts as a lower bound of the client's
+        """
+
+        with self._lock:
+            self._busy.discard(cid)
+            record = self.history.setdefault(cid, {"latency": latency, "num_examples": 0, "fits": 0, "late": 0, "failures": 0})
+            if num_examples is None:
+                record["latency"] = max(record["latency"], latency)
+                record["failures"] += 1
+                return
+
+            record["latency"] += self.smoothing * (latency - record["latency"])
+            record["num_examples"] = num_examples
+            record["fits"] += 1
+            record["late"] += int(late)
+
+    def __utility(self, cid: str) -> float:
+        # Clients expected to miss even the longest deadline are down-weighted by the square of how far they miss it
+        record = self.history[cid]
+        return max(record["num_examples"], 1) * min(1.0, self.deadline / max(record["latency"], 1e-9)) ** 2
@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple, Union
+from bases.tracing import TracingClient
+import flwr as fl
+
+# Clients held by a worker process of a ClientProcessPool, by client id
+_clients: Dict[str, fl.client.Client] = {}
+
+
+class InProcessClientProxy(fl.server.client_proxy.ClientProxy):
+    """
+    ClientProxy driving a flwr Client directly, so that a flwr server can run rounds without gRPC. A NumPyClient is wrapped
+    in a TracingClient, which (de)serializes its parameters as flower does and sends back its spans when the server asks for them.
+    Counts the bytes of the serialized parameters the client sends back from fit in its fit_bytes attribute, and the fits and
+    evaluations that raised in its fit_failures and evaluate_failures attributes.
+    """
+
+    def __init__(self, cid: str, client: Union[fl.client.Client, fl.client.NumPyClient]) -> None:
+        super().__init__(cid)
+        self.client = to_client(client) if client is not None else None
+        self.fit_bytes = 0
+        self.fit_failures = 0
+        self.evaluate_failures = 0
+
+    def call(self, method: str, *args) -> Any:
+        """
+        Call a method of the Client and return its result
+        """
+
+        return getattr(self.client, method)(*args)
+
+    def get_parameters(self, *args, **kwargs) -> fl.common.ParametersRes:
+        return self.call("get_parameters")
+
+    def fit(self, ins: fl.common.FitIns, *args, **kwargs) -> fl.common.FitRes:
+        try:
+            fit_res = self.call("fit", ins)
+        except Exception:
+            self.fit_failures += 1
+            raise
+        self.fit_bytes += sum(len(tensor) for tensor in fit_res.parameters.tensors)
+        return fit_res
+
+    def evaluate(self, ins: fl.common.EvaluateIns, *args, **kwargs) -> fl.common.EvaluateRes:
+        try:
+            return self.call("evaluate", ins)
+        except Exception:
+            self.evaluate_failures += 1
+            raise
+
+    def get_properties(self, ins: fl.common.PropertiesIns, *args, **kwargs) -> fl.common.PropertiesRes:
+        return self.call("get_properties", ins)
+
+    def reconnect(self, *args, **kwargs) -> fl.common.Disconnect:
+        return fl.common.Disconnect(reason="")
+
+
+class ProcessClientProxy(InProcessClientProxy):
+    """
+    InProcessClientProxy of a client held by a worker process of a ClientProcessPool, which every call is sent to
+    """
+
+    def __init__(self, cid: str, executor: ProcessPoolExecutor) -> None:
+        super().__init__(cid, None)
+        self.executor = executor
+
+    def call(self, method: str, *args) -> Any:
+        return self.executor.submit(_call_client, self.cid, method, *args).result()
+
+
+def to_client(client: Union[fl.client.Client, fl.client.NumPyClient]) -> fl.client.Client:
+    """
+    Return client as a flwr Client, wrapping a NumPyClient in a TracingClient
+    """
+
+    return client if isinstance(client, fl.client.Client) else TracingClient(client)
+
+
+def _register_client(cid: str, factory: Callable[..., fl.client.NumPyClient], args: Tuple) -> None:
+    _clients[cid] = to_client(factory(*args))
+
+
+def _call_client(cid: str, method: str, *args) -> Any:
+    return getattr(_clients[cid], method)(*args)
+
+
+class ClientProcessPool:
+    """
+    Worker processes holding the clients of a simulation, so that their fits run in parallel. Each client is created in,
+    and always called in, the same process, so that the state it keeps between rounds, eg. the error feedback of its codec, persists.
+    """
+
+    def __init__(self, processes: int) -> None:
+        self.executors = [ProcessPoolExecutor(max_workers=1) for _ in range(max(1, processes))]
+        self.proxies: List[ProcessClientProxy] = []
+
+    def add(self, cid: str, factory: Callable[..., fl.client.NumPyClient], *args) -> ProcessClientProxy:
+        """
+        Create a client in one of the worker processes by calling factory(*args), and return its proxy.
+        factory and args are pickled, so factory must be a module-level function.
+        """
+
+        executor = self.executors[len(self.proxies) % len(self.executors)]
+        executor.submit(_register_client, cid, factory, args).result()
+        self.proxies.append(ProcessClientProxy(cid, executor))
+        return self.proxies[-1]
+
+    def shutdown(self) -> None:
+        for executor in self.executors:
+            executor.shutdown()
@@ -0,0 +1,74 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+import flwr as fl
+import timeit
+
+
+class StreamingServer(fl.server.Server):
+    """
+    Flower server that hands each fit result to the strategy as soon as it arrives, instead of collecting every client's parameters
+    before aggregating them, and whose rounds can end at a deadline instead of waiting for the slowest client.
+    When the strategy defines fold_fit(rnd, client, fit_res), every result is folded into the aggregate and released straight away,
+    and aggregate_fit is then called without results to finish the aggregation. Otherwise the results are collected as flower does.
+    When the strategy defines fit_deadline(rnd), the results that arrive after that many seconds are dropped, without failing the round,
+    while their clients are left to finish in the background. When it defines record_fit(cid, latency, fit_res, late), that is called
+    for every fit once it ends, late or not, with fit_res None if it failed.
+    """
+
+    def __init__(
+        self,
+        client_manager: fl.server.client_manager.ClientManager,
+        strategy: fl.server.strategy.Strategy,
+        report: Callable[[str], None] = print) -> None:
+        super().__init__(client_manager, strategy)
+        self.report = report
+
+    def fit_round(self, rnd: int, timeout: Optional[float]):
+        instructions = self.strategy.configure_fit(rnd=rnd, parameters=self.parameters, client_manager=self._client_manager)
+        if not instructions:
+            self.report(f"[server] round {rnd}: no clients selected, skipping the round")
+            return None
+
+        deadline = self.strategy.fit_deadline(rnd) if hasattr(self.strategy, "fit_deadline") else None
+        fold_fit = getattr(self.strategy, "fold_fit", None)
+        start_time = timeit.default_timer()
+
+        # Not used as a context manager, which would wait for the late clients too
+        executor = ThreadPoolExecutor(max_workers=len(instructions), thread_name_prefix=f"fit-round-{rnd}")
+        pending: Dict[Future, fl.server.client_proxy.ClientProxy] = {}
+        for client, fit_ins in instructions:
+            submitted = executor.submit(client.fit, fit_ins, timeout)
+            submitted.add_done_callback(lambda future, cid=client.cid: self.__record(cid, future, start_time, deadline))
+            pending[submitted] = client
+
+        results, failures, folded = [], [], 0
+        while pending:
+            remaining = None if deadline is None else deadline - (timeit.default_timer() - start_time)
+            if remaining is not None and remaining <= 0:
+                break
+
+            done, _ = wait(list(pending), timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                client = pending.pop(future)
+                if future.exception() is not None:
+                    failures.append(future.exception())
+                elif fold_fit is not None:
+                    fold_fit(rnd, client, future.result())
+                    folded += 1
+                else:
+                    results.append((client, future.result()))
+        executor.shutdown(wait=False)
+
+        self.report(f"[server] round {rnd}: {folded + len(results)} results, {len(failures)} failures, {len(pending)} late clients dropped "
+            f"after {timeit.default_timer() - start_time:.1f}s")
+
+        parameters_aggregated, metrics_aggregated = self.strategy.aggregate_fit(rnd, results, failures)
+        return parameters_aggregated, metrics_aggregated, (results, failures)
+
+    def __record(self, cid: str, future: Future, start_time: float, deadline: Optional[float]) -> None:
+        if not hasattr(self.strategy, "record_fit"):
+            return
+
+        latency = timeit.default_timer() - start_time
+        fit_res = future.result() if future.exception() is None else None
+        self.strategy.record_fit(cid, latency, fit_res, deadline is not None and latency > deadline)
@@ -0,0 +1,250 @@
+from contextlib import contextmanager
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+import threading
+import json
+import time
+import os
+import flwr as fl
+
+# Key of the fit and evaluate metrics that carry a client's spans back to the server
+TRACE_KEY = "trace_spans"
+
+
+@dataclass
+class Span:
+    """
+    A named interval of work in round rnd, or before the first round if rnd is None. start is a wall-clock timestamp, in seconds,
+    so that the spans of different machines can be put on one timeline, and duration is measured with a monotonic clock.
+    """
+
+    name: str
+    rnd: Optional[int]
+    start: float
+    duration: float
+    thread: str
+
+
+class Tracer:
+    """
+    Records spans, eg. the stages of loading data or of a fit, until they are drained. Recording a span only costs two clock reads,
+    so a tracer is always on, and only the most recent max_spans are kept when nothing drains them.
+    """
+
+    def __init__(self, max_spans: int = 10000) -> None:
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+        self.__lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, rnd: Optional[int] = None) -> Iterator[None]:
+        """
+        Record the body of the with-statement as a span, whether or not it raises
+        """
+
+        start, counter = time.time(), time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, rnd, start, time.perf_counter() - counter)
+
+    def iterate(self, name: str, iterable: Iterable[Any], rnd: Optional[int] = None) -> Iterator[Any]:
+        """
+        Yield the items of iterable, recording the time spent waiting for each one as a span, eg. for pages arriving off the network
+        """
+
+        iterator = iter(iterable)
+        while True:
+            with self.span(name, rnd):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def add(self, name: str, rnd: Optional[int], start: float, duration: float, thread: Optional[str] = None) -> None:
+        """
+        Record a span measured elsewhere, on the track of thread, which defaults to the current thread
+        """
+
+        with self.__lock:
+            self.spans.append(Span(name, rnd, start, duration, thread or threading.current_thread().name))
+
+    def drain(self) -> List[Span]:
+        """
+        Remove and return every recorded span
+        """
+
+        with self.__lock:
+            spans = list(self.spans)
+            self.spans.clear()
+        return spans
+
+    def to_metrics(self) -> Dict[str, str]:
+        """
+        Drain the recorded spans into a metrics entry, as flower metrics only hold scalars
+        """
+
+        return {TRACE_KEY: json.dumps([[s.name, s.rnd, s.start, s.duration, s.thread] for s in self.drain()])}
+
+
+def pop_spans(metrics: Dict[str, Any]) -> List[Span]:
+    """
+    Remove the spans a client sent back from its fit or evaluate metrics, and return them
+    """
+
+    encoded = metrics.pop(TRACE_KEY, None)
+    return [Span(*span) for span in json.loads(encoded)] if encoded else []
+
+
+def is_requested(config: Dict[str, Any]) -> bool:
+    """
+    Return whether the server asked for the client's spans in a fit or evaluate config
+    """
+
+    return bool(config.get("trace", False))
+
+
+class TracingClient(fl.client.Client):
+    """
+    Flower Client driving a NumPyClient as flower does, but recording the deserialization of the parameters it receives and the
+    serialization of those it sends back as spans, and adding every span recorded since the last request to the fit and evaluate
+    metrics when the server asks for them. Records into the tracer of the NumPyClient, eg. the tracer of its experiment, if it has one.
+    """
+
+    def __init__(self, numpy_client: fl.client.NumPyClient, tracer: Optional[Tracer] = None) -> None:
+        self.numpy_client = numpy_client
+        self.tracer = tracer or getattr(numpy_client, "tracer", None) or Tracer()
+
+    def get_properties(self, ins: fl.common.PropertiesIns) -> fl.common.PropertiesRes:
+        return fl.common.PropertiesRes(
+            status=fl.common.Status(code=fl.common.Code.OK, message="Success"),
+            properties=self.numpy_client.get_properties(ins.config),
+        )
+
+    def get_parameters(self) -> fl.common.ParametersRes:
+        return fl.common.ParametersRes(parameters=fl.common.weights_to_parameters(list(self.numpy_client.get_parameters())))
+
+    def fit(self, ins: fl.common.FitIns) -> fl.common.FitRes:
+        rnd = ins.config.get("rnd")
+        with self.tracer.span("deserialize", rnd):
+            weights = fl.common.parameters_to_weights(ins.parameters)
+
+        weights, num_examples, metrics = self.numpy_client.fit(weights, ins.config)
+        with self.tracer.span("serialize", rnd):
+            parameters = fl.common.weights_to_parameters(list(weights))
+
+        if is_requested(ins.config):
+            metrics = {**metrics, **self.tracer.to_metrics()}
+        return fl.common.FitRes(parameters=parameters, num_examples=num_examples, metrics=metrics)
+
+    def evaluate(self, ins: fl.common.EvaluateIns) -> fl.common.EvaluateRes:
+        with self.tracer.span("deserialize", ins.config.get("rnd")):
+            weights = fl.common.parameters_to_weights(ins.parameters)
+
+        loss, num_examples, metrics = self.numpy_client.evaluate(weights, ins.config)
+        if is_requested(ins.config):
+            metrics = {**metrics, **self.tracer.to_metrics()}
+        return fl.common.EvaluateRes(loss=float(loss), num_examples=num_examples, metrics=metrics)
+
+
+class Timeline:
+    """
+    One timeline of the spans of the server and of its clients, written round by round to timeline.jsonl, one span per line,
+    and to trace.json, in the Chrome trace-event format read by chrome://tracing and https://ui.perfetto.dev.
+    Each process, eg. the server or a client, is a track of its own, split by thread. The spans of a round are written once
+    flush is called for it, sorted by start. Spans are placed by the wall clock of the machine that recorded them.
+    """
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.pending: List[Tuple[str, Span]] = []
+        self.tracers: Dict[str, Tracer] = {}
+        self.pids: Dict[str, int] = {}
+        self.tids: Dict[Tuple[str, str], int] = {}
+        self.__lock = threading.Lock()
+        self.__jsonl: TextIO = open(os.path.join(path, "timeline.jsonl"), "w")
+        self.__chrome: TextIO = open(os.path.join(path, "trace.json"), "w")
+        self.__events = 0
+
+        # The closing bracket is optional in the trace-event format, so the file can be read while the experiment runs
+        self.__chrome.write("[\n")
+
+    def register(self, process: str, tracer: Tracer) -> None:
+        """
+        Drain the spans of tracer into the timeline, as those of process, on every flush
+        """
+
+        self.tracers[process] = tracer
+
+    def add(self, process: str, spans: Iterable[Span]) -> None:
+        """
+        Add the spans of process, eg. the spans a client sent back, to be written when their round is flushed
+        """
+
+        with self.__lock:
+            self.pending.extend((process, span) for span in spans)
+
+    def flush(self, through_round: Optional[int] = None) -> None:
+        """
+        Write the spans of every round up to through_round, and those recorded before the first round, or every span if through_round is None
+        """
+
+        for process, tracer in self.tracers.items():
+            self.add(process, tracer.drain())
+
+        with self.__lock:
+            due = [(process, span) for process, span in self.pending
+                if through_round is None or span.rnd is None or span.rnd <= through_round]
+            self.pending = [(process, span) for process, span in self.pending
+                if not (through_round is None or span.rnd is None or span.rnd <= through_round)]
+
+            for process, span in sorted(due, key=lambda item: (item[1].rnd if item[1].rnd is not None else -1, item[1].start)):
+                self.__write(process, span)
+            self.__jsonl.flush()
+            self.__chrome.flush()
+
+    def close(self) -> None:
+        """
+        Write every remaining span and close the files
+        """
+
+        self.flush()
+        with self.__lock:
+            self.__chrome.write("\n]\n")
+            self.__jsonl.close()
+            self.__chrome.close()
+
+    def __write(self, process: str, span: Span) -> None:
+        self.__jsonl.write(json.dumps({
+            "round": span.rnd,
+            "process": process,
+            "thread": span.thread,
+            "name": span.name,
+            "start": span.start,
+            "duration": span.duration,
+        }) + "\n")
+
+        pid = self.pids.get(process)
+        if pid is None:
+            pid = self.pids[process] = len(self.pids) + 1
+            self.__event({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process}})
+
+        tid = self.tids.get((process, span.thread))
+        if tid is None:
+            tid = self.tids[(process, span.thread)] = len(self.tids) + 1
+            self.__event({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": span.thread}})
+
+        self.__event({
+            "name": span.name,
+            "ph": "X",
+            "ts": span.start * 1e6,
+            "dur": span.duration * 1e6,
+            "pid": pid,
+            "tid": tid,
+            "args": {"round": span.rnd},
+        })
+
+    def __event(self, event: Dict[str, Any]) -> None:
+        self.__chrome.write((",\n" if self.__events else "") + json.dumps(event))
+        self.__events += 1
@@ -0,0 +1,135 @@
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from urllib3.util.retry import Retry
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+import threading
+import requests
+import json
+import gzip
+import time
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+@dataclass
+class RequestRecord:
+    """
+    Latency and byte counts of a single request sent through a transport. bytes_received counts the bytes read off the wire, before decompression.
+    """
+
+    url: str
+    status_code: Optional[int]
+    latency: float
+    bytes_sent: int
+    bytes_received: int
+
+
+@dataclass
+class TransportStats:
+    """
+    Running totals over every request sent through a transport, along with a record for each of the most recent requests
+    """
+
+    requests: int = 0
+    failures: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    total_latency: float = 0.0
+    recent: Deque[RequestRecord] = field(default_factory=lambda: deque(maxlen=1000))
+
+
+class HTTPTransport:
+    """
+    Pooled HTTP transport used by an Experiment to talk to the GraphQL interface.
+    Reuses keep-alive connections from a pool, negotiates gzip/deflate responses, optionally gzips request bodies, applies connect/read timeouts,
+    retries with exponential backoff on 5xx responses and dropped connections, and keeps latency and byte counters for each request.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout: Optional[float] = 10.0,
+        read_timeout: Optional[float] = 300.0,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        compress_requests: bool = False,
+        compress_min_bytes: int = 1024) -> None:
+
+        self.timeout = (connect_timeout, read_timeout)
+        self.compress_requests = compress_requests
+        self.compress_min_bytes = compress_min_bytes
+        self.stats = TransportStats()
+        self.__lock = threading.Lock()
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+    def post(self, url: str, json_body: Dict[str, Any]) -> Response:
+        """
+        Send json_body to url as a POST request and return the Response object, recording its latency and size
+        """
+
+        body = json.dumps(json_body).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.compress_requests and len(body) >= self.compress_min_bytes:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+
+        start = time.perf_counter()
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            self.__record(RequestRecord(url, None, time.perf_counter() - start, len(body), 0))
+            raise
+
+        self.__record(RequestRecord(url, response.status_code, time.perf_counter() - start, len(body), self.__wire_bytes(response)))
+        return response
+
+    def close(self) -> None:
+        """
+        Close every pooled connection
+        """
+
+        self.session.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Locks cannot be pickled, so copies of the transport get a fresh one
+        state = self.__dict__.copy()
+        del state["_HTTPTransport__lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+
+    def __record(self, record: RequestRecord) -> None:
+        with self.__lock:
+            self.stats.requests += 1
+            self.stats.failures += record.status_code is None or record.status_code >= 400
+            self.stats.bytes_sent += record.bytes_sent
+            self.stats.bytes_received += record.bytes_received
+            self.stats.total_latency += record.latency
+            self.stats.recent.append(record)
+
+    @staticmethod
+    def __wire_bytes(response: Response) -> int:
+        try:
+            return int(response.raw.tell())
+        except (AttributeError, TypeError, ValueError):
+            return len(response.content)
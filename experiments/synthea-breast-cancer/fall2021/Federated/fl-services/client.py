@@ -42,14 +42,14 @@ if __name__ == "__main__":
                 warnings.simplefilter("ignore")
                 model.fit(X_train, y_train)
             print(f"Training finished for round {config['rnd']}")
-            return utils.get_model_parameters(model), len(X_train), {}
+            return utils.get_model_parameters(model), X_train.shape[0], {}
 
         def evaluate(self, parameters, config):  # type: ignore
             utils.set_model_params(model, parameters)
             loss = log_loss(y_test, model.predict_proba(X_test))
             accuracy = model.score(X_test, y_test)
             auc_score = roc_auc_score(y_test, model.predict(X_test))
-            return loss, len(X_test), {"accuracy": accuracy, "auc_score": auc_score}
+            return loss, X_test.shape[0], {"accuracy": accuracy, "auc_score": auc_score}
 
     # Start Flower client
     fl.client.start_numpy_client(SERVER_URL, client=MnistClient())
\ No newline at end of file
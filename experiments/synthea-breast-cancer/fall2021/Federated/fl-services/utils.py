@@ -6,15 +6,20 @@ import pandas as pd
 from pandas.core.frame import DataFrame
 from pandas.core.series import Series
 from requests.models import Response
+from scipy import sparse
 from sklearn.linear_model import LogisticRegression
 from sklearn.decomposition import PCA
+from sklearn.feature_extraction import FeatureHasher
 from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
 import requests
 import json
 import os
 import datetime
 
 RANDOM_STATE = 1729
+SPARSE_FEATURES = os.getenv("FL_SPARSE_FEATURES", "0") == "1" # hash medications and procedures into sparse CSR features instead of PCA
+N_HASHED_FEATURES = int(os.getenv("FL_HASHED_FEATURES", "4096")) # width of the hashed features, the same at every site
 XY = Tuple[pd.DataFrame, np.ndarray]
 Dataset = Tuple[XY, XY]
 LogRegParams = Union[XY, Tuple[np.ndarray]]
@@ -141,6 +146,76 @@ def load_data() -> Dataset:
 
         return (X, y)
 
+    def encode_sparse_features(req: Response) -> Tuple[sparse.csr_matrix, Series]:
+        """
+        Encodes the MCODE data straight into a sparse CSR design matrix, without one dense column per medication and procedure label.
+        Medication and procedure labels are counted and hashed into N_HASHED_FEATURES columns, so that every site shares the same columns
+        whatever labels it holds, and the diagnosis age is the first column. Rows with empty disease status labels are dropped, as in
+        preprocess_mcode_req.
+
+        Arguments:
+        req: req.Response (raw response from GraphQL interface with provided query)
+
+        Returns:
+        Tuple[scipy.sparse.csr_matrix, pd.Series]
+        """
+        all_results = json.loads(req.text)['data']['katsuDataModels']['mcodeDataModels']['mcodePackets']
+        packets = [p for p in all_results if (p.get('cancerDiseaseStatus') or {}).get('label') is not None]
+
+        counts = []
+        for p in packets:
+            row_counts = {}
+            for i in p['cancerRelatedProcedures'] or []:
+                key = 'procedure=' + i['code']['label']
+                row_counts[key] = row_counts.get(key, 0) + 1
+            for i in p['medicationStatement'] or []:
+                key = 'medication=' + i['medicationCode']['label']
+                row_counts[key] = row_counts.get(key, 0) + 1
+            counts.append(row_counts)
+        hashed = FeatureHasher(n_features=N_HASHED_FEATURES, input_type='dict', alternate_sign=False).transform(counts)
+
+        diag_age = np.array([
+            parse_diagnosis_age({'cancerCondition': p['cancerCondition'], 'subject.dateOfBirth': p['subject']['dateOfBirth']})
+            for p in packets
+        ]).reshape(-1, 1)
+
+        X = sparse.hstack([sparse.csr_matrix(diag_age), hashed], format='csr')
+        y = pd.Series([int(p['cancerDiseaseStatus']['label'] == "Patient's condition improved") for p in packets])
+        return X, y
+
+    def undersample_majority_class_sparse(X: sparse.csr_matrix, y: Series) -> Tuple[sparse.csr_matrix, Series]:
+        """
+        Sparse counterpart of undersample_majority_class, which samples as many rows of the positive class
+        as there are of the negative class, and selects the sampled rows of the CSR matrix.
+
+        Arguments:
+        X: scipy.sparse.csr_matrix
+        y: pd.Series
+
+        Returns:
+        Tuple[scipy.sparse.csr_matrix, pd.Series]
+        """
+        positive_entries = y[y == 1]
+        negative_entries = y[y == 0]
+        positive_sample = positive_entries.sample(n=min(len(negative_entries), len(positive_entries)), random_state=1729)
+
+        rows = np.concatenate([positive_sample.index.to_numpy(), negative_entries.index.to_numpy()])
+        return X[rows], y.iloc[rows].reset_index(drop=True)
+
+    def scale_sparse_features(x_train: sparse.csr_matrix, x_test: sparse.csr_matrix) -> Tuple[sparse.csr_matrix, sparse.csr_matrix]:
+        """
+        Scales each feature to unit variance over the training set, without centering it so that the matrices stay sparse.
+
+        Arguments:
+        x_train: scipy.sparse.csr_matrix
+        x_test: scipy.sparse.csr_matrix
+
+        Returns:
+        Tuple[scipy.sparse.csr_matrix, scipy.sparse.csr_matrix]
+        """
+        scaler = StandardScaler(with_mean=False).fit(x_train)
+        return scaler.transform(x_train), scaler.transform(x_test)
+
     def pca_dimensionality_reduction(df: DataFrame) -> DataFrame:
         """
         If this function is being used with the provided demo data ingested, then there are 37 total
@@ -193,6 +268,12 @@ def load_data() -> Dataset:
     if req.status_code != 200:
         raise DataFetchError(f"Could not query GraphQL interface, error code {req.status_code}")
     
+    if SPARSE_FEATURES:
+        X, y = undersample_majority_class_sparse(*encode_sparse_features(req))
+        x_train, x_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=RANDOM_STATE)
+        x_train, x_test = scale_sparse_features(x_train, x_test)
+        return (x_train, y_train), (x_test, y_test)
+
     preproc_data = preprocess_mcode_req(req)
     X, y = undersample_majority_class(preproc_data)
     X = pca_dimensionality_reduction(X)
@@ -228,7 +309,7 @@ def set_initial_params(model: LogisticRegression):
     information.
     """
     n_classes = 2  # We are training a binary classifier
-    n_features = 10  # Number of features in dataset
+    n_features = N_HASHED_FEATURES + 1 if SPARSE_FEATURES else 10  # Number of features in dataset
     model.classes_ = np.array([i for i in range(n_classes)])
 
     model.coef_ = np.zeros((n_classes, n_features))
@@ -239,7 +320,7 @@ def set_initial_params(model: LogisticRegression):
 def shuffle(X: np.ndarray, y: np.ndarray) -> XY:
     """Shuffle X and y."""
     rng = np.random.default_rng(RANDOM_STATE)
-    idx = rng.permutation(len(X))
+    idx = rng.permutation(X.shape[0])
     return X[idx], y[idx]
 
 
@@ -1,8 +1,8 @@
-from experiment.experiment import experiment
+from experiment.experiment import experiment, create_experiment
 from experiment.model import model
 from experiment.flower_client import FlowerClient
 from experiment.get_eval_fn import eval_fn
 from experiment.strategy import Strategy
 import experiment.settings as settings
 
-__all__ = ["experiment", "model", "FlowerClient", "eval_fn", "Strategy", "settings"]
\ No newline at end of file
+__all__ = ["experiment", "create_experiment", "model", "FlowerClient", "eval_fn", "Strategy", "settings"]
\ No newline at end of file
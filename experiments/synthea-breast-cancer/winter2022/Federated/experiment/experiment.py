@@ -1,20 +1,30 @@
 # Adapted from https://github.com/adap/flower/tree/main/examples/sklearn-logreg-mnist
 
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 from bases.base_experiment import Experiment
-from sklearn.model_selection import train_test_split
+from bases.dataset_cache import DatasetCache
+from bases.transport import HTTPTransport
+from bases.memory import report_columns, track_allocations
 from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import StandardScaler
-from experiment.helpers import defaults, parsers
+from experiment.helpers import defaults, encoders, parsers
 from pandas.core.frame import DataFrame
-from requests.models import Response
-import experiment.settings
+import experiment.settings as settings
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
 import pandas as pd
 import numpy as np
+import hashlib
 import re
 import os
 
 # Constants
+FEATURE_COLUMNS = ['surgical', 'radiation', 'cancerStatus', 'diagnosisAge', 'primary', 'nodes', 'numberOfMeds']
+LABEL_COLUMN = 'stage'
+REQUIRED_COLUMNS = ['numberOfMeds', 'nodes', 'primary', 'stage', 'sex', 'diagnosisAge', 'cancerStatus']
+CODE_COLUMNS = ['stage', 'primary', 'nodes', 'cancerStatus']
+FILTER_COLUMNS = ['sex', 'cancerType']
+BREAST_CANCER = 'Malignant neoplasm of breast (disorder)'
+TEST_SIZE = 0.2
 XY = Tuple[DataFrame, np.ndarray]
 Dataset = Tuple[XY, XY]
 LogRegParams = Union[XY, Tuple[np.ndarray]]
@@ -31,99 +41,220 @@ class FederatedLogReg(Experiment):
         filename: Optional[str] = None, 
         client_number: Optional[str] = None,
         n_classes: Optional[int] = None,
-        n_features: Optional[int] = None) -> None:
+        n_features: Optional[int] = None,
+        page_size: Optional[int] = None,
+        page_concurrency: Optional[int] = 4,
+        table_concurrency: Optional[int] = 4,
+        cache_path: Optional[str] = None,
+        cache_max_bytes: Optional[int] = None,
+        transport: Optional[HTTPTransport] = None,
+        dtype: Optional[str] = 'float32',
+        debug_memory: Optional[bool] = False) -> None:
 
         self.filename = filename
         self.client_number = client_number
-        self.table_id = self.__find_table_id()
+        self.table_ids = self.__find_table_ids()
+        self.table_id = self.table_ids[0] if len(self.table_ids) == 1 else None
         self.n_classes = n_classes
         self.n_features = n_features
-        super().__init__(resource_url, random_state)
-
-    def __find_table_id(self) -> Optional[str]:
+        self.page_size = page_size
+        self.page_concurrency = page_concurrency
+        self.table_concurrency = table_concurrency
+        self.cache = DatasetCache(cache_path, cache_max_bytes) if cache_path else None
+        self.dtype = np.dtype(dtype)
+        self.debug_memory = debug_memory
+        super().__init__(resource_url, random_state, transport)
+
+    def __find_table_ids(self) -> List[str]:
         """
-        Returns an optional string denoting the katsu db table_id for an optional client number, stored on a file called filename
+        Returns a list of strings denoting the katsu db table_ids stored on a file called filename, for an optional client number.
+        The client number may be a comma-separated list of client numbers, to load several tables at once. 
+        Without a client number, every table in the file is returned.
         
         Returns:
-            Optional[str]
+            List[str]
         """
 
         with open(self.filename, "r") as f:
             tables = [table.strip("TABLE_UUID:").strip() for table in f.readlines()]
         
         if self.client_number is not None:
-            return tables[int(self.client_number) - 1]
+            return [tables[int(number) - 1] for number in str(self.client_number).split(",")]
         
-        return None
+        return [table for table in tables if table]
     
-    def __create_dataframe(self, patients: List[Dict[str, Any]]) -> DataFrame:
+    def __create_dataframe(self, patients: Dict[str, Sequence[Any]]) -> DataFrame:
         """
-        Creates a Pandas Dataframe object from a List of Dictionaries containing the collected mCODE data
+        Creates a Pandas Dataframe object from a Dictionary of columns containing the collected mCODE data.
+        The row filters are combined into one mask, applied to each column before the Dataframe is built, and each column
+        is stored in the narrowest dtype that holds it. sex and cancerType are only used to filter the rows, and are dropped.
 
         Arguments:
-            patients: List[Dict[str, Any]] containing patient information
+            patients: Dict[str, Sequence[Any]] mapping each column name to its patient values
 
         Returns:
             pd.Dataframe
         """
 
-        df = pd.DataFrame(patients)
-        df = df.dropna(subset=['numberOfMeds', 'nodes', 'primary',
-                       'stage', 'sex', 'diagnosisAge', 'cancerStatus'])
-        df = df.loc[df['sex'] != 0]
-        df = df.loc[df['cancerType'] ==
-                    'Malignant neoplasm of breast (disorder)']
-        df = df.drop(columns=['cancerType', 'sex'])
-        return df.reset_index(drop=True)
+        with track_allocations("create dataframe", self.debug_memory):
+            columns = {name: np.asarray(values) for name, values in patients.items()}
+
+            keep = np.ones(len(columns[LABEL_COLUMN]), dtype=bool)
+            for name in REQUIRED_COLUMNS:
+                keep &= pd.notna(columns[name])
+            keep &= columns['sex'] != 0
+            keep &= np.asarray(pd.Categorical(columns['cancerType']) == BREAST_CANCER)
+
+            df = pd.DataFrame({
+                name: self.__compact_column(name, values[keep])
+                for name, values in columns.items() if name not in FILTER_COLUMNS
+            })
+
+        report_columns("dataframe", df, self.debug_memory)
+        return df
+
+    def __compact_column(self, name: str, values: np.ndarray) -> np.ndarray:
+        """
+        Casts a filtered column to the narrowest dtype that holds it: int8 for the stage, TNM and status codes, the experiment's dtype
+        for the diagnosis age and the smallest unsigned integer holding the largest count for the procedure and medication counts
+
+        Arguments:
+            name: str name of the column
+            values: np.ndarray values of the column, without missing values
+
+        Returns:
+            np.ndarray
+        """
+
+        if name in CODE_COLUMNS:
+            return values.astype(np.int8)
+        if name == 'diagnosisAge':
+            return values.astype(self.dtype)
+        return values.astype(np.min_scalar_type(int(values.max()) if len(values) else 0))
     
-    def __preprocess_mcode_req(self, req: Response) -> DataFrame:
+    def __get_mcode_packets(self, response_json: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Returns the list of mcodePackets contained in a decoded GraphQL response
+
+        Arguments:
+            response_json: Dict[str, Any] containing the decoded GraphQL response
+
+        Returns:
+            List[Dict[str, Any]]
+        """
+
+        return response_json.get('data').get(
+            'katsuDataModels').get('mcodeDataModels').get('mcodePackets')
+
+    def __fetch_table_pages(self, table_id: Optional[str]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields the mcodePackets of one table, or of every table if table_id is None, either as a single page from one GraphQL request or, 
+        when a page size is set, page by page from bounded page requests sent concurrently
+
+        Arguments:
+            table_id: Optional[str] katsu db table_id to fetch
+
+        Returns:
+            Iterator[List[Dict[str, Any]]]
+        """
+
+        if not self.page_size:
+            yield self.__get_mcode_packets(self.send_graphql_request(self.create_query(table_id)).json())
+            return
+
+        yield from self.send_paginated_graphql_request(
+            lambda offset, limit: self.create_page_query(offset, limit, table_id),
+            self.__get_mcode_packets, self.page_size, self.page_concurrency)
+
+    def __fetch_mcode_pages(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields the mcodePackets for this experiment page by page. When several tables are loaded, they are fetched concurrently on
+        at most table_concurrency threads, while their pages are yielded in the order of table_ids so that the merged dataset, and
+        hence its train/test split, does not depend on which table answers first
+
+        Returns:
+            Iterator[List[Dict[str, Any]]]
+        """
+
+        if len(self.table_ids) <= 1:
+            yield from self.__fetch_table_pages(self.table_id)
+            return
+
+        table_pages: List[Queue] = [Queue() for _ in self.table_ids]
+
+        def fetch_table(table_id: str, pages: Queue) -> None:
+            try:
+                for page in self.__fetch_table_pages(table_id):
+                    pages.put(page)
+            finally:
+                pages.put(None)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.table_concurrency or 1)) as executor:
+            futures = [executor.submit(fetch_table, table_id, pages) for table_id, pages in zip(self.table_ids, table_pages)]
+
+            for future, pages in zip(futures, table_pages):
+                page = pages.get()
+                while page is not None:
+                    yield page
+                    page = pages.get()
+
+                # Surface a table that failed to load before moving on to the next one
+                future.result()
+
+    def __preprocess_mcode_req(self, pages: Iterable[List[Dict[str, Any]]]) -> DataFrame:
         """
         Cleans Katsu-ingested + GraphQL served MCODE data and prepares for other preprocessing functions.
+        Each page is parsed as it arrives, with the medication and procedure counts built in a single pass as CSR arrays,
+        and every other field pulled into a column that is encoded all at once.
 
         Arguments:
-            req: Response (raw response from GraphQL interface with provided query)
+            pages: Iterable[List[Dict[str, Any]]] of mcodePackets served by the GraphQL interface
 
         Returns:
             pd.DataFrame
         """
 
-        # Get JSON response
-        patient_info_json = req.json().get('data').get(
-            'katsuDataModels').get('mcodeDataModels').get('mcodePackets')
+        counts = parsers.CountMatrixParser()
+        columns = encoders.ColumnEncoder()
 
-        # Defines unique medications and procedure types
-        uniq_finder = parsers.UniqueInfoParser(patient_info_json)
-        uniq_meds = uniq_finder.get_uniq_meds()
-        uniq_procedures = uniq_finder.get_uniq_procedures()
-
-        # Create list of patient info
-        patient_info_list = []
-        for patient in patient_info_json:
-            patient_info_dict = {}
-            patient_info = parsers.PatientInfoParser(
-                uniq_meds, uniq_procedures, patient).get_patient_data()
-
-            number_of_meds = sum(
-                [quantity for quantity in patient_info.meds.values()])
-
-            for procedure in uniq_procedures:
-                patient_info_dict[procedure] = patient_info.procedures[procedure]
-
-            patient_info_dict['sex'] = patient_info.sex
-            patient_info_dict['nodes'] = patient_info.nodes
-            patient_info_dict['stage'] = patient_info.stage
-            patient_info_dict['numberOfMeds'] = number_of_meds
-            patient_info_dict['primary'] = patient_info.primary
-            patient_info_dict['diagnosisAge'] = patient_info.age
-            patient_info_dict['cancerType'] = patient_info.cancer_type
-            patient_info_dict['cancerStatus'] = patient_info.cancer_status
-            patient_info_list.append(patient_info_dict)
-        
-        return self.__create_dataframe(patient_info_list)
+        # Pages are fetched while earlier ones are parsed, so waiting for each page and parsing it are traced separately
+        for patient_info_json in self.tracer.iterate("fetch", pages):
+            with self.tracer.span("parse"):
+                counts.update(patient_info_json)
+                columns.update(patient_info_json)
+
+        with self.tracer.span("preprocess"):
+            patient_info_columns = columns.get_columns()
+
+            procedure_counts = counts.get_procedure_counts()
+            for procedure in procedure_counts.vocabulary:
+                patient_info_columns[procedure] = procedure_counts.column(procedure)
+
+            patient_info_columns['numberOfMeds'] = counts.get_med_counts().row_sums()
+            
+            return self.__create_dataframe(patient_info_columns)
     
+    def __split_order(self, n_rows: int) -> Tuple[int, np.ndarray]:
+        """
+        Returns the number of training rows and the order in which to take rows so that the training rows come first, followed by the 
+        testing rows. The split matches train_test_split(test_size=0.2, random_state=self.RANDOM_STATE).
+
+        Arguments:
+            n_rows: int number of rows in the full Dataset
+
+        Returns:
+            Tuple[int, np.ndarray]
+        """
+
+        n_test = int(np.ceil(TEST_SIZE * n_rows))
+        permutation = np.random.RandomState(self.RANDOM_STATE).permutation(n_rows)
+        return n_rows - n_test, np.concatenate([permutation[n_test:], permutation[:n_test]])
+
     def __create_dataset_splits(self, df: DataFrame) -> Dataset:
         """
         Split data into training and testing sets from passed in DataFrame, in the form of a tuple of tuples, ((X,Y),(X,Y))
+        The feature columns are copied once, straight into a C-contiguous array whose rows are already in train/test order,
+        so that both sets are views of that one array.
 
         Arguments: 
             df: DataFrame containing full Dataset
@@ -132,17 +263,44 @@ class FederatedLogReg(Experiment):
             Dataset object
         """
 
+        # Rows [0, n_train) form the training set and rows [n_train, n) the testing set
+        n_train, order = self.__split_order(len(df))
+
         # Split into X and y
-        X = []
-        y = []
+        X = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=self.dtype, order='C')
+        for i, column in enumerate(FEATURE_COLUMNS):
+            X[:, i] = df[column].to_numpy()[order]
+        y = df[LABEL_COLUMN].to_numpy()[order].astype(np.int64)
 
-        for _, row in df.iterrows():
-            X.append([row.surgical, row.radiation, row.cancerStatus,
-                     row.diagnosisAge, row.primary, row.nodes, row.numberOfMeds])
-            y.append(row.stage)
-        
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state = self.RANDOM_STATE)
-        return self.__scale_data(((X_train, y_train), (X_test, y_test)))
+        self.__scale_data(X, *self.__fit_scaler(X[:n_train]))
+        return (X[:n_train], y[:n_train]), (X[n_train:], y[n_train:])
+
+    def __create_holdout_split(self, df: DataFrame) -> XY:
+        """
+        Builds only the testing set of __create_dataset_splits, (X,Y), from passed in DataFrame. The training rows are only read,
+        one column at a time, to compute the scaling statistics, so the training set is never materialized.
+
+        Arguments:
+            df: DataFrame containing full Dataset
+
+        Response:
+            XY object
+        """
+
+        n_train, order = self.__split_order(len(df))
+        train_rows, test_rows = order[:n_train], order[n_train:]
+
+        X = np.empty((len(test_rows), len(FEATURE_COLUMNS)), dtype=self.dtype, order='C')
+        mean = np.empty(len(FEATURE_COLUMNS))
+        scale = np.empty(len(FEATURE_COLUMNS))
+        for i, column in enumerate(FEATURE_COLUMNS):
+            values = df[column].to_numpy()
+            X[:, i] = values[test_rows]
+            mean[i], scale[i] = self.__fit_scaler(values[train_rows].astype(self.dtype)[:, np.newaxis])
+        y = df[LABEL_COLUMN].to_numpy()[test_rows].astype(np.int64)
+
+        self.__scale_data(X, mean, scale)
+        return X, y
     
     def __undersample_majority_class(self, df: DataFrame) -> DataFrame:
         """
@@ -174,65 +332,151 @@ class FederatedLogReg(Experiment):
 
         return ml_sample
     
-    def __scale_data(self, data: Dataset) -> Dataset:
+    def __fit_scaler(self, X_train: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Scale input data using sklearn StandardScaler to prepare for testing
+        Returns the mean and standard deviation of every column of the training set, as StandardScaler would compute them
 
         Arguments:
-            data: Dataset object containing training and testing data
+            X_train: np.ndarray containing the training rows
 
         Returns:
-            Dataset
+            Tuple[np.ndarray, np.ndarray]
         """
 
-        scaler = StandardScaler()
-
-        training_set = data[0]
-        testing_set = data[1]
+        mean = X_train.mean(axis=0, dtype=np.float64)
+        scale = X_train.std(axis=0, dtype=np.float64)
+        scale[scale < 10 * np.finfo(scale.dtype).eps] = 1.0
+        return mean, scale
 
-        X_train = training_set[0]
-        y_train = training_set[1]
-        X_test = testing_set[0]
-        y_test = testing_set[1]
+    def __scale_data(self, X: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> None:
+        """
+        Standardize X in place with the mean and standard deviation of the training set
 
-        scaler.fit(X_train)
-        X_train = scaler.transform(X_train)
-        X_test = scaler.transform(X_test)
+        Arguments:
+            X: np.ndarray containing the rows to standardize
+            mean: np.ndarray of the column means of the training set
+            scale: np.ndarray of the column standard deviations of the training set
+        """
 
-        return (X_train, y_train), (X_test, y_test)
+        X -= mean.astype(X.dtype)
+        X /= scale.astype(X.dtype)
     
-    def create_query(self) -> str:
+    def create_query(self, table_id: Optional[str] = None) -> str:
         """
-        Returns a str containing the GraphQL query for the specified table_id
+        Returns a str containing the GraphQL query for the specified table_id, which defaults to the experiment's own table_id
+
+        Arguments:
+            table_id: Optional[str] katsu db table_id to query
         
         Returns:
             str
         """
 
-        if self.table_id:
-            return re.sub(r'TABLE_UUID', self.table_id, defaults.DEFAULT_QUERY)
+        table_id = table_id or self.table_id
+        if table_id:
+            return re.sub(r'TABLE_UUID', table_id, defaults.DEFAULT_QUERY)
         
         return re.sub(r'mcodePackets\(.*\)', "mcodePackets", defaults.DEFAULT_QUERY)
+
+    def create_page_query(self, offset: int, limit: int, table_id: Optional[str] = None) -> str:
+        """
+        Returns a str containing the GraphQL query for one page of at most limit mcodePackets, starting at offset, for the specified table_id,
+        which defaults to the experiment's own table_id
+
+        Arguments:
+            offset: int index of the first mcodePacket in the page
+            limit: int maximum number of mcodePackets in the page
+            table_id: Optional[str] katsu db table_id to query
+
+        Returns:
+            str
+        """
+
+        table_id = table_id or self.table_id
+        page_input = f'offset: {offset}, limit: {limit}'
+        if table_id:
+            page_input = f'table: "{table_id}", {page_input}'
+
+        return re.sub(r'mcodePackets\(.*\)', f'mcodePackets(input: {{{page_input}}})', defaults.DEFAULT_QUERY)
     
+    def cache_key(self) -> str:
+        """
+        Returns a str identifying the preprocessed dataset of this experiment, built from the table_ids, a hash of the GraphQL queries,
+        the parser version, the random state and the dtype of the arrays
+
+        Returns:
+            str
+        """
+
+        queries = [self.create_query(table_id) for table_id in self.table_ids] or [self.create_query()]
+        query_hash = hashlib.sha256("".join(queries).encode()).hexdigest()
+        return DatasetCache.make_key(",".join(self.table_ids), query_hash, parsers.PARSER_VERSION, self.RANDOM_STATE, self.dtype.str)
+
+    def invalidate_cache(self) -> None:
+        """
+        Removes the cached preprocessed dataset of this experiment, so that the next call to load_data queries the GraphQL-interface again
+        """
+
+        if self.cache is not None:
+            self.cache.invalidate(self.cache_key())
+
+    def __load_sample(self) -> DataFrame:
+        """
+        Queries the GraphQL-interface for all MCODE data, preprocesses it as pages arrive and undersamples the majority classes
+
+        Returns:
+            pd.DataFrame
+        """
+
+        with track_allocations("fetch + preprocess", self.debug_memory):
+            preproc_df = self.__preprocess_mcode_req(self.__fetch_mcode_pages())
+
+        with track_allocations("undersample", self.debug_memory), self.tracer.span("undersample"):
+            return self.__undersample_majority_class(preproc_df)
+
     def load_data(self) -> Dataset:
         """
-        Queries the GraphQL-interface for all MCODE data and preprocesses it
+        Queries the GraphQL-interface for all MCODE data and preprocesses it, unless the preprocessed dataset is already cached
 
         Returns:
             Dataset
         """
+
+        if self.cache is not None:
+            with self.tracer.span("cache_read"):
+                dataset = self.cache.get(self.cache_key())
+            if dataset is not None:
+                return dataset
         
-        # Get Query String
-        query = self.create_query()
+        sample_df = self.__load_sample()
+
+        # Split into train/test
+        with track_allocations("split + scale", self.debug_memory), self.tracer.span("split + scale"):
+            dataset = self.__create_dataset_splits(sample_df)
 
-        # Request information from GraphQL
-        data_json = self.send_graphql_request(query)
+        if self.cache is not None:
+            self.cache.put(self.cache_key(), dataset)
 
-        # Apply preprocessing function
-        preproc_df = self.__preprocess_mcode_req(data_json)
+        return dataset
 
-        # Split into train/test
-        return self.__create_dataset_splits(self.__undersample_majority_class(preproc_df))
+    def load_holdout(self) -> XY:
+        """
+        Returns only the testing set of load_data, for the fl-server. A cached dataset only has its testing files mapped, 
+        otherwise the data is queried and preprocessed as in load_data, but the training set is never built
+
+        Returns:
+            XY
+        """
+
+        if self.cache is not None:
+            holdout = self.cache.get(self.cache_key(), splits=("X_test", "y_test"))
+            if holdout is not None:
+                return holdout
+
+        sample_df = self.__load_sample()
+
+        with track_allocations("holdout split + scale", self.debug_memory):
+            return self.__create_holdout_split(sample_df)
     
     def get_model_parameters(self, model: LogisticRegression) -> LogRegParams:
         if model.fit_intercept:
@@ -248,7 +492,8 @@ class FederatedLogReg(Experiment):
         return model
     
     def set_initial_params(self, model: LogisticRegression) -> LogisticRegression:
-        model.classes_ = np.array([i for i in range(self.n_classes)])
+        # The labels are the cancer stages, numbered from 1
+        model.classes_ = np.array([i for i in range(1, self.n_classes + 1)])
         model.coef_ = np.zeros((self.n_classes, self.n_features))
 
         if model.fit_intercept:
@@ -257,11 +502,35 @@ class FederatedLogReg(Experiment):
         return model
         
 
-experiment = FederatedLogReg(
-    filename=experiment.settings.FL_TABLE_FILE,
-    n_classes=experiment.settings.FL_N_CLASSES,
-    n_features=experiment.settings.FL_N_FEATURES,
-    resource_url=experiment.settings.FL_GRAPHQL_URL,
-    random_state=experiment.settings.FL_RANDOM_STATE,
-    client_number=experiment.settings.FL_CLIENT_NUMBER,
-)
+def create_experiment(client_number: Optional[str] = settings.FL_CLIENT_NUMBER) -> FederatedLogReg:
+    """
+    Returns the experiment of the given client number, configured by the settings. Each experiment has its own connection pool,
+    so that the logical clients of a worker process (services/fl-client/worker.py) do not share one.
+    """
+
+    return FederatedLogReg(
+        filename=settings.FL_TABLE_FILE,
+        n_classes=settings.FL_N_CLASSES,
+        n_features=settings.FL_N_FEATURES,
+        resource_url=settings.FL_GRAPHQL_URL,
+        random_state=settings.FL_RANDOM_STATE,
+        client_number=client_number,
+        page_size=settings.FL_PAGE_SIZE,
+        page_concurrency=settings.FL_PAGE_CONCURRENCY,
+        table_concurrency=settings.FL_TABLE_CONCURRENCY,
+        cache_path=settings.FL_CACHE_PATH,
+        cache_max_bytes=settings.FL_CACHE_MAX_BYTES,
+        dtype=settings.FL_DTYPE,
+        debug_memory=settings.FL_DEBUG_MEMORY,
+        transport=HTTPTransport(
+            pool_size=settings.FL_HTTP_POOL_SIZE,
+            connect_timeout=settings.FL_HTTP_CONNECT_TIMEOUT,
+            read_timeout=settings.FL_HTTP_READ_TIMEOUT,
+            max_retries=settings.FL_HTTP_RETRIES,
+            compress_requests=settings.FL_HTTP_COMPRESS_REQUESTS,
+        ),
+    )
+
+
+# Bound last, as it shadows the experiment package in this module
+experiment = create_experiment()
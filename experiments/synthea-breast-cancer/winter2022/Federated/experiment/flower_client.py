@@ -1,7 +1,8 @@
-from sklearn.metrics import log_loss, balanced_accuracy_score, f1_score, matthews_corrcoef
 from bases.base_flower_client import BaseFlowerClient
 from sklearn.linear_model import LogisticRegression
 from experiment.experiment import FederatedLogReg
+from experiment.helpers import local_training, metrics
+import experiment.settings
 import warnings
 
 class FlowerClient(BaseFlowerClient):
@@ -16,19 +17,32 @@ class FlowerClient(BaseFlowerClient):
         return self.experiment.get_model_parameters(self.fl_model)
 
     def fit(self, parameters, config):
-        self.fl_model = self.experiment.set_model_params(self.fl_model, parameters)
+        rnd = config.get('rnd')
+        with self.tracer.span("set_model_params", rnd):
+            self.fl_model = self.experiment.set_model_params(self.fl_model, parameters)
 
-        with warnings.catch_warnings():
+        # The mini-batch path only applies to the plain LogisticRegression, subclasses like diffprivlib's must fit as they define
+        fit_metrics = {}
+        with warnings.catch_warnings(), self.tracer.span("local_fit", rnd):
             warnings.simplefilter("ignore")
-            self.fl_model.fit(self.X_train, self.y_train)
+            if local_training.is_requested(config) and type(self.fl_model) is LogisticRegression:
+                seed = None if self.experiment.RANDOM_STATE is None else self.experiment.RANDOM_STATE + config['rnd']
+                fit_metrics = local_training.fit_minibatches(self.fl_model, self.X_train, self.y_train, config, seed)
+            else:
+                self.fl_model.fit(self.X_train, self.y_train)
         
         print(f"Training finished for round {config['rnd']}")
-        return self.experiment.get_model_parameters(self.fl_model), len(self.X_train), {}
+        with self.tracer.span("get_model_parameters", rnd):
+            fitted_parameters = self.experiment.get_model_parameters(self.fl_model)
+        with self.tracer.span("encode", rnd):
+            encoded_parameters, codec = self.encode_parameters(fitted_parameters, parameters, config)
+        return encoded_parameters, len(self.X_train), {**fit_metrics, **codec}
 
     def evaluate(self, parameters, config):
-        self.fl_model = self.experiment.set_model_params(self.fl_model, parameters)
-        loss = log_loss(self.y_test, self.fl_model.predict_proba(self.X_test))
-        accuracy = self.fl_model.score(self.X_test, self.y_test)
-        y_pred = self.fl_model.predict(self.X_test)
+        rnd = config.get('rnd')
+        with self.tracer.span("set_model_params", rnd):
+            self.fl_model = self.experiment.set_model_params(self.fl_model, parameters)
+        with self.tracer.span("evaluate", rnd):
+            loss, results = metrics.evaluate(self.fl_model, self.X_test, self.y_test, experiment.settings.FL_EVAL_CHUNK_SIZE)
 
-        return loss, len(self.X_test), {"accuracy": accuracy, "balanced_accuracy": balanced_accuracy_score(self.y_test, y_pred), "f1_score": f1_score(self.y_test, y_pred, average='macro'), "mcc": matthews_corrcoef(self.y_test, y_pred)}
\ No newline at end of file
+        return loss, len(self.X_test), results
\ No newline at end of file
@@ -0,0 +1,64 @@
+'''local_training.py: A module to train the model on mini-batches within the compute budget the server sets for each round'''
+
+import time
+import numpy as np
+import sklearn
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.utils.class_weight import compute_class_weight
+from typing import Any, Dict, Optional
+
+BUDGET_KEYS = ('local_epochs', 'batch_size', 'time_budget')
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_LEARNING_RATE = 0.01
+# scikit-learn 1.1 renamed the logistic loss of SGDClassifier from 'log' to 'log_loss'
+LOG_LOSS = 'log_loss' if tuple(int(part) for part in sklearn.__version__.split('.')[:2]) >= (1, 1) else 'log'
+
+
+'''is_requested(config): Passed in a round config, returns whether it sets a local training budget'''
+def is_requested(config: Dict[str, Any]) -> bool:
+    return any(config.get(key) for key in BUDGET_KEYS)
+
+'''fit_minibatches(model, X, y, config, random_state): Passed in a LogisticRegression holding the global weights, continues training it
+        with SGDClassifier.partial_fit over shuffled mini-batches of (X, y), for the local_epochs, batch_size and time_budget (seconds) in config.
+        Stops at whichever of local_epochs or time_budget comes first, local_epochs defaulting to 1 unless only a time budget is set.
+        Returns the fit metrics: the epochs actually done and the number of examples they went through'''
+def fit_minibatches(model: LogisticRegression, X: np.ndarray, y: np.ndarray, config: Dict[str, Any], random_state: Optional[int] = None) -> Dict[str, Any]:
+    time_budget = float(config.get('time_budget') or 0)
+    local_epochs = float(config.get('local_epochs') or (np.inf if time_budget else 1))
+    batch_size = int(config.get('batch_size') or DEFAULT_BATCH_SIZE)
+    deadline = time.perf_counter() + time_budget if time_budget else None
+
+    sgd = SGDClassifier(loss=LOG_LOSS, learning_rate='constant', eta0=float(config.get('learning_rate') or DEFAULT_LEARNING_RATE),
+        random_state=random_state)
+    sgd.classes_ = model.classes_
+    sgd.coef_ = np.array(model.coef_, dtype=np.float64)
+    sgd.intercept_ = np.array(model.intercept_, dtype=np.float64) if model.fit_intercept else np.zeros(len(model.classes_))
+    sgd.fit_intercept = model.fit_intercept
+
+    # partial_fit does not support class_weight='balanced', so the balancing weights are passed per example
+    sample_weight = np.ones(len(y))
+    if model.class_weight == 'balanced':
+        present = np.unique(y)
+        sample_weight = compute_class_weight('balanced', classes=present, y=y)[np.searchsorted(present, y)]
+
+    rng = np.random.RandomState(random_state)
+    max_examples = local_epochs * len(y)
+    seen = 0
+    while seen < max_examples and len(y):
+        order = rng.permutation(len(y))
+        for start in range(0, len(y), batch_size):
+            rows = order[start:start + int(min(batch_size, np.ceil(max_examples - seen)))]
+            # Batches are cast to the float64 of the coefficients, which SGDClassifier requires to match
+            sgd.partial_fit(X[rows].astype(np.float64), y[rows], classes=model.classes_, sample_weight=sample_weight[rows])
+            seen += len(rows)
+
+            if seen >= max_examples or (deadline is not None and time.perf_counter() >= deadline):
+                break
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+
+    model.coef_ = sgd.coef_
+    if model.fit_intercept:
+        model.intercept_ = sgd.intercept_
+
+    return {'local_epochs': seen / len(y) if len(y) else 0.0, 'num_examples_seen': seen}
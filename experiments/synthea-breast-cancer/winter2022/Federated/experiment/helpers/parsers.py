@@ -1,11 +1,15 @@
 '''parsers.py: A module with helper functions/classes to support the EDA parsing process in SyntheaEDA.ipynb'''
 
-import re
-from experiment.helpers import defaults
+import numpy as np
+from array import array
+from experiment.helpers import defaults, encoders
 from datetime import datetime
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
 
+# Bump whenever the parsed or preprocessed features change, so that cached datasets are rebuilt
+PARSER_VERSION = 3
+
 @dataclass
 class Patient:
     cancer_status: Optional[int] = None
@@ -42,19 +46,94 @@ class UniqueInfoParser:
         return list(set(meds))
 
 
+@dataclass
+class CountMatrix:
+    '''CountMatrix: Per-patient label counts in CSR form, where row i holds the counts of patient i in data[indptr[i]:indptr[i + 1]],
+            at the vocabulary ids in indices[indptr[i]:indptr[i + 1]]'''
+    vocabulary: Dict[Optional[str], int]
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+
+    '''row_sums(): returns an array with the total count of each patient'''
+    def row_sums(self) -> np.ndarray:
+        totals = np.zeros(len(self.indptr) - 1, dtype=np.int64)
+        rows = np.repeat(np.arange(len(totals)), np.diff(self.indptr))
+        np.add.at(totals, rows, self.data)
+        return totals
+
+    '''column(label): returns an array with the count of the given label for each patient, zero if the label was never seen'''
+    def column(self, label: Optional[str]) -> np.ndarray:
+        counts = np.zeros(len(self.indptr) - 1, dtype=self.data.dtype)
+        label_id = self.vocabulary.get(label)
+        if label_id is None: return counts
+
+        rows = np.repeat(np.arange(len(counts)), np.diff(self.indptr))
+        mask = self.indices == label_id
+        counts[rows[mask]] = self.data[mask]
+        return counts
+
+
+class CountMatrixParser:
+    '''CountMatrixParser: Walks the mcodePackets once, assigning vocabulary ids to medications and procedures on first sight
+            and recording each patient's counts directly as CSR arrays. update() may be called once per page of packets.'''
+    def __init__(self) -> None:
+        self.med_vocabulary: Dict[Optional[str], int] = {}
+        self.procedure_vocabulary: Dict[Optional[str], int] = {}
+        self.__meds = (array('q', [0]), array('i'), array('i'))
+        self.__procedures = (array('q', [0]), array('i'), array('i'))
+
+    '''update(patient_info_json): Passed in a List of mcodePackets, appends one row per patient to the medication and procedure counts'''
+    def update(self, patient_info_json: List[Dict[str, Any]]) -> None:
+        for patient in patient_info_json:
+            meds = patient.get('medicationStatement', defaults.DEFAULT_MEDS)
+            self.__append_row(self.__meds, self.med_vocabulary, (med.get('medicationCode').get('label') for med in meds))
+
+            procedures = patient.get('cancerRelatedProcedures', defaults.DEFAULT_PROCEDURES)
+            self.__append_row(self.__procedures, self.procedure_vocabulary, (procedure.get('procedureType') for procedure in procedures))
+
+    '''get_med_counts(): returns a CountMatrix of the number of times each patient takes each medication'''
+    def get_med_counts(self) -> CountMatrix:
+        return self.__to_count_matrix(self.__meds, self.med_vocabulary)
+
+    '''get_procedure_counts(): returns a CountMatrix of the number of times each procedure type was performed on each patient'''
+    def get_procedure_counts(self) -> CountMatrix:
+        return self.__to_count_matrix(self.__procedures, self.procedure_vocabulary)
+
+    def __append_row(self, csr, vocabulary: Dict[Optional[str], int], labels) -> None:
+        indptr, indices, data = csr
+        row: Dict[int, int] = {}
+        for label in labels:
+            label_id = vocabulary.get(label)
+            if label_id is None:
+                label_id = vocabulary[label] = len(vocabulary)
+            row[label_id] = row.get(label_id, 0) + 1
+
+        indices.extend(row.keys())
+        data.extend(row.values())
+        indptr.append(len(indices))
+
+    def __to_count_matrix(self, csr, vocabulary: Dict[Optional[str], int]) -> CountMatrix:
+        indptr, indices, data = csr
+        return CountMatrix(dict(vocabulary), np.frombuffer(indptr, dtype=np.int64).copy(), 
+            np.frombuffer(indices, dtype=np.int32).copy(), np.frombuffer(data, dtype=np.int32).copy())
+
+
 class PatientInfoParser:
-    def __init__(self, uniq_meds: List[str], uniq_procedures: List[str], patient: Optional[Dict[str, Any]]) -> None:
+    '''PatientInfoParser: Parses a single patient. Pass None for uniq_meds and uniq_procedures to skip the per-patient medication and
+            procedure counts, eg. when they are taken from a CountMatrixParser instead'''
+    def __init__(self, uniq_meds: Optional[List[str]], uniq_procedures: Optional[List[str]], patient: Optional[Dict[str, Any]]) -> None:
         self.uniq_meds = uniq_meds
         self.uniq_procedures = uniq_procedures
         self.patient = patient
 
         self.type = self.__get_cancer_type()
-        self.meds = self.__get_patient_meds()
+        self.meds = self.__get_patient_meds() if uniq_meds is not None else None
         self.age = self.__encode_one_hot_age() / 365.25
         self.sex = self.__encode_one_hot_sex()
         self.stages = self.__encode_one_hot_stage()
         self.status = self.__encode_one_hot_status()
-        self.procedures = self.__get_patient_procedures()
+        self.procedures = self.__get_patient_procedures() if uniq_procedures is not None else None
         self.stage = self.stages['stage']
         self.nodes = self.stages['nodes']
         self.primary = self.stages['primary']
@@ -152,25 +231,12 @@ class PatientInfoParser:
 
     '''__get_stage(given_stage): Passed in a str, this function returns the patient's cancer stage'''
     def __get_stage(self, given_stage: str) -> Optional[int]:
-        if re.search(r'[sS]tage 1', given_stage): return 1
-        if re.search(r'[sS]tage 2', given_stage): return 2
-        if re.search(r'[sS]tage 3', given_stage): return 3
-        if re.search(r'[sS]tage 4', given_stage): return 4
-        return None
+        return encoders.encode_stage(given_stage)
 
     '''__get_primary(given_stage): Passed in a str, this function returns the patient's tumour stage'''
     def __get_primary(self, given_stage: str) -> Optional[int]:
-        if 'T0' in given_stage: return 0
-        if 'T1' in given_stage: return 1
-        if 'T2' in given_stage: return 2
-        if 'T3' in given_stage: return 3
-        if 'T4' in given_stage: return 4
-        return None
+        return encoders.encode_primary(given_stage)
 
     '''__get_nodes(given_stage): Passed in a str, this function returns the patient's nodes stage'''
     def __get_nodes(self, given_stage: str) -> Optional[int]:
-        if 'N0' in given_stage: return 0
-        if 'N1' in given_stage: return 1
-        if 'N2' in given_stage: return 2
-        if 'N3' in given_stage: return 3
-        return None
+        return encoders.encode_nodes(given_stage)
@@ -5,14 +5,55 @@ FL_N_FEATURES = 7
 FL_EPOCHS = 10000
 FL_SOLVER = 'saga'
 FL_CLASS_WEIGHT = 'balanced'
-FL_MIN_CLIENTS = 2
+FL_MIN_CLIENTS = int(os.getenv("FL_MIN_CLIENTS", "2"))
 FL_RANDOM_STATE = 1729
-FL_TABLE_FILE = f"{os.getcwd()}/experiment/helpers/tables.txt"
+FL_TABLE_FILE = os.getenv("FL_TABLE_FILE", f"{os.getcwd()}/experiment/helpers/tables.txt")
 FL_CHECKPOINT_PATH = 'experiment/checkpoints'
+FL_CHECKPOINT_INTERVAL = int(os.getenv("FL_CHECKPOINT_INTERVAL", "10"))
+FL_CHECKPOINT_KEEP_LAST = int(os.getenv("FL_CHECKPOINT_KEEP_LAST", "0"))
+FL_CHECKPOINT_KEEP_BEST = int(os.getenv("FL_CHECKPOINT_KEEP_BEST", "0"))
+FL_CHECKPOINT_BEST_METRIC = os.getenv("FL_CHECKPOINT_BEST_METRIC", "loss")
+FL_CHECKPOINT_BEST_MODE = os.getenv("FL_CHECKPOINT_BEST_MODE", "min")
+FL_CHECKPOINT_FORMAT = os.getenv("FL_CHECKPOINT_FORMAT", "npz")
+FL_RESUME = os.getenv("FL_RESUME", "0") == "1"
+FL_CACHE_PATH = os.getenv("FL_CACHE_PATH", 'experiment/cache')
+FL_CACHE_MAX_BYTES = int(os.getenv("FL_CACHE_MAX_BYTES", str(1024 ** 3)))
+FL_DTYPE = os.getenv("FL_DTYPE", "float32")
+FL_DEBUG_MEMORY = os.getenv("FL_DEBUG_MEMORY", "0") == "1"
+FL_ASYNC_EVAL = os.getenv("FL_ASYNC_EVAL", "0") == "1"
+FL_EVAL_CHUNK_SIZE = int(os.getenv("FL_EVAL_CHUNK_SIZE", "0"))
+FL_CODEC = os.getenv("FL_CODEC", "none")
+FL_CODEC_DELTA = os.getenv("FL_CODEC_DELTA", "1") == "1"
+FL_CODEC_TOPK_RATIO = float(os.getenv("FL_CODEC_TOPK_RATIO", "0.1"))
+FL_LOCAL_EPOCHS = float(os.getenv("FL_LOCAL_EPOCHS", "0"))
+FL_BATCH_SIZE = int(os.getenv("FL_BATCH_SIZE", "0"))
+FL_TIME_BUDGET = float(os.getenv("FL_TIME_BUDGET", "0"))
+FL_SGD_LEARNING_RATE = float(os.getenv("FL_SGD_LEARNING_RATE", "0.01"))
+FL_ASYNC = os.getenv("FL_ASYNC", "0") == "1"
+FL_ASYNC_BUFFER_SIZE = int(os.getenv("FL_ASYNC_BUFFER_SIZE", "2"))
+FL_ASYNC_STALENESS_EXPONENT = float(os.getenv("FL_ASYNC_STALENESS_EXPONENT", "0.5"))
+FL_ASYNC_MAX_STALENESS = int(os.getenv("FL_ASYNC_MAX_STALENESS", "0"))
+FL_ASYNC_SERVER_LEARNING_RATE = float(os.getenv("FL_ASYNC_SERVER_LEARNING_RATE", "1.0"))
+FL_ROUND_DEADLINE = float(os.getenv("FL_ROUND_DEADLINE", "0"))
+FL_MIN_ROUND_DEADLINE = float(os.getenv("FL_MIN_ROUND_DEADLINE", "1.0"))
+FL_DEADLINE_QUANTILE = float(os.getenv("FL_DEADLINE_QUANTILE", "0.9"))
+FL_DEADLINE_SLACK = float(os.getenv("FL_DEADLINE_SLACK", "1.5"))
+FL_FRACTION_FIT = float(os.getenv("FL_FRACTION_FIT", "0.1"))
+FL_TRACE = os.getenv("FL_TRACE", "0") == "1"
+FL_TRACE_PATH = os.getenv("FL_TRACE_PATH", 'experiment/traces')
 
 FL_ROUNDS = int(os.getenv("ROUNDS", "100"))
 FL_CLIENT_NUMBER = os.getenv("FLOWER_CLIENT_NUMBER", "1")
+FL_WORKER_CLIENTS = os.getenv("FLOWER_WORKER_CLIENTS", "").split()
 FL_INTERNAL_PORT = os.getenv("SERVER_INTERNAL_PORT", "8080")
 FL_INTERNAL_HOST = os.getenv("SERVER_INTERNAL_HOST", "0.0.0.0")
 FL_SERVER_URL = os.getenv('FLOWER_SERVER_URL', "http://127.0.0.1:5000")
 FL_GRAPHQL_URL = os.getenv("GRAPHQL_INTERFACE_URL", "http://127.0.0.1:5000")
+FL_PAGE_SIZE = int(os.getenv("GRAPHQL_PAGE_SIZE", "0"))
+FL_PAGE_CONCURRENCY = int(os.getenv("GRAPHQL_PAGE_CONCURRENCY", "4"))
+FL_TABLE_CONCURRENCY = int(os.getenv("GRAPHQL_TABLE_CONCURRENCY", "4"))
+FL_HTTP_POOL_SIZE = int(os.getenv("GRAPHQL_POOL_SIZE", "10"))
+FL_HTTP_CONNECT_TIMEOUT = float(os.getenv("GRAPHQL_CONNECT_TIMEOUT", "10"))
+FL_HTTP_READ_TIMEOUT = float(os.getenv("GRAPHQL_READ_TIMEOUT", "300"))
+FL_HTTP_RETRIES = int(os.getenv("GRAPHQL_RETRIES", "3"))
+FL_HTTP_COMPRESS_REQUESTS = os.getenv("GRAPHQL_COMPRESS_REQUESTS", "0") == "1"
@@ -1,32 +1,258 @@
-import os
 import flwr
 import numpy as np
 import experiment.settings
-from typing import List, Optional, Tuple
+from bases.checkpoints import CheckpointWriter
+from bases.aggregation import StreamingAggregator
+from bases.scheduling import ClientScheduler
+from bases.tracing import Timeline, Tracer, pop_spans
+from typing import Any, Dict, List, Optional, Tuple
+import time
 
 
 class Strategy(flwr.server.strategy.FedAvg):
     """
     Adapted from https://flower.dev/docs/saving-progress.html.
-    Saves aggregated weights to a .npz file every 10 rounds of learning.
+    Saves the aggregated weights every FL_CHECKPOINT_INTERVAL rounds of learning, through a CheckpointWriter that writes them
+    on a background thread and applies the FL_CHECKPOINT_KEEP_* retention settings.
+    When resuming from the checkpoint of round round_offset, the rounds run by the flower server (which always counts from 1)
+    are shifted by round_offset, so that fit configs, checkpoints and evaluations carry the true round number.
+    Asks the clients to encode their parameters with the FL_CODEC codec, as deltas from the global weights if FL_CODEC_DELTA is set,
+    or as sparse top-k deltas holding FL_CODEC_TOPK_RATIO of the weights, and decodes each client's parameters into the average.
+    The average is kept in running weighted sums, which a server like the StreamingServer folds each result into as it arrives (fold_fit),
+    so that server memory does not grow with the number of clients.
+    With FL_ROUND_DEADLINE set, picks the clients of each round and the deadline of the round from their history of fit latencies
+    and data sizes, through a ClientScheduler, for a server that drops the results arriving after that deadline, like the StreamingServer.
+    With FL_TRACE set, asks the clients for the spans they recorded, eg. loading data and each stage of their fits and evaluations,
+    and writes them to a Timeline under FL_TRACE_PATH, along with its own spans: waiting for clients, collecting and folding
+    their results, aggregating, server-side evaluation and checkpointing.
     Proceeds normally as per Federated Averaging otherwise.
     """
 
+    def __init__(
+        self,
+        *args,
+        checkpoints: Optional[CheckpointWriter] = None,
+        round_offset: int = 0,
+        codec: Optional[str] = None,
+        delta: Optional[bool] = None,
+        topk_ratio: Optional[float] = None,
+        scheduler: Optional[ClientScheduler] = None,
+        timeline: Optional[Timeline] = None,
+        **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.round_offset = round_offset
+        self.codec = codec if codec is not None else experiment.settings.FL_CODEC
+        self.delta = delta if delta is not None else experiment.settings.FL_CODEC_DELTA
+        self.topk_ratio = topk_ratio if topk_ratio is not None else experiment.settings.FL_CODEC_TOPK_RATIO
+        self.aggregator: Optional[StreamingAggregator] = None
+        self.fit_metrics: List[Tuple[int, Dict[str, flwr.common.Scalar]]] = []
+        self.scheduler = scheduler
+        if scheduler is None and experiment.settings.FL_ROUND_DEADLINE > 0:
+            self.scheduler = ClientScheduler(
+                experiment.settings.FL_ROUND_DEADLINE,
+                min_deadline=experiment.settings.FL_MIN_ROUND_DEADLINE,
+                quantile=experiment.settings.FL_DEADLINE_QUANTILE,
+                slack=experiment.settings.FL_DEADLINE_SLACK,
+                random_state=experiment.settings.FL_RANDOM_STATE,
+            )
+        self.deadline: Optional[float] = None
+        self.checkpoints = checkpoints if checkpoints is not None else CheckpointWriter(
+            experiment.settings.FL_CHECKPOINT_PATH,
+            interval=experiment.settings.FL_CHECKPOINT_INTERVAL,
+            keep_last=experiment.settings.FL_CHECKPOINT_KEEP_LAST,
+            keep_best=experiment.settings.FL_CHECKPOINT_KEEP_BEST,
+            best_metric=experiment.settings.FL_CHECKPOINT_BEST_METRIC,
+            best_mode=experiment.settings.FL_CHECKPOINT_BEST_MODE,
+            format=experiment.settings.FL_CHECKPOINT_FORMAT,
+            # Only a server that resumed from a checkpoint continues its index, the checkpoints of any other run are set aside
+            resume=experiment.settings.FL_RESUME and round_offset > 0,
+        )
+        self.tracer = Tracer()
+        self.timeline = timeline
+        if timeline is None and experiment.settings.FL_TRACE:
+            self.timeline = Timeline(experiment.settings.FL_TRACE_PATH)
+        if self.timeline is not None:
+            self.timeline.register("server", self.tracer)
+        self.__round = round_offset
+        self.__fit_started = time.time()
+        self.__evaluate_started = time.time()
+
+    def configure_fit(
+        self,
+        rnd: int,
+        parameters: flwr.common.Parameters,
+        client_manager: flwr.server.client_manager.ClientManager,
+    ) -> List[Tuple[flwr.server.client_proxy.ClientProxy, flwr.common.FitIns]]:
+        # The previous round, including its evaluations, is over, so its spans can be written
+        if self.timeline is not None:
+            self.timeline.flush(rnd + self.round_offset - 1)
+
+        with self.tracer.span("wait_for_clients", rnd + self.round_offset):
+            instructions = self.__sample_fit(rnd, parameters, client_manager)
+        self.__fit_started = time.time()
+        return instructions
+
+    def __sample_fit(
+        self,
+        rnd: int,
+        parameters: flwr.common.Parameters,
+        client_manager: flwr.server.client_manager.ClientManager,
+    ) -> List[Tuple[flwr.server.client_proxy.ClientProxy, flwr.common.FitIns]]:
+        # The global weights are kept to decode the deltas the clients send back
+        self.aggregator = StreamingAggregator(flwr.common.parameters_to_weights(parameters))
+        self.fit_metrics = []
+
+        if self.scheduler is None:
+            instructions = super().configure_fit(rnd + self.round_offset, parameters, client_manager)
+            for _, fit_ins in instructions:
+                fit_ins.config.update({**self.__codec_config(), **self.__trace_config()})
+            return instructions
+
+        sample_size, min_num_clients = self.num_fit_clients(client_manager.num_available())
+        client_manager.wait_for(min_num_clients)
+        clients = self.scheduler.select(client_manager.all(), sample_size)
+        self.deadline = self.scheduler.round_deadline([client.cid for client in clients])
+
+        fit_ins = flwr.common.FitIns(parameters, self.fit_config(rnd))
+        return [(client, fit_ins) for client in clients]
+
+    def fit_deadline(self, rnd: int) -> Optional[float]:
+        """
+        Return the deadline, in seconds, of the fits configured for round rnd, or None to wait for all of them
+        """
+
+        return self.deadline if self.scheduler is not None else None
+
+    def record_fit(self, cid: str, latency: float, fit_res: Optional[flwr.common.FitRes], late: bool) -> None:
+        """
+        Add a fit that ended, whether or not it made the deadline, to the client's history. fit_res is None when the fit failed.
+        """
+
+        if self.scheduler is not None:
+            self.scheduler.record(cid, latency, fit_res.num_examples if fit_res is not None else None, late)
+
+    def fit_config(self, rnd: int) -> Dict[str, flwr.common.Scalar]:
+        """
+        Return the config of a fit in round rnd, for servers that send fit instructions to one client at a time, like the AsyncServer
+        """
+
+        config = self.on_fit_config_fn(rnd + self.round_offset) if self.on_fit_config_fn is not None else {}
+        return {**config, **self.__codec_config(), **self.__trace_config()}
+
+    def __codec_config(self) -> Dict[str, flwr.common.Scalar]:
+        return {"codec": self.codec, "delta": self.delta, "topk_ratio": self.topk_ratio}
+
+    def __trace_config(self) -> Dict[str, flwr.common.Scalar]:
+        return {"trace": True} if self.timeline is not None else {}
+
+    def configure_evaluate(
+        self,
+        rnd: int,
+        parameters: flwr.common.Parameters,
+        client_manager: flwr.server.client_manager.ClientManager,
+    ) -> List[Tuple[flwr.server.client_proxy.ClientProxy, flwr.common.EvaluateIns]]:
+        instructions = super().configure_evaluate(rnd + self.round_offset, parameters, client_manager)
+
+        # Clients still running a late fit can not evaluate until it ends
+        if self.scheduler is not None:
+            instructions = [(client, evaluate_ins) for client, evaluate_ins in instructions if not self.scheduler.is_busy(client.cid)]
+
+        # The round is always sent, eg. for a RegionalAggregator to run the evaluation round of its region as the same round
+        for _, evaluate_ins in instructions:
+            evaluate_ins.config.update({"rnd": rnd + self.round_offset, **self.__trace_config()})
+        self.__evaluate_started = time.time()
+        return instructions
+
+    def aggregate_evaluate(
+        self,
+        rnd: int,
+        results: List[Tuple[flwr.server.client_proxy.ClientProxy, flwr.common.EvaluateRes]],
+        failures: List[BaseException],
+    ) -> Tuple[Optional[float], Dict[str, flwr.common.Scalar]]:
+        self.tracer.add("collect_evaluations", rnd + self.round_offset, self.__evaluate_started, time.time() - self.__evaluate_started)
+        for client, evaluate_res in results:
+            self.__add_client_spans(client, evaluate_res.metrics)
+
+        return super().aggregate_evaluate(rnd + self.round_offset, results, failures)
+
+    def evaluate(self, parameters: flwr.common.Parameters) -> Optional[Tuple[float, Dict[str, flwr.common.Scalar]]]:
+        # With FL_ASYNC_EVAL, this only covers handing the evaluation off to its worker
+        with self.tracer.span("server_eval", self.__round):
+            return super().evaluate(parameters)
+
     def aggregate_fit(
         self,
         rnd: int,
         results: List[Tuple[flwr.server.client_proxy.ClientProxy, flwr.common.FitRes]],
         failures: List[BaseException],
-    ) -> Optional[flwr.common.Weights]:
-        aggregated_weights = super().aggregate_fit(rnd, results, failures)
+    ) -> Tuple[Optional[flwr.common.Parameters], Dict[str, flwr.common.Scalar]]:
+        """
+        FedAvg.aggregate_fit, except that each client's parameters are decoded as described by its fit metrics, straight into the running
+        weighted sums, into which sparse updates are scatter-added. results only holds the results that were not already passed to fold_fit.
+        """
+
+        for client, fit_res in results:
+            self.fold_fit(rnd, client, fit_res)
+
+        rnd += self.round_offset
+        self.__round = rnd
+        self.tracer.add("collect_fits", rnd, self.__fit_started, time.time() - self.__fit_started)
+        aggregator, fit_metrics = self.aggregator, self.fit_metrics
+        self.aggregator, self.fit_metrics = None, []
+
+        # Do not aggregate if there are failures and failures are not accepted
+        if aggregator is None or not aggregator.count or (not self.accept_failures and failures):
+            return None, {}
+
+        with self.tracer.span("aggregate", rnd):
+            aggregated = aggregator.result()
+            metrics = {}
+            if getattr(self, "fit_metrics_aggregation_fn", None):
+                metrics = self.fit_metrics_aggregation_fn(fit_metrics)
+
+        if self.checkpoints.is_due(rnd):
+            with self.tracer.span("checkpoint", rnd):
+                self.checkpoints.submit(rnd, aggregated, metrics)
+
+        return flwr.common.weights_to_parameters(aggregated), metrics
+
+    def fold_fit(self, rnd: int, client: flwr.server.client_proxy.ClientProxy, fit_res: flwr.common.FitRes) -> None:
+        """
+        Add one client's fit result of round rnd into the aggregate, after which it is no longer needed
+        """
+
+        # The time from sending the fit to receiving its result, on a track of its own for each client
+        self.tracer.add("fit", rnd + self.round_offset, self.__fit_started, time.time() - self.__fit_started, thread=f"client {client.cid}")
+        self.__add_client_spans(client, fit_res.metrics)
+
+        # Clients training on a local budget report how many examples they actually went through, which their update is weighted by
+        with self.tracer.span("fold", rnd + self.round_offset):
+            num_examples = fit_res.metrics.get("num_examples_seen", fit_res.num_examples)
+            self.aggregator.add(flwr.common.parameters_to_weights(fit_res.parameters), fit_res.metrics, num_examples)
+            self.fit_metrics.append((fit_res.num_examples, fit_res.metrics))
+
+    def __add_client_spans(self, client: flwr.server.client_proxy.ClientProxy, metrics: Dict[str, flwr.common.Scalar]) -> None:
+        spans = pop_spans(metrics)
+        if self.timeline is not None and spans:
+            self.timeline.add(f"client {client.cid}", spans)
+
+    def save_checkpoint(self, rnd: int, weights: List[np.ndarray], metrics: Dict[str, flwr.common.Scalar]) -> None:
+        """
+        Save the weights a server aggregated outside of aggregate_fit in round rnd, like the AsyncServer, if a checkpoint is due
+        """
+
+        # Such servers call neither configure_fit nor aggregate_fit, so the round of the spans moves on, and the previous one is written, here
+        rnd += self.round_offset
+        self.__round = rnd
+        if self.timeline is not None:
+            self.timeline.flush(rnd - 1)
 
-        if not os.path.exists(experiment.settings.FL_CHECKPOINT_PATH):
-            os.makedirs(experiment.settings.FL_CHECKPOINT_PATH)
+        with self.tracer.span("checkpoint", rnd):
+            self.checkpoints.submit(rnd, weights, metrics)
 
-        if aggregated_weights is not None and rnd % 10 == 0:
-            # Save aggregated_weights
-            print(f"Saving round {rnd} aggregated_weights...")
-            np.savez(
-                f"{experiment.settings.FL_CHECKPOINT_PATH}/round-{rnd}-weights.npz", *aggregated_weights)
+    def record_evaluation(self, rnd: int, loss: float, metrics: Dict[str, Any]) -> None:
+        """
+        Attach the server-side evaluation results of round rnd to its checkpoint, for keep-best retention
+        """
 
-        return aggregated_weights
+        self.checkpoints.update_metrics(rnd, {"loss": loss, **metrics})
@@ -0,0 +1,96 @@
+'''encoders.py: A module with column-oriented encoders that parse every patient's fields at once, rather than one patient at a time'''
+
+import re
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+import defaults
+from typing import Any, Callable, Dict, List, Optional
+
+STAGE_PATTERNS = [(re.compile(rf'[sS]tage {stage}'), stage) for stage in range(1, 5)]
+PRIMARY_CODES = [(f'T{primary}', primary) for primary in range(0, 5)]
+NODES_CODES = [(f'N{nodes}', nodes) for nodes in range(0, 4)]
+IMPROVED_STATUS = "Patient's condition improved"
+
+
+'''encode_stage(given_stage): Passed in a str, returns the cancer stage it names. Memoized, since only a handful of distinct labels exist'''
+@lru_cache(maxsize=None)
+def encode_stage(given_stage: Optional[str]) -> Optional[int]:
+    if given_stage is None: return None
+    for pattern, stage in STAGE_PATTERNS:
+        if pattern.search(given_stage): return stage
+    return None
+
+'''encode_primary(given_stage): Passed in a str, returns the tumour stage it names. Memoized like encode_stage'''
+@lru_cache(maxsize=None)
+def encode_primary(given_stage: Optional[str]) -> Optional[int]:
+    if given_stage is None: return None
+    for code, primary in PRIMARY_CODES:
+        if code in given_stage: return primary
+    return None
+
+'''encode_nodes(given_stage): Passed in a str, returns the nodes stage it names. Memoized like encode_stage'''
+@lru_cache(maxsize=None)
+def encode_nodes(given_stage: Optional[str]) -> Optional[int]:
+    if given_stage is None: return None
+    for code, nodes in NODES_CODES:
+        if code in given_stage: return nodes
+    return None
+
+'''encode_labels(labels, encoder): Passed in a List of labels, returns a float array of their codes, with NaN for missing codes.
+        The encoder is called once per distinct label rather than once per patient'''
+def encode_labels(labels: List[Optional[str]], encoder: Callable[[Optional[str]], Optional[int]]) -> np.ndarray:
+    label_ids, uniq_labels = pd.factorize(pd.Series(labels, dtype=object))
+    lookup = np.array([encoder(label) for label in uniq_labels] + [None], dtype=float)
+    return lookup[label_ids]
+
+
+class ColumnEncoder:
+    '''ColumnEncoder: Pulls each field of the mcodePackets into a flat column, then encodes every column at once.
+            update() may be called once per page of packets'''
+    def __init__(self) -> None:
+        self.raw: Dict[str, List[Any]] = {name: [] for name in
+            ['dateOfBirth', 'dateOfDiagnosis', 'sex', 'stage', 'primary', 'nodes', 'cancerStatus', 'cancerType']}
+
+    '''update(patient_info_json): Passed in a List of mcodePackets, appends the raw fields of each patient to the columns'''
+    def update(self, patient_info_json: List[Dict[str, Any]]) -> None:
+        for patient in patient_info_json:
+            subject = patient.get('subject', defaults.DEFAULT_SUBJECT) or defaults.DEFAULT_SUBJECT
+            conditions = patient.get('cancerCondition', defaults.DEFAULT_CANCER_CONDITION) or defaults.DEFAULT_CANCER_CONDITION
+            stagings = conditions[0].get('tnmStaging') or [{}]
+            status = patient.get('cancerDiseaseStatus', defaults.DEFAULT_LABEL)
+
+            self.raw['dateOfBirth'].append(subject.get('dateOfBirth'))
+            self.raw['dateOfDiagnosis'].append(conditions[0].get('dateOfDiagnosis'))
+            self.raw['sex'].append(subject.get('sex'))
+            self.raw['stage'].append(self.__get_label(stagings[0], 'stageGroup'))
+            self.raw['primary'].append(self.__get_label(stagings[0], 'primaryTumorCategory'))
+            self.raw['nodes'].append(self.__get_label(stagings[0], 'regionalNodesCategory'))
+            self.raw['cancerStatus'].append((status.get('label') or '') if status is not None else None)
+            self.raw['cancerType'].append((conditions[0].get('code', defaults.DEFAULT_LABEL) or defaults.DEFAULT_LABEL).get('label', None))
+
+    '''get_columns(): returns a Dictionary of encoded columns, named as in the experiment's DataFrame, with NaN for missing values'''
+    def get_columns(self) -> Dict[str, np.ndarray]:
+        sex = pd.Series(self.raw['sex'], dtype=object)
+        status = pd.Series(self.raw['cancerStatus'], dtype=object)
+
+        return {
+            'sex': np.where(sex.isna(), np.nan, (sex == 'FEMALE').astype(float)),
+            'diagnosisAge': self.__get_ages(),
+            'stage': encode_labels(self.raw['stage'], encode_stage),
+            'primary': encode_labels(self.raw['primary'], encode_primary),
+            'nodes': encode_labels(self.raw['nodes'], encode_nodes),
+            'cancerStatus': np.where(status.isna(), np.nan, (status == IMPROVED_STATUS).astype(float)),
+            'cancerType': np.array(self.raw['cancerType'], dtype=object),
+        }
+
+    '''__get_ages(): returns the number of years between the date of birth and the date of diagnosis of every patient,
+            computed with one vectorized datetime conversion per column'''
+    def __get_ages(self) -> np.ndarray:
+        date_of_birth = pd.to_datetime(pd.Series(self.raw['dateOfBirth'], dtype=object), format="%Y-%m-%d", errors='coerce')
+        date_of_diagnosis = pd.to_datetime(pd.Series(self.raw['dateOfDiagnosis'], dtype=object), format="%Y-%m-%dT%H:%M:%SZ", errors='coerce')
+        return ((date_of_diagnosis - date_of_birth).dt.days / 365.25).to_numpy(dtype=float)
+
+    def __get_label(self, staging: Dict[str, Any], category: str) -> Optional[str]:
+        group = staging.get(category, defaults.DEFAULT_GROUP) or defaults.DEFAULT_GROUP
+        return (group.get('dataValue', defaults.DEFAULT_LABEL) or defaults.DEFAULT_LABEL).get('label', None)
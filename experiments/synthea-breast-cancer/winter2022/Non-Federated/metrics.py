@@ -0,0 +1,96 @@
+'''metrics.py: A module to compute the evaluation metrics of a classifier from a single pass over the test set and one confusion matrix'''
+
+import numpy as np
+from scipy.special import expit, softmax
+from sklearn.linear_model import LogisticRegression
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Probabilities are clipped like sklearn's log_loss does, so that a confident wrong prediction does not make the loss infinite
+LOG_LOSS_EPS = 1e-15
+
+
+'''predict_proba(model, X): Passed in a fitted classifier, returns the class probabilities for X.
+        For a LogisticRegression these come from its decision scores, computed once, the same way its predict_proba does'''
+def predict_proba(model: Any, X: np.ndarray) -> np.ndarray:
+    if not isinstance(model, LogisticRegression):
+        return model.predict_proba(X)
+
+    scores = model.decision_function(X)
+    if scores.ndim == 1:
+        positive = expit(scores)
+        return np.column_stack([1 - positive, positive])
+
+    multi_class = getattr(model, 'multi_class', 'auto')
+    if multi_class == 'ovr' or (multi_class == 'auto' and model.solver == 'liblinear'):
+        probabilities = expit(scores)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    return softmax(scores, axis=1)
+
+'''confusion_matrix(y_true, y_pred, classes): Passed in labels and predictions, returns the confusion matrix over classes,
+        with true labels as rows and predictions as columns, like sklearn's. Labels outside of classes raise a ValueError'''
+def confusion_matrix(y_true: np.ndarray, y_pred: np.ndarray, classes: np.ndarray) -> np.ndarray:
+    n_classes = len(classes)
+    return np.bincount(n_classes * class_index(y_true, classes) + class_index(y_pred, classes), minlength=n_classes ** 2) \
+        .reshape(n_classes, n_classes)
+
+'''class_index(y, classes): Passed in labels and the sorted classes, returns the index of every label in classes'''
+def class_index(y: np.ndarray, classes: np.ndarray) -> np.ndarray:
+    y = np.asarray(y)
+    index = np.minimum(np.searchsorted(classes, y), len(classes) - 1)
+    if len(y) and np.any(classes[index] != y):
+        raise ValueError(f'Labels {np.setdiff1d(y, classes)} are not among the classes {classes}')
+    return index
+
+'''confusion_metrics(matrix): Passed in a confusion matrix, returns the accuracy, balanced accuracy, macro F1 score and MCC it gives.
+        As with sklearn, classes neither in the labels nor in the predictions are left out of the averages'''
+def confusion_metrics(matrix: np.ndarray) -> Dict[str, float]:
+    matrix = np.asarray(matrix, dtype=np.float64)
+    true_counts = matrix.sum(axis=1)
+    pred_counts = matrix.sum(axis=0)
+    correct = np.diag(matrix)
+    n_samples = matrix.sum()
+
+    seen = true_counts > 0
+    present = seen | (pred_counts > 0)
+    recall = correct[seen] / true_counts[seen]
+    f1 = 2 * correct[present] / (true_counts[present] + pred_counts[present])
+
+    cov_true_pred = correct.sum() * n_samples - true_counts @ pred_counts
+    cov_pred_pred = n_samples ** 2 - pred_counts @ pred_counts
+    cov_true_true = n_samples ** 2 - true_counts @ true_counts
+    mcc = cov_true_pred / np.sqrt(cov_true_true * cov_pred_pred) if cov_true_true * cov_pred_pred else 0.0
+
+    return {
+        'accuracy': float(correct.sum() / n_samples) if n_samples else 0.0,
+        'balanced_accuracy': float(recall.mean()) if recall.size else 0.0,
+        'f1_score': float(f1.mean()) if f1.size else 0.0,
+        'mcc': float(mcc),
+    }
+
+'''iter_chunks(X, y, chunk_size): Passed in a test set, yields it in slices of chunk_size rows, or whole if chunk_size is None or 0'''
+def iter_chunks(X: np.ndarray, y: np.ndarray, chunk_size: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    if not chunk_size:
+        yield X, y
+        return
+    for start in range(0, len(y), chunk_size):
+        yield X[start:start + chunk_size], y[start:start + chunk_size]
+
+'''evaluate(model, X, y, chunk_size): Passed in a fitted classifier and a test set, scores it once, taking the predictions as the
+        most probable classes, and returns the log loss and the metrics of confusion_metrics. With chunk_size, the test set is scored
+        chunk_size rows at a time, which bounds the memory used when it is large or memory-mapped'''
+def evaluate(model: Any, X: np.ndarray, y: np.ndarray, chunk_size: Optional[int] = None) -> Tuple[float, Dict[str, float]]:
+    classes = model.classes_
+    matrix = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    loss_sum = 0.0
+
+    for X_chunk, y_chunk in iter_chunks(X, y, chunk_size):
+        probabilities = predict_proba(model, X_chunk)
+        matrix += confusion_matrix(y_chunk, classes[probabilities.argmax(axis=1)], classes)
+
+        probabilities = np.clip(probabilities, LOG_LOSS_EPS, 1 - LOG_LOSS_EPS)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        true_index = class_index(y_chunk, classes)
+        loss_sum -= np.log(probabilities[np.arange(len(true_index)), true_index]).sum()
+
+    return loss_sum / len(y) if len(y) else 0.0, confusion_metrics(matrix)
@@ -1,7 +1,7 @@
 '''parsers.py: A module with helper functions/classes to support the EDA parsing process in SyntheaEDA.ipynb'''
 
-import re
 import defaults
+import encoders
 from datetime import datetime
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
@@ -152,25 +152,12 @@ class PatientInfoParser:
 
     '''__get_stage(given_stage): Passed in a str, this function returns the patient's cancer stage'''
     def __get_stage(self, given_stage: str) -> Optional[int]:
-        if re.search(r'[sS]tage 1', given_stage): return 1
-        if re.search(r'[sS]tage 2', given_stage): return 2
-        if re.search(r'[sS]tage 3', given_stage): return 3
-        if re.search(r'[sS]tage 4', given_stage): return 4
-        return None
+        return encoders.encode_stage(given_stage)
 
     '''__get_primary(given_stage): Passed in a str, this function returns the patient's tumour stage'''
     def __get_primary(self, given_stage: str) -> Optional[int]:
-        if 'T0' in given_stage: return 0
-        if 'T1' in given_stage: return 1
-        if 'T2' in given_stage: return 2
-        if 'T3' in given_stage: return 3
-        if 'T4' in given_stage: return 4
-        return None
+        return encoders.encode_primary(given_stage)
 
     '''__get_nodes(given_stage): Passed in a str, this function returns the patient's nodes stage'''
     def __get_nodes(self, given_stage: str) -> Optional[int]:
-        if 'N0' in given_stage: return 0
-        if 'N1' in given_stage: return 1
-        if 'N2' in given_stage: return 2
-        if 'N3' in given_stage: return 3
-        return None
+        return encoders.encode_nodes(given_stage)
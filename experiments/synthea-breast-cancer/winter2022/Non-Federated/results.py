@@ -1,13 +1,17 @@
 '''results.py: File containing functions to print the results received'''
 
-from sklearn.metrics import classification_report, confusion_matrix, balanced_accuracy_score
-from sklearn.metrics import r2_score, f1_score, matthews_corrcoef
+from sklearn.metrics import classification_report
 from sklearn.model_selection import cross_val_score
+from metrics import confusion_matrix, confusion_metrics
 import pandas as pd
+import numpy as np
 
 def print_results(y_test, y_pred):
+    matrix = confusion_matrix(y_test, y_pred, np.union1d(y_test, y_pred))
+    metrics = confusion_metrics(matrix)
+
     print('CONFUSION MATRIX:')
-    print(confusion_matrix(y_test, y_pred))
+    print(matrix)
     print()
     
     print('CLASSIFICATION REPORT:')
@@ -15,9 +19,9 @@ def print_results(y_test, y_pred):
     print()
     
     results_dict = {}
-    results_dict['Balanced Accuracy'] = balanced_accuracy_score(y_test, y_pred)
-    results_dict['Macro F1 Score'] = f1_score(y_test, y_pred, average='macro')
-    results_dict['MCC'] = matthews_corrcoef(y_test, y_pred)
+    results_dict['Balanced Accuracy'] = metrics['balanced_accuracy']
+    results_dict['Macro F1 Score'] = metrics['f1_score']
+    results_dict['MCC'] = metrics['mcc']
     results_df = pd.DataFrame([results_dict])
     
     print(results_df.to_string(index=False))
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import argparse
+import math
 import os
 import shutil
 
@@ -16,11 +17,18 @@ def print_ports(initial_port: int) -> None:
     print(f"Your Katsu port is {initial_port + 2}")
     print(f"Your GraphQL port is {initial_port + 3}\n")
 
-def get_template_top(initial_port: int, rounds: int, experiment_path: str) -> str:
+def get_template_top(initial_port: int, rounds: int, experiment_path: str, n_regions: int = 0) -> str:
     """
-    Function to create the main body of the docker-compose file, using the initial port given by the user
+    Function to create the main body of the docker-compose file, using the initial port given by the user.
+    With n_regions regional aggregators, the fl-server waits for the aggregators instead of the clients, and trains all of them every round.
     """
 
+    tier_environment = ""
+    if n_regions:
+        tier_environment = f'''
+            FL_MIN_CLIENTS: "{n_regions}"
+            FL_FRACTION_FIT: "1.0"'''
+
     db_katsu_port = initial_port + 1
     katsu_port = initial_port + 2
     graphql_port = initial_port + 3
@@ -38,7 +46,7 @@ services:
             GRAPHQL_INTERFACE_URL: "http://gql-interface:7999/"
             SERVER_INTERNAL_HOST: "0.0.0.0"
             SERVER_INTERNAL_PORT: "8080"
-            ROUNDS: "{rounds}"
+            ROUNDS: "{rounds}"{tier_environment}
         volumes:
         - {BASES_PATH}:/src/bases
         - {experiment_path}:/src/experiment
@@ -97,9 +105,33 @@ volumes:
     db-katsu-data:
     """
 
-def get_current_client(cur_num: int, experiment_path: str) -> str:
+def get_current_aggregator(region: int, n_clients: int, experiment_path: str) -> str:
     """
-    Function to generate a docker-compose container for an fl-client, given the container id
+    Function to generate a docker-compose container for a regional fl-aggregator, given the region id and the number of clients in the region.
+    It is a client of the fl-server, and the server of the fl-clients of its region.
+    """
+
+    return f"""
+    fl-aggregator-{region}:
+        build: services/fl-aggregator
+        container_name: fl-aggregator-{region}
+        depends_on:
+        - fl-server
+        environment:
+            FLOWER_SERVER_URL: "fl-server:8080"
+            GRAPHQL_INTERFACE_URL: "http://gql-interface:7999/"
+            SERVER_INTERNAL_HOST: "0.0.0.0"
+            SERVER_INTERNAL_PORT: "8080"
+            FL_MIN_CLIENTS: "{n_clients}"
+            FL_FRACTION_FIT: "1.0"
+        volumes:
+        - {BASES_PATH}:/src/bases
+        - {experiment_path}:/src/experiment
+"""
+
+def get_current_client(cur_num: int, experiment_path: str, server: str = "fl-server") -> str:
+    """
+    Function to generate a docker-compose container for an fl-client, given the container id and the service it connects to
     """
     
     return f"""
@@ -107,9 +139,9 @@ def get_current_client(cur_num: int, experiment_path: str) -> str:
         build: services/fl-client
         container_name: fl-client-{cur_num}
         depends_on:
-        - fl-server
+        - {server}
         environment:
-            FLOWER_SERVER_URL: "fl-server:8080"
+            FLOWER_SERVER_URL: "{server}:8080"
             GRAPHQL_INTERFACE_URL: "http://gql-interface:7999/"
             FLOWER_CLIENT_NUMBER: "{cur_num}"
         volumes:
@@ -117,20 +149,73 @@ def get_current_client(cur_num: int, experiment_path: str) -> str:
         - {experiment_path}:/src/experiment
 """
 
-def create_docker_compose_string(initial_port: int, scale: int, rounds: int, experiment_path: str) -> str:
+def get_current_worker(worker_num: int, client_numbers: list, experiment_path: str, server: str = "fl-server") -> str:
     """
-    Function to generate a full docker-compose file, as a string literal, given the number of requested clients and the starting port
+    Function to generate a docker-compose container for an fl-worker, which runs the logical fl-clients client_numbers in one process,
+    given the container id and the service its clients connect to
+    """
+
+    return f"""
+    fl-worker-{worker_num}:
+        build: services/fl-client
+        container_name: fl-worker-{worker_num}
+        depends_on:
+        - {server}
+        environment:
+            FLOWER_SERVER_URL: "{server}:8080"
+            GRAPHQL_INTERFACE_URL: "http://gql-interface:7999/"
+            FLOWER_WORKER_CLIENTS: "{' '.join(str(cur_num) for cur_num in client_numbers)}"
+        volumes:
+        - {BASES_PATH}:/src/bases
+        - {experiment_path}:/src/experiment
+"""
+
+def get_regions(scale: int, fan_out: int) -> list:
+    """
+    Function to split the client ids 1 to scale into regions of at most fan_out clients, as evenly as possible
+    """
+
+    n_regions = math.ceil(scale / fan_out)
+    bounds = [1 + (scale * region) // n_regions for region in range(n_regions + 1)]
+    return [list(range(bounds[region], bounds[region + 1])) for region in range(n_regions)]
+
+def create_docker_compose_string(initial_port: int, scale: int, rounds: int, experiment_path: str, fan_out: int = 0, clients_per_container: int = 1) -> str:
+    """
+    Function to generate a full docker-compose file, as a string literal, given the number of requested clients and the starting port.
+    With a fan_out, the clients are split into regions of at most fan_out clients, each connected to its own fl-aggregator,
+    and only the aggregators connect to the fl-server. Otherwise every client connects to the fl-server.
+    With more than one client per container, the clients are packed into fl-worker containers of up to clients_per_container clients,
+    which never span two regions.
     """
     
-    template_top = get_template_top(initial_port, rounds, experiment_path)
+    regions = get_regions(scale, fan_out) if fan_out > 0 else []
+    template_top = get_template_top(initial_port, rounds, experiment_path, len(regions))
     template_bottom = get_template_bottom()
     print_ports(initial_port)
 
     services_string = template_top
-    for cur_num in range(1, scale + 1):
-        template_services = get_current_client(cur_num, experiment_path)
-        services_string += template_services
-    
+    groups = [("fl-server", list(range(1, scale + 1)))]
+    if regions:
+        groups = [(f"fl-aggregator-{region}", clients) for region, clients in enumerate(regions, start=1)]
+        print(f"Your {scale} clients are split between {len(regions)} regional aggregators\n")
+
+    clients_per_container = max(1, clients_per_container)
+    worker_num = 0
+    for region, (server, clients) in enumerate(groups, start=1):
+        if regions:
+            services_string += get_current_aggregator(region, len(clients), experiment_path)
+
+        for start in range(0, len(clients), clients_per_container):
+            packed = clients[start:start + clients_per_container]
+            if len(packed) == 1:
+                services_string += get_current_client(packed[0], experiment_path, server)
+            else:
+                worker_num += 1
+                services_string += get_current_worker(worker_num, packed, experiment_path, server)
+
+    if worker_num:
+        print(f"Your {scale} clients are packed into {worker_num} fl-worker containers of up to {clients_per_container} clients\n")
+
     return services_string + template_bottom
 
 def save_file_here(contents: str, name: str) -> None:
@@ -149,6 +234,7 @@ def copy_experiment_requirements(experiment_path: str):
     
     shutil.copy(f'{experiment_path}experiment-requirements.txt', f'{os.getcwd()}/services/fl-server/experiment-requirements.txt')
     shutil.copy(f'{experiment_path}experiment-requirements.txt', f'{os.getcwd()}/services/fl-client/experiment-requirements.txt')
+    shutil.copy(f'{experiment_path}experiment-requirements.txt', f'{os.getcwd()}/services/fl-aggregator/experiment-requirements.txt')
 
 def main() -> None:
     """
@@ -160,7 +246,9 @@ def main() -> None:
     It takes an intial port that all containers should start on, the number of container stacks that should be created, and the path of the 'experiment' folder.
 
     Each stack's containers are abbreviated with an index from 1 to scale in the docker-compose
-    file. THIS SCRIPT WILL OVERWRITE AN EXISTING DOCKER-COMPOSE.YML FILE.
+    file. With --fan-out, the clients are grouped into regions, each served by a regional fl-aggregator that is itself the only kind of
+    client of the fl-server. With --clients-per-container, several clients share one fl-worker container and process.
+    THIS SCRIPT WILL OVERWRITE AN EXISTING DOCKER-COMPOSE.YML FILE.
     """
 
     parser = argparse.ArgumentParser(description=info)
@@ -169,6 +257,8 @@ def main() -> None:
     parser.add_argument("scale", help="How many client instances that should be created. Each instance contains 1 individual docker container + 3 shared containers. We recommend 2.")
     parser.add_argument("rounds", help="How many rounds to use for classifier training. We recommend 100.")
     parser.add_argument("experiment_path", help="The path to the experiment folder, to be added as a docker volume in the fl-* services.")
+    parser.add_argument("--clients-per-container", type=int, default=1, help="The most clients run by one fl-worker container, in one process. Defaults to 1, where each client has its own fl-client container.")
+    parser.add_argument("--fan-out", type=int, default=0, help="The most clients a regional fl-aggregator serves. Defaults to 0, where every client connects to the fl-server.")
     
     args = parser.parse_args()
     starting_port = int(args.starting_port)
@@ -176,7 +266,7 @@ def main() -> None:
     rounds = int(args.rounds)
     experiment_path = str(args.experiment_path)
 
-    docker_compose_string = create_docker_compose_string(starting_port, scale, rounds, experiment_path)
+    docker_compose_string = create_docker_compose_string(starting_port, scale, rounds, experiment_path, args.fan_out, args.clients_per_container)
     save_file_here(docker_compose_string, "docker-compose.yml")
     copy_experiment_requirements(experiment_path)
 
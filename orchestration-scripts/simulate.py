@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+from contextlib import redirect_stdout
+import argparse
+import logging
+import copy
+import json
+import time
+import sys
+import io
+import os
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASES_ROOT = os.path.join(REPO_ROOT, "experiments", "mock-experiment")
+SERVER_ROOT = os.path.join(REPO_ROOT, "services", "fl-server")
+
+def setup_paths(experiment_root: str) -> None:
+    """
+    Function to make the bases, the experiment package in experiment_root and the fl-server importable
+    """
+
+    for path in (SERVER_ROOT, BASES_ROOT, experiment_root):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+def build_client(experiment_root: str, dataset, quiet: bool):
+    """
+    Function to create the FlowerClient of one partition of the dataset, in a worker process of the simulation or in its main process
+    """
+
+    setup_paths(experiment_root)
+    from bases.tracing import Tracer
+    from experiment import experiment, model, FlowerClient
+
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+
+    # The clients share one experiment, so each records its spans in a tracer of its own
+    client = FlowerClient(experiment, experiment.set_initial_params(copy.deepcopy(model)), dataset)
+    client.tracer = Tracer()
+    return client
+
+def get_partitions(experiment, args):
+    """
+    Function to load the experiment's dataset, from its cache when it has one, and split its training set between the clients
+    as requested. The testing set is split evenly, for the clients' own evaluations, and is also kept whole for the server's.
+    """
+
+    from bases.partitioning import iid_partition, partition_dataset
+
+    (X_train, y_train), (X_test, y_test) = experiment.load_data()
+    train = partition_dataset(X_train, y_train, args.clients, args.partition,
+        alpha=args.alpha, skew=args.skew, min_per_label=args.min_per_label, random_state=args.seed)
+    test = iid_partition(X_test, y_test, args.clients, random_state=args.seed)
+    return list(zip(train, test)), (X_test, y_test)
+
+def main() -> None:
+    """
+    Function to run a federated experiment in a single process, without Docker, Katsu, the GraphQL-interface or gRPC
+    """
+
+    info = """
+    This script runs a federated experiment in one process. It imports the 'experiment' folder, loads its dataset (from the
+    experiment's dataset cache, eg. one filled by an fl-client, or else from the GraphQL-interface), splits it between CLIENTS
+    simulated clients and runs ROUNDS rounds through the experiment's Strategy and the server of the fl-server, with the
+    in-process clients registered directly with the server. Settings are read from the environment, as in the fl-services.
+    """
+
+    parser = argparse.ArgumentParser(description=info)
+    parser.add_argument("experiment_path", help="The path to the experiment folder to simulate.")
+    parser.add_argument("clients", type=int, help="How many clients to split the dataset between.")
+    parser.add_argument("rounds", type=int, help="How many rounds to run.")
+    parser.add_argument("--partition", choices=("iid", "dirichlet", "skewed"), default="iid", help="How to split the training set. Defaults to iid.")
+    parser.add_argument("--alpha", type=float, default=0.5, help="Concentration of the label distributions of the dirichlet split. Defaults to 0.5.")
+    parser.add_argument("--min-per-label", type=int, default=1,
+        help="Examples of every label each client gets in the dirichlet split, as a client missing a label can not fit. Defaults to 1.")
+    parser.add_argument("--skew", type=float, default=1.0, help="Exponent of the client sizes of the skewed split. Defaults to 1.")
+    parser.add_argument("--fraction-fit", type=float, default=1.0, help="Fraction of the clients that train in each round. Defaults to 1.")
+    parser.add_argument("--fraction-eval", type=float, default=0.0, help="Fraction of the clients that evaluate in each round. Defaults to 0, server-side evaluation only.")
+    parser.add_argument("--processes", type=int, default=0, help="Worker processes to run the clients in. Defaults to 0, where clients run in the main process.")
+    parser.add_argument("--seed", type=int, default=None, help="Random state of the split. Defaults to the experiment's FL_RANDOM_STATE.")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the server and the clients.")
+    parser.add_argument("--output", help="Optional path of a JSON file to write the losses and metrics of every round to.")
+    parser.add_argument("--trace", help="Optional folder to write the timeline of the spans of the server and the clients to.")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    if args.trace:
+        os.environ["FL_TRACE"] = "1"
+        os.environ["FL_TRACE_PATH"] = os.path.abspath(args.trace)
+
+    # Relative paths in the settings, like the dataset cache, resolve as they do in the fl-services, where the experiment is /src/experiment
+    experiment_root = os.path.dirname(os.path.abspath(args.experiment_path.rstrip("/")))
+    os.chdir(experiment_root)
+    os.environ["ROUNDS"] = str(args.rounds)
+    os.environ["FL_MIN_CLIENTS"] = str(args.clients)
+    os.environ["FL_FRACTION_FIT"] = str(args.fraction_fit)
+    os.environ.setdefault("FL_CHECKPOINT_INTERVAL", "0")
+    setup_paths(experiment_root)
+
+    import flwr as fl
+    if not args.verbose:
+        logging.getLogger("flower").setLevel(logging.WARNING)
+    from bases.simulation import ClientProcessPool, InProcessClientProxy
+    from experiment import experiment, model, eval_fn, Strategy, settings
+    import server
+
+    args.seed = settings.FL_RANDOM_STATE if args.seed is None else args.seed
+    partitions, (X_test, y_test) = get_partitions(experiment, args)
+    print(f"{args.clients} clients, {args.partition} split, training examples: {[len(train[1]) for train, _ in partitions]}")
+
+    pool = ClientProcessPool(args.processes) if args.processes > 0 else None
+    proxies = []
+    for cid, dataset in enumerate(partitions):
+        if pool is not None:
+            proxies.append(pool.add(str(cid), build_client, experiment_root, dataset, not args.verbose))
+        else:
+            proxies.append(InProcessClientProxy(str(cid), build_client(experiment_root, dataset, False)))
+
+    initial_model = experiment.set_initial_params(copy.deepcopy(model))
+    strategy = Strategy(
+        min_available_clients=args.clients,
+        min_fit_clients=min(2, args.clients),
+        min_eval_clients=min(2, args.clients),
+        fraction_fit=args.fraction_fit,
+        fraction_eval=args.fraction_eval,
+        eval_fn=eval_fn(experiment, copy.deepcopy(initial_model), X_test, y_test),
+        on_fit_config_fn=server.get_fit_config,
+        initial_parameters=fl.common.weights_to_parameters(list(experiment.get_model_parameters(initial_model))),
+    )
+    if strategy.timeline is not None:
+        strategy.timeline.add("simulation", experiment.tracer.drain())
+    fl_server = server.get_server(strategy)
+    for proxy in proxies:
+        fl_server.client_manager().register(proxy)
+
+    start = time.perf_counter()
+    output = sys.stdout if args.verbose else io.StringIO()
+    try:
+        with redirect_stdout(output):
+            history = fl_server.fit(num_rounds=args.rounds, timeout=None)
+    finally:
+        if hasattr(strategy, "checkpoints"):
+            strategy.checkpoints.close()
+        if getattr(strategy, "timeline", None) is not None:
+            strategy.timeline.close()
+        if pool is not None:
+            pool.shutdown()
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.rounds} rounds in {elapsed:.2f} seconds")
+    for kind in ("fit", "evaluate"):
+        failures = {proxy.cid: getattr(proxy, f"{kind}_failures") for proxy in proxies if getattr(proxy, f"{kind}_failures")}
+        if failures:
+            print(f"{kind} failures: {sum(failures.values())}, by client: {failures}")
+    for key, values in history.metrics_centralized.items():
+        if values and isinstance(values[-1][1], (int, float)):
+            print(f"{key}: {values[-1][1]:.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "clients": args.clients,
+                "rounds": args.rounds,
+                "partition": args.partition,
+                "training_examples": [len(train[1]) for train, _ in partitions],
+                "seconds": elapsed,
+                "fit_failures": {proxy.cid: proxy.fit_failures for proxy in proxies},
+                "evaluate_failures": {proxy.cid: proxy.evaluate_failures for proxy in proxies},
+                "losses_centralized": history.losses_centralized,
+                "losses_distributed": history.losses_distributed,
+                "metrics_centralized": history.metrics_centralized,
+            }, f, indent=2, default=float)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# Middle tier of the hierarchical topology created by configure_docker_compose.py --fan-out
+
+import flwr as fl
+from flwr.server.grpc_server.grpc_server import start_grpc_server
+from bases.checkpoints import CheckpointWriter
+from bases.regional_aggregator import RegionalAggregator
+from bases.streaming_server import StreamingServer
+from experiment import Strategy, settings
+
+
+# Start the regional Flower server, then connect it to the root server as a single client
+if __name__ == "__main__":
+    # Every client of the region trains in every round unless FL_FRACTION_FIT says otherwise, and only the root saves checkpoints
+    strategy = Strategy(
+        min_available_clients=settings.FL_MIN_CLIENTS,
+        min_fit_clients=min(2, settings.FL_MIN_CLIENTS),
+        min_eval_clients=min(2, settings.FL_MIN_CLIENTS),
+        fraction_fit=settings.FL_FRACTION_FIT,
+        fit_metrics_aggregation_fn=RegionalAggregator.aggregate_fit_metrics,
+        checkpoints=CheckpointWriter(settings.FL_CHECKPOINT_PATH, interval=0),
+    )
+    server = StreamingServer(fl.server.SimpleClientManager(), strategy)
+
+    server_url = f'{settings.FL_INTERNAL_HOST}:{settings.FL_INTERNAL_PORT}'
+    print(f"fl aggregator serving {settings.FL_MIN_CLIENTS} clients at {server_url}, for the fl server at {settings.FL_SERVER_URL}")
+    grpc_server = start_grpc_server(client_manager=server.client_manager(), server_address=server_url)
+
+    fl.client.start_numpy_client(settings.FL_SERVER_URL, client=RegionalAggregator(server))
+
+    # The root ended the experiment: release the region's clients
+    server.disconnect_all_clients(timeout=None)
+    grpc_server.stop(grace=1)
+    strategy.checkpoints.close()
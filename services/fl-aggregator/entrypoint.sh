@@ -0,0 +1,6 @@
+#!/bin/bash
+
+# give enough time for fl-server to finish initializing, but connect before the fl-clients of the region give up
+sleep 30
+# start regional aggregator
+python3 aggregator.py
@@ -1,6 +1,7 @@
 # Adapted from https://github.com/adap/flower/tree/main/examples/sklearn-logreg-mnist
 
 from experiment import experiment, model, FlowerClient, settings
+from bases.tracing import TracingClient
 import flwr as fl
 
 if __name__ == "__main__":
@@ -11,4 +12,4 @@ if __name__ == "__main__":
     fl_model = experiment.set_initial_params(model)
 
     # Start Flower client
-    fl.client.start_numpy_client(settings.FL_SERVER_URL, client=FlowerClient(experiment, fl_model, dataset))
\ No newline at end of file
+    fl.client.start_client(settings.FL_SERVER_URL, client=TracingClient(FlowerClient(experiment, fl_model, dataset)))
\ No newline at end of file
@@ -2,5 +2,9 @@
 
 # give enough time for fl-server to finish initializing
 sleep 60
-# start client
-python3 client.py
\ No newline at end of file
+# start client, or the logical clients of a worker
+if [ -n "$FLOWER_WORKER_CLIENTS" ]; then
+    python3 worker.py
+else
+    python3 client.py
+fi
@@ -0,0 +1,37 @@
+# Runs several logical fl-clients in one process, one thread each, instead of one container per client
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from experiment import create_experiment, model, FlowerClient, settings
+from bases.tracing import TracingClient
+import flwr as fl
+import copy
+
+
+def run_client(client_number):
+    """
+    Load the data of one logical client and take part in the experiment until the server disconnects it.
+    Each client has its own experiment, table and model, and its own connection to the server.
+    """
+    experiment = create_experiment(client_number)
+    dataset = experiment.load_data()
+    fl_model = experiment.set_initial_params(copy.deepcopy(model))
+
+    print(f"client {client_number} connecting to {settings.FL_SERVER_URL}")
+    fl.client.start_client(settings.FL_SERVER_URL, client=TracingClient(FlowerClient(experiment, fl_model, dataset)))
+
+
+if __name__ == "__main__":
+    client_numbers = settings.FL_WORKER_CLIENTS or [settings.FL_CLIENT_NUMBER]
+
+    # The clients mostly wait on the network, and numpy and sklearn release the GIL for much of fitting, so threads are enough
+    failed = []
+    with ThreadPoolExecutor(max_workers=len(client_numbers)) as executor:
+        futures = {executor.submit(run_client, client_number): client_number for client_number in client_numbers}
+        for future in as_completed(futures):
+            # A client that fails does not stop the other clients of the worker
+            if future.exception() is not None:
+                print(f"client {futures[future]} failed: {future.exception()!r}")
+                failed.append(futures[future])
+
+    if failed:
+        raise SystemExit(f"clients {', '.join(failed)} failed")
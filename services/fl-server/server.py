@@ -1,24 +1,110 @@
 # Adapted from https://github.com/adap/flower/tree/main/examples/sklearn-logreg-mnist
 
 import flwr as fl
+from bases.async_server import AsyncServer
+from bases.checkpoints import latest_round, load_checkpoint
+from bases.evaluation import BackgroundEvaluator
+from bases.streaming_server import StreamingServer
 from experiment import experiment, model, eval_fn, Strategy, settings
 
 
-def get_eval_fn():
-    """Return an evaluation function for server-side evaluation."""
-    _, (X_test, y_test) = experiment.load_data()
-    return eval_fn(experiment, model, X_test, y_test)
+def get_eval_fn(first_round=0):
+    """
+    Return an evaluation function for server-side evaluation. The holdout set is loaded on a background thread,
+    so clients can connect and rounds can start before it is ready.
+    """
+    return BackgroundEvaluator(
+        experiment.load_holdout,
+        lambda X_test, y_test: eval_fn(experiment, model, X_test, y_test),
+        run_async=settings.FL_ASYNC_EVAL,
+        first_round=first_round,
+    ).start()
+
+
+def get_fit_config(rnd):
+    """
+    Return the config sent to the clients for round rnd, including the local training budget, if one is set.
+    """
+    config = {"rnd": rnd}
+    budget = {
+        "local_epochs": settings.FL_LOCAL_EPOCHS,
+        "batch_size": settings.FL_BATCH_SIZE,
+        "time_budget": settings.FL_TIME_BUDGET,
+    }
+    if any(budget.values()):
+        config.update({key: value for key, value in budget.items() if value})
+        config["learning_rate"] = settings.FL_SGD_LEARNING_RATE
+
+    return config
+
+
+def get_server(strategy):
+    """
+    Return the buffered asynchronous server when FL_ASYNC is set, otherwise the server folding each fit result into the aggregate
+    as it arrives, whose rounds end at a deadline when FL_ROUND_DEADLINE is set.
+    """
+    if settings.FL_ASYNC:
+        return AsyncServer(
+            fl.server.SimpleClientManager(),
+            strategy,
+            buffer_size=settings.FL_ASYNC_BUFFER_SIZE,
+            staleness_exponent=settings.FL_ASYNC_STALENESS_EXPONENT,
+            max_staleness=settings.FL_ASYNC_MAX_STALENESS,
+            server_learning_rate=settings.FL_ASYNC_SERVER_LEARNING_RATE,
+        )
+
+    return StreamingServer(fl.server.SimpleClientManager(), strategy)
+
+
+def get_resume_point():
+    """
+    Return the latest checkpointed round and its weights when resuming is enabled, or round 0 and no weights otherwise.
+    """
+    if not settings.FL_RESUME:
+        return 0, None
+
+    rnd = latest_round(settings.FL_CHECKPOINT_PATH)
+    weights = load_checkpoint(settings.FL_CHECKPOINT_PATH, rnd) if rnd is not None else None
+    if weights is None:
+        print(f"no checkpoint found under {settings.FL_CHECKPOINT_PATH}, starting from round 1")
+        return 0, None
+
+    print(f"resuming from the checkpoint of round {rnd}")
+    return rnd, weights
 
 
 # Start Flower server
 if __name__ == "__main__":
     experiment.set_initial_params(model)
+    start_round, initial_weights = get_resume_point()
+    num_rounds = settings.FL_ROUNDS - start_round
+    if num_rounds <= 0:
+        print(f"all {settings.FL_ROUNDS} rounds are already checkpointed, nothing to do")
+        raise SystemExit(0)
+
+    evaluator = get_eval_fn(start_round)
+    resume_kwargs = {}
+    if initial_weights is not None:
+        resume_kwargs = {"initial_parameters": fl.common.weights_to_parameters(initial_weights), "round_offset": start_round}
+
     strategy = Strategy(
         min_available_clients=settings.FL_MIN_CLIENTS,
-        eval_fn=get_eval_fn(),
-        on_fit_config_fn=lambda rnd: {"rnd": rnd}
+        min_fit_clients=min(2, settings.FL_MIN_CLIENTS),
+        min_eval_clients=min(2, settings.FL_MIN_CLIENTS),
+        fraction_fit=settings.FL_FRACTION_FIT,
+        eval_fn=evaluator,
+        on_fit_config_fn=get_fit_config,
+        **resume_kwargs
     )
+    evaluator.on_result = getattr(strategy, "record_evaluation", None)
 
     server_url = f'{settings.FL_INTERNAL_HOST}:{settings.FL_INTERNAL_PORT}'
-    fl.server.start_server(server_url, strategy=strategy, config={"num_rounds": settings.FL_ROUNDS})
-    print(f"fl server started at {server_url}")
+    print(f"fl server starting at {server_url}, running rounds {start_round + 1} to {settings.FL_ROUNDS}")
+    fl.server.start_server(server_url, server=get_server(strategy), strategy=strategy, config={"num_rounds": num_rounds})
+
+    # Wait for the evaluations and checkpoints still running in the background, so that every round is reported and saved
+    evaluator.shutdown()
+    if hasattr(strategy, "checkpoints"):
+        strategy.checkpoints.close()
+    if getattr(strategy, "timeline", None) is not None:
+        strategy.timeline.close()